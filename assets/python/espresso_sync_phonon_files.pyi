@@ -0,0 +1,228 @@
+# ---------------------------------------------------------- #
+#                                                            #
+#  This script moves Quantum ESPRESSO phonon files between   #
+#  the scratch and the working directories of a job.         #
+#                                                            #
+#  It is saved under the name of the task it runs:           #
+#    - espresso_collect_dynmat.py collects the dynamical     #
+#      matrices (dynmat*) from the scratch directory         #
+#    - espresso_link_outdir_save.py brings the outdir of the #
+#      preceding pw.x run into the scratch directory         #
+#                                                            #
+#  Files are transferred concurrently. A file is linked if   #
+#  it is on the same filesystem (a copy-on-write reflink     #
+#  where supported, or else a hardlink where allowed), and   #
+#  copied otherwise. Files whose size and checksum already   #
+#  match are skipped, and each transferred file is recorded  #
+#  in a manifest in the destination, so that an interrupted  #
+#  run resumes where it stopped.                             #
+#                                                            #
+# ---------------------------------------------------------- #
+from __future__ import print_function
+import errno
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+{# JOB_SCRATCH_DIR and JOB_WORK_DIR will be initialized at runtime => avoid substituion below #}
+{%- raw -%}
+TASKS = {
+    "espresso_collect_dynmat": {
+        "sources": "{{ JOB_SCRATCH_DIR }}/outdir/_ph0/__prefix__.phsave/dynmat*",
+        "destination": "{{ JOB_WORK_DIR }}/../outdir/_ph0/__prefix__.phsave",
+        # the dynamical matrices are not written to after they are collected, so they can share their data
+        "allow_hardlinks": True,
+    },
+    "espresso_link_outdir_save": {
+        "sources": "{{ JOB_WORK_DIR }}/../outdir/__prefix__.*",
+        "destination": "{{ JOB_SCRATCH_DIR }}/outdir",
+        # ph.x may rewrite these files, which must not change the outdir of the preceding run
+        "allow_hardlinks": False,
+    },
+}
+{%- endraw %}
+
+# maximum number of files transferred at the same time
+MAX_CONCURRENT_TRANSFERS = 8
+
+# name of the manifest of transferred files (a line of JSON per file), kept in the destination directory
+MANIFEST_FILENAME = ".sync_manifest.jsonl"
+
+# size of the chunks files are read in, to compute their checksums
+CHUNK_SIZE = 1 << 20
+
+# ioctl request to clone a file (a reflink), supported by btrfs and xfs on Linux
+FICLONE = 0x40049409
+
+
+# get the sha256 checksum of a file
+def get_checksum(filename):
+    checksum = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+# get the files matching a glob pattern as (source, path relative to the destination) pairs, walking into directories
+def list_files(pattern):
+    files = []
+    for path in sorted(glob.glob(pattern)):
+        basename = os.path.basename(path)
+        if not os.path.isdir(path):
+            files.append((path, basename))
+            continue
+        for root, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                source = os.path.join(root, filename)
+                files.append((source, os.path.join(basename, os.path.relpath(source, path))))
+    return files
+
+
+# create a directory, and any missing parents
+def make_directory(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+# clone a file by a reflink, sharing its data until either copy is written to
+def reflink(source, destination):
+    import fcntl
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, destination)
+
+
+# transfer a file by the cheapest available method, returning the name of the method
+def transfer(source, destination, allow_hardlinks):
+    # the file is first written to a temporary name, so that an interrupted transfer leaves no partial file behind
+    temporary = destination + ".part"
+    if os.path.lexists(temporary):
+        os.remove(temporary)
+    method = "copy"
+    if os.stat(source).st_dev == os.stat(os.path.dirname(destination)).st_dev:
+        try:
+            reflink(source, temporary)
+            method = "reflink"
+        except (ImportError, IOError, OSError):
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            if allow_hardlinks:
+                try:
+                    os.link(source, temporary)
+                    method = "hardlink"
+                except OSError:
+                    pass
+    if method == "copy":
+        shutil.copy2(source, temporary)
+    os.rename(temporary, destination)
+    return method
+
+
+class Manifest(object):
+    """
+    Records each file transferred to a destination directory, by the size, modification time and (if it was computed)
+    checksum of its source. A line is appended to the manifest as each file is transferred, so that it is kept when a
+    run is interrupted, and the manifest is compacted to a line per file when it is loaded.
+    """
+
+    def __init__(self, directory):
+        self.filename = os.path.join(directory, MANIFEST_FILENAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(self.filename) as f:
+                for line in f:
+                    try:
+                        path, entry = json.loads(line)
+                    except ValueError:
+                        # the last line is left incomplete when a run is interrupted while writing it
+                        continue
+                    self.entries[path] = entry
+        except IOError:
+            pass
+        # compacting also drops an incomplete last line, which the next record would otherwise be appended to
+        self.compact()
+        self.file = open(self.filename, "a")
+
+    def compact(self):
+        temporary = self.filename + ".part"
+        with open(temporary, "w") as f:
+            for path in sorted(self.entries):
+                f.write(json.dumps([path, self.entries[path]], sort_keys=True) + "\n")
+        os.rename(temporary, self.filename)
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def record(self, path, entry):
+        with self.lock:
+            self.entries[path] = entry
+            self.file.write(json.dumps([path, entry], sort_keys=True) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# transfer a file into the destination directory unless it is already there, returning how it was handled
+def sync_file(source, path, destination_directory, manifest, allow_hardlinks):
+    destination = os.path.join(destination_directory, path)
+    stat = os.stat(source)
+    entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+    recorded = manifest.get(path)
+    has_destination = os.path.isfile(destination) and os.path.getsize(destination) == stat.st_size
+
+    # skip files transferred by an earlier run, if their source has not changed since
+    if has_destination and recorded and recorded["size"] == entry["size"] and recorded["mtime"] == entry["mtime"]:
+        return "recorded"
+
+    # skip files that are already there with the same contents, e.g. after the manifest has been removed
+    if has_destination:
+        entry["sha256"] = get_checksum(source)
+        if get_checksum(destination) == entry["sha256"]:
+            manifest.record(path, entry)
+            return "unchanged"
+
+    make_directory(os.path.dirname(destination))
+    method = transfer(source, destination, allow_hardlinks)
+    manifest.record(path, entry)
+    return method
+
+
+def sync(sources, destination, allow_hardlinks):
+    make_directory(destination)
+    manifest = Manifest(destination)
+    files = list_files(sources)
+
+    pool = ThreadPool(max(1, min(MAX_CONCURRENT_TRANSFERS, len(files))))
+    try:
+        methods = pool.map(lambda item: sync_file(item[0], item[1], destination, manifest, allow_hardlinks), files)
+    finally:
+        pool.close()
+        manifest.close()
+
+    # summarize the transfers in standard output (STDOUT)
+    counts = {}
+    for method in methods:
+        counts[method] = counts.get(method, 0) + 1
+    print(json.dumps({"sources": sources, "destination": destination, "files": len(files), "methods": counts},
+                     indent=4, sort_keys=True))
+
+
+# the task is given by the name the script is saved as, or by its first argument
+task = sys.argv[1] if len(sys.argv) > 1 else os.path.splitext(os.path.basename(sys.argv[0]))[0]
+if task not in TASKS:
+    raise ValueError("Unknown task {}, expected one of {}".format(task, ", ".join(sorted(TASKS))))
+if task == "espresso_link_outdir_save":
+    # ph.x writes its own files into _ph0
+    make_directory(os.path.join(TASKS[task]["destination"], "_ph0"))
+sync(**TASKS[task])
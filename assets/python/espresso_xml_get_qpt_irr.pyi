@@ -5,10 +5,24 @@
 #                                                            #
 #  Expects control_ph.xml and patterns.?.xml files to exist  #
 #                                                            #
+#  Each file is only read up to the tag that is needed, and  #
+#  the patterns files are read concurrently. The entries are #
+#  printed as soon as each q-point has been read, so that    #
+#  the output can be consumed while it is being written.     #
+#                                                            #
+#  Missing files are reported before anything is printed. If #
+#  a patterns file can't be parsed, the script exits with an #
+#  error, leaving the JSON list printed so far unterminated  #
+#  (without its closing "]"), so that it can't be mistaken   #
+#  for the complete output.                                  #
+#                                                            #
 # ---------------------------------------------------------- #
 from __future__ import print_function
 import json
-from xml.dom import minidom
+import os
+import sys
+from multiprocessing.pool import ThreadPool
+from xml.etree import ElementTree
 
 {# JOB_WORK_DIR will be initialized at runtime => avoid substituion below #}
 {%- raw -%}
@@ -16,27 +30,52 @@ CONTROL_PH_FILENAME = "{{JOB_WORK_DIR}}/outdir/_ph0/__prefix__.phsave/control_ph
 PATTERNS_FILENAME = "{{JOB_WORK_DIR}}/outdir/_ph0/__prefix__.phsave/patterns.{}.xml"
 {%- endraw -%}
 
-# get integer content of an xml tag in a document
-def get_int_by_tag_name(doc, tag_name):
-    element = doc.getElementsByTagName(tag_name)
-    return int(element[0].firstChild.nodeValue)
+# maximum number of patterns files read at the same time
+MAX_CONCURRENT_READS = 8
+
+
+# get integer content of the first xml tag with the given name, reading the file only up to that tag
+def get_int_by_tag_name(filename, tag_name):
+    with open(filename, "rb") as xml_file:
+        for _, element in ElementTree.iterparse(xml_file):
+            # ignore any namespace, as minidom's getElementsByTagName did
+            if element.tag.rsplit("}", 1)[-1] == tag_name:
+                return int(element.text)
+            element.clear()
+    raise ValueError("No {} tag found in {}".format(tag_name, filename))
+
+
+# get number of irreducible representations of a q-point
+def get_number_of_irr(qpoint):
+    return get_int_by_tag_name(PATTERNS_FILENAME.format(qpoint), "NUMBER_IRR_REP")
+
+
+# print a value as an item of a JSON list, formatted as json.dumps(values, indent=4) would format it
+def print_list_item(value, is_first):
+    item = json.dumps(value, indent=4).replace("\n", "\n    ")
+    print(("\n" if is_first else ",\n") + "    " + item, end="")
 
-values = []
 
 # get number of q-points and cycle through them
-xmldoc = minidom.parse(CONTROL_PH_FILENAME)
-number_of_qpoints = get_int_by_tag_name(xmldoc, "NUMBER_OF_Q_POINTS")
-
-for i in range(number_of_qpoints):
-    # get number of irreducible representations per qpoint
-    xmldoc = minidom.parse(PATTERNS_FILENAME.format(i+1))
-    number_of_irr_per_qpoint = get_int_by_tag_name(xmldoc, "NUMBER_IRR_REP")
-    # add each distinct combination of qpoint and irr as a separate entry
-    for j in range(number_of_irr_per_qpoint):
-      values.append({
-          "qpoint": i + 1,
-          "irr": j + 1
-      })
-
-# store final values in standard output (STDOUT)
-print(json.dumps(values, indent=4))
+number_of_qpoints = get_int_by_tag_name(CONTROL_PH_FILENAME, "NUMBER_OF_Q_POINTS")
+for qpoint in range(1, number_of_qpoints + 1):
+    if not os.path.isfile(PATTERNS_FILENAME.format(qpoint)):
+        raise IOError("No such file: {}".format(PATTERNS_FILENAME.format(qpoint)))
+
+# store final values in standard output (STDOUT), adding each distinct combination of qpoint and irr as a separate entry
+print("[", end="")
+is_first = True
+pool = ThreadPool(max(1, min(MAX_CONCURRENT_READS, number_of_qpoints)))
+try:
+    # the results are returned in order of q-point, each as soon as it (and every earlier q-point) has been read
+    for i, number_of_irr_per_qpoint in enumerate(pool.imap(get_number_of_irr, range(1, number_of_qpoints + 1))):
+        for j in range(number_of_irr_per_qpoint):
+            print_list_item({
+                "qpoint": i + 1,
+                "irr": j + 1
+            }, is_first)
+            is_first = False
+        sys.stdout.flush()
+finally:
+    pool.close()
+print("]" if is_first else "\n]")
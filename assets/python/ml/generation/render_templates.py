@@ -7,9 +7,27 @@ generation of application flavors in the category of "models" (things such as ad
 This is the main script that carries out the rendering of templates, which produces various `.pyi` files. It begins
 by reading the `model.yaml` file, and for every model outlined in that file, it will generate one of the `.pyi` files
 based upon the configuration specified in this yaml file.
+
+Renders are incremental: a flavor is only re-rendered if its YAML document, the template, the general configuration, or
+this script have changed since the last render (pass `--force` to render everything). Flavors are rendered in parallel,
+and files are only written when their contents change.
+
+The script can also be imported, to render flavors from other tooling. `render_models` renders a batch of models in one
+call, and `render_flavor` renders a single one. The Jinja environment is created once per process, and the compiled
+templates are kept in an on-disk bytecode cache, so that repeated renders don't pay to set up or compile the templates
+again. For example:
+
+    import render_templates
+    config = render_templates.load_config()
+    flavors = render_templates.render_models(render_templates.load_models(), config, write=False)
 """
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
 import os
-from typing import Any
+from typing import Any, Dict, Iterable, List, Tuple
 import textwrap
 
 import jinja2.ext
@@ -18,7 +36,20 @@ import black
 
 MAX_CHARACTERS = 120
 
+# Paths are relative to this directory, so that the script can be run, or imported, from anywhere
+GENERATION_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIRECTORY = os.path.join(GENERATION_DIRECTORY, "templates")
+CONFIG_FILE = os.path.join(GENERATION_DIRECTORY, "config.yaml")
+
+# Hashes of the inputs of each flavor as of the last render, used to skip flavors whose inputs have not changed
+RENDER_CACHE_FILE = os.path.join(GENERATION_DIRECTORY, ".render_cache.json")
 
+# Compiled templates, shared between processes and between runs
+BYTECODE_CACHE_DIRECTORY = os.path.join(GENERATION_DIRECTORY, ".jinja_cache")
+
+
+# The same boilerplate is boxed for every model of a category, so the boxes are memoized on their inputs
+@functools.lru_cache(maxsize=None)
 def comment_box(value: str, documentation_box_common_text: str = "", maxlength: int = int(MAX_CHARACTERS // 2)) -> str:
     """
     Creates a comment box around a bunch of lines, up to a max length.
@@ -124,43 +155,364 @@ def quoted_strings(value: Any) -> Any:
     return result
 
 
-if __name__ == "__main__":
-    # Load general configuration
-    with open("config.yaml", "r") as inp:
-        config = yaml.safe_load(inp)
+def create_environment(template_directory: str = TEMPLATE_DIRECTORY,
+                       bytecode_cache_directory: str = BYTECODE_CACHE_DIRECTORY) -> jinja2.Environment:
+    """
+    Creates the Jinja environment that the templates are rendered with, populated with our filters.
+
+    Args:
+        template_directory: Directory the templates are loaded from
+        bytecode_cache_directory: Directory the compiled templates are cached in, or None to not cache them
 
+    Returns:
+        The Jinja environment
+    """
     # Tell Jinja where our templates are located
-    loader = jinja2.FileSystemLoader('templates/')
+    loader = jinja2.FileSystemLoader(template_directory)
+
+    # Templates are only compiled again when their source changes
+    bytecode_cache = None
+    if bytecode_cache_directory:
+        os.makedirs(bytecode_cache_directory, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_directory)
 
     # Populate the Jinja environment with our defined filters
-    env = jinja2.Environment(autoescape=True, loader=loader)
+    env = jinja2.Environment(autoescape=True, loader=loader, bytecode_cache=bytecode_cache)
     env.filters['quoted_strings'] = quoted_strings
     env.filters['generate_nonetype'] = generate_nonetype
     env.filters['comment_box'] = comment_box
     env.add_extension(jinja2.ext.do)
+    return env
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment(template_directory: str = TEMPLATE_DIRECTORY,
+                    bytecode_cache_directory: str = BYTECODE_CACHE_DIRECTORY) -> jinja2.Environment:
+    """
+    Returns the Jinja environment for a template directory, creating it on first use in each process. Jinja also keeps
+    the templates it has loaded in the environment, so each template is loaded once per process.
+    """
+    return create_environment(template_directory, bytecode_cache_directory)
+
+
+def format_source(source: str) -> str:
+    """
+    Formats the source code of a flavor with Black.
+
+    Args:
+        source: The source code
+
+    Returns:
+        The formatted source code
+    """
+    # Ensure pep8 compliance with Black
+    return black.format_str(source,
+                            mode=black.Mode(target_versions={black.TargetVersion.PY36,
+                                                             black.TargetVersion.PY37,
+                                                             black.TargetVersion.PY38},
+                                            line_length=MAX_CHARACTERS,
+                                            string_normalization=False,
+                                            is_pyi=False)
+                            )
+
+
+def render_flavor(template_name: str, variables: Dict[str, Any], template_directory: str = TEMPLATE_DIRECTORY,
+                  bytecode_cache_directory: str = BYTECODE_CACHE_DIRECTORY) -> str:
+    """
+    Renders a template, and formats the result with Black.
+
+    This is run in worker processes, each of which creates its Jinja environment once.
+
+    Args:
+        template_name: Name of the template, relative to the template directory
+        variables: Variables the template is rendered with
+        template_directory: Directory the templates are loaded from
+        bytecode_cache_directory: Directory the compiled templates are cached in, or None to not cache them
+
+    Returns:
+        The formatted source code of the flavor
+    """
+    environment = get_environment(template_directory, bytecode_cache_directory)
+    return format_source(environment.get_template(template_name).render(**variables))
+
+
+def hash_inputs(*inputs: Any) -> str:
+    """
+    Hashes the inputs of a render, so that it can be skipped if none of them have changed.
+
+    Args:
+        inputs: JSON-serializable objects (YAML documents, template sources, etc.)
+
+    Returns:
+        The hex digest of the inputs
+    """
+    digest = hashlib.sha256()
+    for item in inputs:
+        digest.update(json.dumps(item, sort_keys=True, default=str).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def write_if_changed(filename: str, content: str) -> bool:
+    """
+    Writes a file, unless it already has the given content. This leaves the modification times of unchanged flavors
+    alone.
+
+    Args:
+        filename: Path to the file
+        content: The content to write
+
+    Returns:
+        Whether the file was written
+    """
+    if os.path.exists(filename):
+        with open(filename, "r") as inp:
+            if inp.read() == content:
+                return False
+    with open(filename, "w") as outp:
+        outp.write(content)
+    return True
+
+
+class RenderCache(object):
+    """
+    The hashes of the inputs of each flavor as of the last render, kept in a JSON file, so that flavors whose inputs
+    have not changed can be skipped. Changes to the template, the general configuration, this script or Black also
+    change the output, so they are part of every flavor's inputs.
+    """
+
+    def __init__(self, filename: str, template_name: str, config: Dict[str, Any]):
+        """
+        Args:
+            filename: File the hashes are kept in, or None to render every flavor
+            template_name: Name of the template the flavors are rendered with
+            config: The general configuration
+        """
+        self.filename = filename
+        self.hashes = {}
+        if filename and os.path.exists(filename):
+            with open(filename, "r") as inp:
+                self.hashes = json.load(inp)
+        with open(os.path.join(TEMPLATE_DIRECTORY, template_name), "r") as template, open(__file__, "r") as script:
+            self.common_inputs = (config, template.read(), script.read(), black.__version__)
+        # The hashes of the inputs of the flavors checked in this render
+        self.input_hashes = {}
+
+    def is_unchanged(self, filename: str, *inputs: Any) -> bool:
+        """
+        Hashes the inputs of a flavor, and returns whether they are the same as in the last render.
+
+        Args:
+            filename: Path to the flavor's file, which must also still exist for the flavor to be unchanged
+            inputs: The inputs specific to the flavor (e.g. its YAML document)
+
+        Returns:
+            Whether the flavor is unchanged since the last render
+        """
+        self.input_hashes[filename] = hash_inputs(*self.common_inputs, *inputs)
+        return self.hashes.get(filename) == self.input_hashes[filename] and os.path.exists(filename)
+
+    def write(self, flavors: Dict[str, str]):
+        """
+        Writes the flavors that were rendered to their files, and saves the hashes of the inputs of every flavor that
+        was checked.
+
+        Args:
+            flavors: The source code of each flavor that was rendered, by its filename
+        """
+        for filename, content in flavors.items():
+            write_if_changed(filename, content)
+        if self.filename:
+            # Other flavors may have been rendered in other batches, so their hashes are kept
+            self.hashes.update(self.input_hashes)
+            with open(self.filename, "w") as outp:
+                json.dump(self.hashes, outp, indent=2, sort_keys=True)
+
+
+def load_config(filename: str = CONFIG_FILE) -> Dict[str, Any]:
+    """
+    Loads the general configuration of the renders. The output directory is made relative to the configuration file,
+    rather than to the current directory.
+
+    Args:
+        filename: Path to the configuration file
+
+    Returns:
+        The configuration
+    """
+    with open(filename, "r") as inp:
+        config = yaml.safe_load(inp)
+    config['pyml_render_output_directory'] = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                                                          config['pyml_render_output_directory'])
+    return config
+
+
+def load_models(template_type: str = "model") -> Tuple[Dict[str, Any], ...]:
+    """
+    Loads the configuration of each model from the YAML file of a template type (e.g. `model.yaml`).
+
+    Args:
+        template_type: Type of template, which names its YAML file and its template
+
+    Returns:
+        The configuration of each model
+    """
+    with open(os.path.join(GENERATION_DIRECTORY, f"{template_type}.yaml"), "r") as inp:
+        return tuple(yaml.safe_load_all(inp))
+
+
+def model_variants(models: Iterable[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], bool]]:
+    """
+    Lists the flavors rendered for some models. Models with a search space also get a hyperparameter search variant.
+
+    Args:
+        models: The configuration of each model
+
+    Returns:
+        A list of (model, is_hyperparameter_search) pairs
+    """
+    models = list(models)
+    variants = [(model, False) for model in models]
+    variants += [(model, True) for model in models if model.get("model_search_space")]
+    return variants
+
+
+def flavor_filename(model: Dict[str, Any], is_hyperparameter_search: bool, config: Dict[str, Any],
+                    template_type: str = "model") -> str:
+    """
+    Returns the path a flavor is rendered to.
+
+    Args:
+        model: The configuration of the model
+        is_hyperparameter_search: Whether this is the model's hyperparameter search variant
+        config: The general configuration
+        template_type: Type of template
+
+    Returns:
+        Path to the flavor's asset file
+    """
+    flavor_name = f"{model['name']}_{model['category']}"
+    if is_hyperparameter_search:
+        flavor_name += "_hyperparameter_search"
+    return os.path.join(config['pyml_render_output_directory'],
+                        f"pyml:{template_type}:{flavor_name.lower()}:{model['provider']}.pyi")
+
+
+def render_models(models: Iterable[Dict[str, Any]], config: Dict[str, Any], template_type: str = "model",
+                  jobs: int = None, force: bool = False, write: bool = True,
+                  render_cache_file: str = RENDER_CACHE_FILE) -> Dict[str, str]:
+    """
+    Renders the flavors of a batch of models, in parallel.
+
+    Args:
+        models: The configuration of each model
+        config: The general configuration
+        template_type: Type of template the models are rendered with
+        jobs: Number of processes to render with. With 1, flavors are rendered in this process, without the cost of
+              starting any others. Defaults to the number of cores.
+        force: Whether to render every flavor, even those whose inputs have not changed since the last render
+        write: Whether to write the flavors to their files. If False, the flavors are only returned.
+        render_cache_file: File the hashes of each flavor's inputs are kept in, or None to render every flavor
+
+    Returns:
+        The source code of each flavor that was rendered, by its filename. Flavors that are unchanged since the last
+        render are skipped, and not included.
+    """
+    template_name = f'{template_type}.pyi'
+    render_cache = RenderCache(render_cache_file, template_name, config)
+
+    # Work out which flavors need rendering
+    jobs_to_render = []
+    for model, is_hyperparameter_search in model_variants(models):
+        filename = flavor_filename(model, is_hyperparameter_search, config, template_type)
+        is_unchanged = render_cache.is_unchanged(filename, model, is_hyperparameter_search)
+        if is_unchanged and not force:
+            continue
+        jobs_to_render.append((filename, dict(**model, **config, is_hyperparameter_search=is_hyperparameter_search)))
+
+    # Perform the rendering. Black is by far the slowest part of it.
+    filenames = [filename for filename, _ in jobs_to_render]
+    variables = [variables for _, variables in jobs_to_render]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(jobs_to_render)))
+    if jobs == 1:
+        contents = [render_flavor(template_name, flavor_variables) for flavor_variables in variables]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            contents = list(pool.map(render_flavor, [template_name] * len(variables), variables))
+    flavors = dict(zip(filenames, contents))
+
+    if write:
+        render_cache.write(flavors)
+    return flavors
+
+
+def model_zoo_filename(category: str, config: Dict[str, Any]) -> str:
+    """
+    Returns the path the model zoo flavor of a category is rendered to.
+
+    Args:
+        category: The category of the models in the zoo, e.g. "regression"
+        config: The general configuration
+
+    Returns:
+        Path to the flavor's asset file
+    """
+    return os.path.join(config['pyml_render_output_directory'], f"pyml:model:model_zoo_{category}:sklearn.pyi")
+
+
+def render_model_zoos(models: Iterable[Dict[str, Any]], config: Dict[str, Any], force: bool = False,
+                      write: bool = True, render_cache_file: str = RENDER_CACHE_FILE) -> Dict[str, str]:
+    """
+    Renders a model zoo flavor for each supervised category (regression and classification) with more than one model,
+    which fits all of the category's models on the same training set at once, and ranks them.
+
+    Args:
+        models: The configuration of each model
+        config: The general configuration
+        force: Whether to render every zoo, even those whose inputs have not changed since the last render
+        write: Whether to write the flavors to their files. If False, the flavors are only returned.
+        render_cache_file: File the hashes of each flavor's inputs are kept in, or None to render every flavor
+
+    Returns:
+        The source code of each flavor that was rendered, by its filename
+    """
+    template_name = "model_zoo.pyi"
+    render_cache = RenderCache(render_cache_file, template_name, config)
+
+    flavors = {}
+    for category in ("regression", "classification"):
+        category_models = [model for model in models if model["category"] == category]
+        if len(category_models) < 2:
+            continue
+        filename = model_zoo_filename(category, config)
+        is_unchanged = render_cache.is_unchanged(filename, category_models)
+        if is_unchanged and not force:
+            continue
+        flavors[filename] = render_flavor(template_name, dict(**config, category=category, models=category_models))
+
+    if write:
+        render_cache.write(flavors)
+    return flavors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Renders the PythonML application flavors from their templates.")
+    parser.add_argument("--force", action="store_true",
+                        help="Render every flavor, even those whose inputs have not changed since the last render")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="Number of processes to render with (default: the number of cores)")
+    args = parser.parse_args()
 
     # Deal with model templates
-    template_type = "model"
-    template = env.get_template(f'{template_type}.pyi')
-
-    # Load model template configurations
-    with open(f"{template_type}.yaml", "r") as inp:
-        models = tuple(yaml.safe_load_all(inp))
-
-    # Perform the rendering
-    for model in models:
-        filename = os.path.join(config['pyml_render_output_directory'],
-                                f"pyml:{template_type}:{model['name']}_{model['category']}:{model['provider']}.pyi")
-        print(filename)
-        with open(filename, "w") as outp:
-            outp.write(
-                # Ensure pep8 compliance with Black
-                black.format_str(template.render(**model, **config),
-                                 mode=black.Mode(target_versions={black.TargetVersion.PY36,
-                                                                  black.TargetVersion.PY37,
-                                                                  black.TargetVersion.PY38},
-                                                 line_length=MAX_CHARACTERS,
-                                                 string_normalization=False,
-                                                 is_pyi=False)
-                                 )
-            )
+    config = load_config()
+    models = load_models("model")
+    flavors = render_models(models, config, "model", jobs=args.jobs, force=args.force)
+    for model, is_hyperparameter_search in model_variants(models):
+        filename = flavor_filename(model, is_hyperparameter_search, config)
+        relative_filename = os.path.relpath(filename, GENERATION_DIRECTORY)
+        print(relative_filename if filename in flavors else f"{relative_filename} (unchanged)")
+
+    # Deal with the model zoos, which fit several of the models at once
+    flavors = render_model_zoos(models, config, force=args.force)
+    for filename in flavors:
+        print(os.path.relpath(filename, GENERATION_DIRECTORY))
@@ -6,19 +6,47 @@
 {%- endif -%}
 
 {#- ========== Comment Block ========== -#}
-{{ description | comment_box(documentation_box_common_text=documentation_box_common_text[category]) | safe }}
+{%- if is_hyperparameter_search -%}
+    {% set comment_box_text = description ~ " " ~ hyperparameter_search_description %}
+{%- else -%}
+    {% set comment_box_text = description %}
+{%- endif -%}
+{{ comment_box_text | comment_box(documentation_box_common_text=documentation_box_common_text[category]) | safe }}
+
 
-{# ========== Imports Block ========== #}
-{%- for item in  imports -%}
-import {{ item }}
-{% endfor -%}
-import sklearn.metrics
 import numpy as np
 import settings
+{%- set is_incremental = incremental_model_class and not is_hyperparameter_search %}
+{%- if is_incremental %}
+
+# `n_epochs` is the number of passes made over the training set when the model is trained incrementally, in batches of
+# "training_batch_size" rows (see settings.py).
+n_epochs = 5
+{%- endif %}
+{%- if is_hyperparameter_search %}
+
+# Each candidate set of hyperparameters is scored by `n_folds`-fold cross-validation. In each round of the search, only
+# the best 1 / `halving_factor` of the candidates are kept, and they are trained on `halving_factor` times as many
+# samples as in the previous round.
+n_folds = 5
+halving_factor = 3
+{%- endif %}
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        {# ========== Imports Block ========== -#}
+        # The packages used to train the model are only imported when training
+        {%- for item in imports %}
+        import {{ item }}
+        {%- endfor %}
+        {%- if is_hyperparameter_search %}
+        # Enables the successive halving searches
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        import sklearn.model_selection
+        {%- endif %}
+        import sklearn.metrics
+
         {# ========== Load Training Data ========== -#}
         # Restore the data
         {%- if category != "clustering" %}
@@ -52,13 +80,90 @@ with settings.context as context:
                 {%- if ensemble %}
                 base_estimator=base_estimator,
                 {%- endif %}
+                {%- if parallel_arg %}
+                {{ parallel_arg }}={% if is_hyperparameter_search %}1{% else %}settings.get_n_cores(){% endif %},
+                {%- endif %}
         )
 
-        # Train the model and save
-        model.fit(train_descriptors{% if category != "clustering" %}, train_target{% endif %})
+        {% if is_hyperparameter_search -%}
+        # Search the hyperparameters by successive halving, in parallel over the cores allowed in settings.py
+        search_space = {
+            {%- for var, args in model_search_space.items() %}
+            "{{ var }}": [
+                {%- for arg in args -%}
+                {{ arg | generate_nonetype | quoted_strings | safe }}{% if not loop.last %}, {% endif %}
+                {%- endfor -%}
+            ],
+            {%- endfor %}
+        }
+        search = sklearn.model_selection.HalvingRandomSearchCV(
+            model,
+            search_space,
+            factor=halving_factor,
+            cv=n_folds,
+            n_jobs=settings.get_n_cores(),
+        )
+        with settings.thread_limits():
+            search.fit(train_descriptors, train_target)
+        print(f"Best hyperparameters: {search.best_params_}")
+
+        # The best model is saved under the same name as the regular flavor's model, so that it predicts the same way
+        model = search.best_estimator_
+        {%- if parallel_arg %}
+        # Each candidate was given one job, as the search runs them in parallel. The best model predicts with every core.
+        model.set_params({{ parallel_arg }}=settings.get_n_cores())
+        {%- endif %}
+        context.save(model, {{ name | quoted_strings | safe }})
+        {%- elif is_incremental -%}
+        # Train the model, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            if settings.training_batch_size:
+                # Train the model incrementally, reading one batch of the training set into memory at a time
+                {%- if model_default_args.positive %}
+                # SGD can't constrain the coefficients, so if the model above is set to be positive, they are projected
+                # back onto the non-negative ones after each batch
+                is_positive = model.positive
+                {%- endif %}
+                model = {{ incremental_model_class }}(
+                    {%- for var, arg in incremental_model_default_args.items() %}
+                    {{ var }}={{ arg | generate_nonetype | quoted_strings | safe }},
+                    {%- endfor %}
+                    {%- if incremental_model_derived_args %}
+                    # The regularization matches that of the model above
+                    {%- for var, expression in incremental_model_derived_args.items() %}
+                    {{ var }}={{ expression | safe }},
+                    {%- endfor %}
+                    {%- endif %}
+                )
+                for epoch in range(n_epochs):
+                    for rows in settings.batch_slices(train_descriptors.shape[0]):
+                        model.partial_fit(train_descriptors[rows]{% if category != "clustering" %}, train_target[rows]{% endif %})
+                        {%- if model_default_args.positive %}
+                        if is_positive:
+                            np.maximum(model.coef_, 0, out=model.coef_)
+                        {%- endif %}
+            else:
+                model.fit(train_descriptors{% if category != "clustering" %}, train_target{% endif %})
+
+        # Save the model
+        context.save(model, {{ name | quoted_strings | safe }})
+        {%- else -%}
+        # Train the model and save, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            model.fit(train_descriptors{% if category != "clustering" %}, train_target{% endif %})
         context.save(model, {{ name | quoted_strings | safe }})
-        train_{{ result_ending }} = model.predict(train_descriptors)
-        test_{{ result_ending }} = model.predict(test_descriptors)
+        {%- endif %}
+        {%- if is_tree_ensemble %}
+        if settings.is_using_compiled_trees:
+            # Also save the trees as flat arrays, which the predict workflow uses in place of the model
+            context.save(settings.CompiledTrees(model), {{ (name ~ "_compiled_trees") | quoted_strings | safe }})
+        {%- endif %}
+        with settings.thread_limits():
+            train_{{ result_ending }} = model.predict(train_descriptors)
+            test_{{ result_ending }} = model.predict(test_descriptors)
+            {%- if category == "classification" %}
+            test_probabilities = model.predict_proba(test_descriptors)
+            {%- endif %}
 
         {# ========== Regression Training Metrics ========== -#}
         {% if category == "regression" -%}
@@ -83,7 +188,6 @@ with settings.context as context:
         {# ========== Classification Training Metrics ========== -#}
         {% elif category == "classification" -%}
         # Save the probabilities of the model
-        test_probabilities = model.predict_proba(test_descriptors)
         context.save(test_probabilities, "test_probabilities")
 
         # Print some information to the screen for the regression problem
@@ -95,6 +199,23 @@ with settings.context as context:
 
         {% endif -%}
 
+        {# ========== Cross-Validation ========== -#}
+        {% if category != "clustering" -%}
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(
+                model,
+                train_descriptors,
+                train_target,
+                **context.load("cross_validation"),
+                {%- if category == "regression" %}
+                target_scaler=target_scaler,
+                {%- endif %}
+            )
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
+        {% endif -%}
+
         {# ========== Save the data ========== -#}
         context.save(train_{{ result_ending }}, "train_{{ result_ending }}")
         context.save(test_{{ result_ending }}, "test_{{ result_ending }}")
@@ -106,16 +227,21 @@ with settings.context as context:
         descriptors = context.load("descriptors")
 
         # Restore model
+        {%- if is_tree_ensemble %}
+        # The trees saved as flat arrays are used in place of the model, if they were saved when it was trained
+        if settings.is_using_compiled_trees and {{ (name ~ "_compiled_trees") | quoted_strings | safe }} in context:
+            model = context.load({{ (name ~ "_compiled_trees") | quoted_strings | safe }})
+        else:
+            model = context.load({{ name | quoted_strings | safe }})
+        {%- else %}
         model = context.load({{ name | quoted_strings | safe }})
-
-        # Make some predictions
-        predictions = model.predict(descriptors)
+        {%- endif %}
 
         {% if category == "classification" %}
-        # Transform predictions back to their original labels
-        label_encoder: sklearn.preprocessing.LabelEncoder = context.load("label_encoder")
-        predictions = label_encoder.inverse_transform(predictions)
+        # Predictions are transformed back to their original labels
+        label_encoder = context.load("label_encoder")
         {% endif %}
 
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv"
+                                    {%- if category == "classification" %}, postprocess=label_encoder.inverse_transform{% endif %})
@@ -0,0 +1,133 @@
+{#- ========== General setup ========== -#}
+{%- if category == "regression" -%}
+    {% set metric = "RMSE" %}
+{%- else -%}
+    {% set metric = "accuracy" %}
+{%- endif -%}
+
+{#- ========== Comment Block ========== -#}
+{{ model_zoo_description | comment_box(documentation_box_common_text=model_zoo_common_text) | safe }}
+
+
+import numpy as np
+import settings
+
+# `models_to_fit` is the list of models to screen, by their name in model.yaml. Remove any that aren't wanted.
+models_to_fit = [
+    {%- for model in models %}
+    "{{ model.name }}",
+    {%- endfor %}
+]
+
+
+def make_model(name: str):
+    """
+    Returns an unfitted model, with the same parameters as in its own flavor
+    """
+    {%- for model in models %}
+    {% if loop.first %}if{% else %}elif{% endif %} name == "{{ model.name }}":
+        {%- for item in model.imports %}
+        import {{ item }}
+        {%- endfor %}
+        {%- if model.ensemble %}
+
+        base_estimator = {{ model.base_estimator_class }}(
+            {%- for var, arg in model.base_estimator_default_args.items() %}
+            {{ var }}={{ arg | generate_nonetype | quoted_strings | safe }},
+            {%- endfor %}
+        )
+        {%- endif %}
+        return {{ model.model_class }}(
+            {%- for var, arg in model.model_default_args.items() %}
+            {{ var }}={{ arg | generate_nonetype | quoted_strings | safe }},
+            {%- endfor %}
+            {%- if model.ensemble %}
+            base_estimator=base_estimator,
+            {%- endif %}
+            {%- if model.parallel_arg %}
+            {{ model.parallel_arg }}=settings.get_n_cores(),
+            {%- endif %}
+        )
+    {%- endfor %}
+    raise ValueError(f"Unknown model '{name}'")
+
+
+with settings.context as context:
+    # Train
+    if settings.is_workflow_running_to_train:
+        import sklearn.metrics
+
+        # Restore the data, once for all of the models
+        train_target = context.load("train_target").reshape(-1)
+        test_target = context.load("test_target").reshape(-1)
+        train_descriptors = context.load("train_descriptors")
+        test_descriptors = context.load("test_descriptors")
+        {%- if category == "regression" %}
+
+        # Scale for RMSE calc on the test set
+        target_scaler = context.load("target_scaler")
+        y_true = target_scaler.inverse_transform(test_target.reshape(-1, 1))
+        {%- endif %}
+
+        # Fit the models in parallel processes (see "model_zoo_n_jobs" in settings.py)
+        fitted_models = settings.fit_models({name: make_model(name) for name in models_to_fit}, train_descriptors,
+                                            train_target)
+
+        # Score each model on the testing set, and save it under the same name as its own flavor does
+        leaderboard = []
+        for name, (model, fit_time) in fitted_models.items():
+            context.save(model, name)
+            with settings.thread_limits():
+                test_predictions = model.predict(test_descriptors)
+            {%- if category == "regression" %}
+            y_pred = target_scaler.inverse_transform(test_predictions.reshape(-1, 1))
+            score = np.sqrt(sklearn.metrics.mean_squared_error(y_true, y_pred))
+            {%- else %}
+            score = sklearn.metrics.accuracy_score(test_target, test_predictions)
+            {%- endif %}
+            leaderboard.append({"model": name, "{{ metric }}": float(score), "fit_time": fit_time})
+
+        # Rank the models, best first
+        leaderboard.sort(key=lambda entry: entry["{{ metric }}"]{% if category == "classification" %}, reverse=True{% endif %})
+        print(f"{'Model':<30} {'{{ metric }}':>12} {'Fit time (s)':>14}")
+        for entry in leaderboard:
+            print(f"{entry['model']:<30} {entry['{{ metric }}']:>12.6g} {entry['fit_time']:>14.2f}")
+        context.save(leaderboard, "model_zoo_leaderboard")
+
+        # Save the predictions of the best model, as its own flavor does
+        best_model_name = leaderboard[0]["model"]
+        context.save(best_model_name, "model_zoo_best_model")
+        model = fitted_models[best_model_name][0]
+        with settings.thread_limits():
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
+            {%- if category == "classification" %}
+            test_probabilities = model.predict_proba(test_descriptors)
+            {%- endif %}
+        {%- if category == "regression" %}
+        context.save(leaderboard[0]["RMSE"], "RMSE")
+        context.save(train_predictions.reshape(-1, 1), "train_predictions")
+        context.save(test_predictions.reshape(-1, 1), "test_predictions")
+        {%- else %}
+        context.save(test_probabilities, "test_probabilities")
+        context.save(sklearn.metrics.confusion_matrix(test_target, test_predictions), "confusion_matrix")
+        context.save(train_predictions, "train_predictions")
+        context.save(test_predictions, "test_predictions")
+        {%- endif %}
+
+    # Predict
+    else:
+        # Restore data
+        descriptors = context.load("descriptors")
+
+        # Restore the best model
+        model = context.load(context.load("model_zoo_best_model"))
+        {%- if category == "classification" %}
+
+        # Predictions are transformed back to their original labels
+        label_encoder = context.load("label_encoder")
+        {%- endif %}
+
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv"
+                                    {%- if category == "classification" %}, postprocess=label_encoder.inverse_transform{% endif %})
@@ -0,0 +1,57 @@
+# ----------------------------------------------------------------- #
+#                                                                   #
+#   Workflow Unit to set up k-fold cross-validation                 #
+#                                                                   #
+#   Has the model unit later in the workflow estimate its error by  #
+#   k-fold cross-validation, as well as on the testing set. The     #
+#   training set is split into `n_folds` folds, and the model is    #
+#   fit once per fold, on the other folds, then scored on the fold  #
+#   it was not fit on. The folds are fit in parallel processes (see #
+#   "cross_validation_n_jobs" in settings.py), which read the       #
+#   descriptors from the memory-mapped arrays in the context rather #
+#   than from copies. The mean and standard deviation of each       #
+#   metric over the folds are saved to the context.                 #
+#                                                                   #
+#   The folds are drawn once the model unit runs, so that rows      #
+#   removed by pre-processing units in between are left out of      #
+#   them. Classification folds keep the proportions of each class.  #
+#                                                                   #
+#   Can be used along with a train/test split, in which case only   #
+#   the training set is cross-validated. Clustering workflows are   #
+#   not cross-validated.                                            #
+#                                                                   #
+#   Does nothing in the case of predictions.                        #
+#                                                                   #
+# ----------------------------------------------------------------- #
+
+import numpy as np
+import settings
+
+# `n_folds` is the number of folds the training set is split into. Each row is held out of exactly one fold.
+n_folds = 5
+
+# `seed` sets the random shuffle of the rows before they are split into folds, so that the folds are reproducible
+seed = 0
+
+with settings.context as context:
+    # Train
+    if settings.is_workflow_running_to_train:
+        if settings.is_clustering:
+            raise ValueError("Clustering workflows can't be cross-validated, as they have no target to score against")
+
+        train_target = np.asarray(context.load("train_target")).reshape(-1)
+        if n_folds < 2 or n_folds > len(train_target):
+            raise ValueError(f"n_folds must be between 2 and the number of training rows ({len(train_target)})")
+        if settings.is_classification:
+            smallest_class = np.unique(train_target, return_counts=True)[1].min()
+            if smallest_class < n_folds:
+                print(f"The smallest class only has {smallest_class} rows, so some of the {n_folds} folds won't "
+                      f"include it")
+
+        # Saved for the model unit, which draws the folds
+        context.save({"n_folds": n_folds, "seed": seed, "is_stratified": settings.is_classification},
+                     "cross_validation")
+
+    # Predict
+    else:
+        pass
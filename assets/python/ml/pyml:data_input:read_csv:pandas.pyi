@@ -13,44 +13,245 @@
 #   Finally, whether the workflow is in training or predict mode,   #
 #   it will always read in a set of descriptors from a datafile     #
 #   defined in settings.py                                          #
+#                                                                   #
+#   Datasets too large to fit in memory can be read in chunks, by   #
+#   setting `chunk_size` below. Descriptors that are mostly zero    #
+#   can be read as sparse matrices, by setting                      #
+#   "is_using_sparse_descriptors" in settings.py.                   #
 # ----------------------------------------------------------------- #
 
 
+import numpy as np
 import pandas
-import sklearn.preprocessing
 import settings
 
-with settings.context as context:
-    data = pandas.read_csv(settings.datafile)
+# `chunk_size` controls how many rows of the datafile are read at a time.
+# If it is set to None (by default), the whole file is read into memory at once.
+# If it is set to a number of rows, the file is read in chunks of that many rows. Each chunk is written straight to the
+# context directory, so that the memory used is set by the chunk size rather than the size of the file. In this mode,
+# numeric descriptors are stored as 32-bit floats, and the others are stored as the codes of their categories. The
+# targets of regression and clustering are stored as 64-bit floats.
+chunk_size = None
+
+# When the descriptors are read as a sparse matrix (see "is_using_sparse_descriptors" in settings.py), without a
+# `chunk_size`, the file is converted `sparse_chunk_size` rows at a time
+sparse_chunk_size = 100000
+
+
+def read_distinct_values(columns):
+    """
+    Reads the distinct values of some columns of the datafile, a chunk at a time. Only these columns are parsed.
+
+    Args:
+        columns (dict): The names of the columns, mapped to the type to read each of them as, or to None to let pandas
+                        infer it (so that e.g. numeric labels stay numbers)
+
+    Returns:
+        dict: The sorted distinct values of each column, leaving out missing values
+    """
+    values = {name: set() for name in columns}
+    dtypes = {name: dtype for name, dtype in columns.items() if dtype is not None}
+    for chunk in pandas.read_csv(settings.datafile, usecols=list(columns), chunksize=chunk_size, dtype=dtypes):
+        for name in columns:
+            values[name].update(chunk[name].dropna().unique())
+    return {name: sorted(column_values) for name, column_values in values.items()}
+
+
+def write_chunks(context, target_names, descriptor_names, categories, label_encoder):
+    """
+    Reads the datafile in chunks of `chunk_size` rows, writing the target and the descriptors to the context as they
+    are read.
+
+    Args:
+        context (settings.Context): The context to write to
+        target_names (tuple): Names to save the target under, or None to not read a target (when predicting)
+        descriptor_names (tuple): Names to save the descriptors under
+        categories (dict): The categories of each categorical descriptor. The others must be numeric.
+        label_encoder (sklearn.preprocessing.LabelEncoder): Encodes the classification labels, or None
+
+    Returns:
+        list: The names of the descriptors that were expected to be numeric, but have non-numeric values in a chunk.
+              If there are any, the reading stops there, and nothing is saved.
+    """
+    category_indices = {name: pandas.Index(values) for name, values in categories.items()}
+    descriptor_writer = context.array_writer(*descriptor_names)
+    target_writer = context.array_writer(*target_names) if target_names else None
+    writers = [writer for writer in (descriptor_writer, target_writer) if writer is not None]
+    try:
+        for chunk in pandas.read_csv(settings.datafile, chunksize=chunk_size, dtype={name: str for name in categories}):
+            for name, index in category_indices.items():
+                # Categories that weren't seen in training (and missing values) are stored as missing values
+                codes = index.get_indexer(chunk[name]).astype(np.float32)
+                codes[codes < 0] = np.nan
+                chunk[name] = codes
+            if target_writer is not None:
+                # Handle the case where we are clustering
+                if settings.is_clustering:
+                    target = chunk.iloc[:, 0].to_numpy(dtype=np.float64)
+                elif label_encoder is not None:
+                    target = label_encoder.transform(chunk.pop(settings.target_column_name).to_numpy())
+                else:
+                    # The target is read as 64-bit floats whatever the first rows look like, so that e.g. a target
+                    # whose first values are whole numbers isn't truncated to integers
+                    target = chunk.pop(settings.target_column_name).to_numpy(dtype=np.float64)
+                target_writer.append(target.reshape(-1, 1))
+            non_numeric_names = [name for name in chunk.columns if not pandas.api.types.is_numeric_dtype(chunk[name])]
+            if non_numeric_names:
+                for writer in writers:
+                    writer.abort()
+                return non_numeric_names
+            descriptor_writer.append(chunk.to_numpy(dtype=np.float32))
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    for writer in writers:
+        writer.close()
+    return []
+
+
+def read_in_chunks(context, target_names, descriptor_names):
+    """
+    Reads the datafile in chunks of `chunk_size` rows, writing the target and the descriptors to the context as they
+    are read.
+
+    Numeric descriptors are stored as 32-bit floats. The others are read as categoricals, and stored as the codes of
+    their categories: the categories are found when training, and saved as "descriptor_categories" so that they're
+    given the same codes when predicting. When training, the types of the descriptors are inferred from the first
+    chunk. If a descriptor turns out to have non-numeric values in a later chunk, it's made categorical as well, and
+    the datafile is read again.
+
+    Args:
+        context (settings.Context): The context to write to
+        target_names (tuple): Names to save the target under, or None to not read a target (when predicting)
+        descriptor_names (tuple): Names to save the descriptors under
+
+    Raises:
+        ValueError: If, when predicting, a descriptor that was numeric in training has non-numeric values
+    """
+    if not target_names:
+        categories = context.load("descriptor_categories") if "descriptor_categories" in context else {}
+        non_numeric_names = write_chunks(context, target_names, descriptor_names, categories, None)
+        if non_numeric_names:
+            raise ValueError(f"The descriptors {non_numeric_names} have non-numeric values, but they were numeric "
+                             f"in the data the model was trained with")
+        return
+
+    first_chunk = pandas.read_csv(settings.datafile, nrows=chunk_size)
+    if not settings.is_clustering:
+        first_chunk = first_chunk.drop(columns=[settings.target_column_name])
+    categorical_names = [name for name in first_chunk.columns
+                         if not pandas.api.types.is_numeric_dtype(first_chunk[name])]
+
+    while True:
+        # Classification labels are encoded with values between 0 and (N_Classes - 1), which requires knowing every
+        # label up front. The labels and the categories of the descriptors are read in a first pass, which only
+        # parses their columns.
+        label_encoder = None
+        columns = {name: str for name in categorical_names}
+        if settings.is_classification:
+            columns[settings.target_column_name] = None
+        categories = read_distinct_values(columns) if columns else {}
+        if settings.is_classification:
+            import sklearn.preprocessing
+            label_encoder = sklearn.preprocessing.LabelEncoder().fit(categories.pop(settings.target_column_name))
+            context.save(label_encoder, "label_encoder")
+        context.save(categories, "descriptor_categories")
 
+        non_numeric_names = write_chunks(context, target_names, descriptor_names, categories, label_encoder)
+        if not non_numeric_names:
+            break
+        print(f"The descriptors {non_numeric_names} have non-numeric values after the first {chunk_size} rows: "
+              f"reading the datafile again, with them as categoricals")
+        categorical_names += non_numeric_names
+
+
+def read_sparse(context, target_names, descriptor_names):
+    """
+    Reads the datafile, converting the descriptors to a CSR sparse matrix as they are read. The file is read in chunks
+    of `chunk_size` rows (or `sparse_chunk_size`, if it isn't set), so that the descriptors are never held in memory
+    as a dense array all at once.
+
+    Args:
+        context (settings.Context): The context to write to
+        target_names (tuple): Names to save the target under, or None to not read a target
+        descriptor_names (tuple): Names to save the descriptors under
+    """
+    import scipy.sparse
+
+    targets = []
+    blocks = []
+    for chunk in pandas.read_csv(settings.datafile, chunksize=chunk_size or sparse_chunk_size):
+        if target_names:
+            # Handle the case where we are clustering
+            if settings.is_clustering:
+                targets.append(chunk.iloc[:, 0].to_numpy())
+            else:
+                targets.append(chunk.pop(settings.target_column_name).to_numpy())
+        blocks.append(scipy.sparse.csr_matrix(chunk.to_numpy(dtype=np.float64)))
+    descriptors = scipy.sparse.vstack(blocks, format="csr")
+    n_values = descriptors.shape[0] * descriptors.shape[1]
+    print(f"Read the descriptors as a sparse matrix: {descriptors.nnz} of {n_values} values are non-zero")
+    context.save(descriptors, *descriptor_names)
+
+    if target_names:
+        target = np.concatenate(targets)
+        # Classification labels are encoded with values between 0 and (N_Classes - 1)
+        if settings.is_classification:
+            import sklearn.preprocessing
+            label_encoder = sklearn.preprocessing.LabelEncoder()
+            target = label_encoder.fit_transform(target)
+            context.save(label_encoder, "label_encoder")
+        context.save(target.reshape(-1, 1), *target_names)
+
+
+with settings.context as context:
     # Train
     # By default, we don't do train/test splitting: the train and test represent the same dataset at first.
     # Other units (such as a train/test splitter) down the line can adjust this as-needed.
     if settings.is_workflow_running_to_train:
+        if settings.is_using_sparse_descriptors:
+            read_sparse(context, ("train_target", "test_target"), ("train_descriptors", "test_descriptors"))
+
+        elif chunk_size:
+            read_in_chunks(context, ("train_target", "test_target"), ("train_descriptors", "test_descriptors"))
 
-        # Handle the case where we are clustering
-        if settings.is_clustering:
-            target = data.to_numpy()[:, 0]  # Just get the first column, it's not going to get used anyway
         else:
-            target = data.pop(settings.target_column_name).to_numpy()
+            data = pandas.read_csv(settings.datafile)
 
-        # Handle the case where we are classifying. In this case, we must convert any labels provided to be categorical.
-        # Specifically, labels are encoded with values between 0 and (N_Classes - 1)
-        if settings.is_classification:
-            label_encoder = sklearn.preprocessing.LabelEncoder()
-            target = label_encoder.fit_transform(target)
-            context.save(label_encoder, "label_encoder")
+            # Handle the case where we are clustering
+            if settings.is_clustering:
+                target = data.to_numpy()[:, 0]  # Just get the first column, it's not going to get used anyway
+            else:
+                target = data.pop(settings.target_column_name).to_numpy()
+
+            # Handle the case where we are classifying. In this case, we must convert any labels provided to be
+            # categorical. Specifically, labels are encoded with values between 0 and (N_Classes - 1)
+            if settings.is_classification:
+                # sklearn takes a while to import, so it's only imported when it's used
+                import sklearn.preprocessing
+                label_encoder = sklearn.preprocessing.LabelEncoder()
+                target = label_encoder.fit_transform(target)
+                context.save(label_encoder, "label_encoder")
 
-        target = target.reshape(-1, 1)  # Reshape array from a row vector into a column vector
+            target = target.reshape(-1, 1)  # Reshape array from a row vector into a column vector
 
-        context.save(target, "train_target")
-        context.save(target, "test_target")
+            context.save(target, "train_target")
+            context.save(target, "test_target")
 
-        descriptors = data.to_numpy()
+            descriptors = data.to_numpy()
 
-        context.save(descriptors, "train_descriptors")
-        context.save(descriptors, "test_descriptors")
+            context.save(descriptors, "train_descriptors")
+            context.save(descriptors, "test_descriptors")
 
     else:
-        descriptors = data.to_numpy()
-        context.save(descriptors, "descriptors")
+        if settings.is_using_sparse_descriptors:
+            read_sparse(context, None, ("descriptors",))
+
+        elif chunk_size:
+            read_in_chunks(context, None, ("descriptors",))
+
+        else:
+            data = pandas.read_csv(settings.datafile)
+            descriptors = data.to_numpy()
+            context.save(descriptors, "descriptors")
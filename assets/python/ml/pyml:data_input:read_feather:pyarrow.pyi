@@ -0,0 +1,219 @@
+# ----------------------------------------------------------------- #
+#                                                                   #
+#   Workflow Unit to read in data for the ML workflow, from a       #
+#   binary copy of the datafile.                                    #
+#                                                                   #
+#   The first time a CSV datafile is read, it is converted to the   #
+#   Arrow (Feather) format and stored in `dataset_cache_dir` below, #
+#   along with a schema of its columns and their types. Later runs  #
+#   with the same datafile (found by its contents, so copies of it  #
+#   in other jobs are found too) memory-map the converted file      #
+#   instead of parsing the CSV again. Datafiles that are already    #
+#   in the Feather or Parquet format are read directly.             #
+#                                                                   #
+#   Otherwise, this unit is a drop-in replacement for the read_csv  #
+#   unit. In training mode, the target (from "target_column_name"   #
+#   in settings.py) and the descriptors are saved, along with the   #
+#   schema of the descriptors. In predict mode, the descriptors are #
+#   converted to the types they were trained with, and an error is  #
+#   raised if any of them are missing or can't be converted.        #
+# ----------------------------------------------------------------- #
+
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pyarrow
+import pyarrow.csv
+import pyarrow.feather
+import settings
+
+# `dataset_cache_dir` is the directory the converted datafiles are kept in. It is shared by every job of this user, so
+# that a dataset is only converted once. Set it to None to keep the converted datafile next to the datafile instead.
+dataset_cache_dir = os.path.join(os.path.expanduser("~"), ".pyml_datasets")
+
+# The number of bytes of the datafile read at a time, when computing its checksum
+checksum_chunk_size = 1 << 24
+
+
+def get_checksum(filename: str) -> str:
+    """
+    Returns the BLAKE2 checksum of a file's contents, which names its converted copy
+    """
+    checksum = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(checksum_chunk_size), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_schema(table: pyarrow.Table) -> dict:
+    """
+    Returns the name and type of each column of a table, in order
+    """
+    return {field.name: str(field.type) for field in table.schema}
+
+
+def write_atomically(path: str, write):
+    """
+    Writes a file under a temporary name, then renames it to `path`, so that a partially written file is never read
+    (e.g. by another job converting the same dataset)
+
+    Args:
+        path (str): Destination path
+        write (callable): Function taking an open binary file handle, which writes the contents of the file
+    """
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as file_handle:
+            write(file_handle)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def convert(filename: str, path: str) -> pyarrow.Table:
+    """
+    Parses a CSV datafile (in parallel), and writes it to `path` in the Feather format, alongside its schema.
+
+    Args:
+        filename (str): The CSV datafile
+        path (str): Where to write the Feather file. The schema is written to the same path, with a .json extension.
+
+    Returns:
+        pyarrow.Table: The parsed datafile
+    """
+    table = pyarrow.csv.read_csv(filename)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomically(path, lambda file_handle: pyarrow.feather.write_feather(table, file_handle,
+                                                                             compression="uncompressed"))
+    schema = {"source": os.path.basename(filename), "n_rows": table.num_rows, "columns": get_schema(table)}
+    write_atomically(os.path.splitext(path)[0] + ".json",
+                     lambda file_handle: file_handle.write(json.dumps(schema, indent=4).encode()))
+    print(f"Converted {filename} ({table.num_rows} rows, {table.num_columns} columns) to {path}")
+    return table
+
+
+def read_table(filename: str) -> pyarrow.Table:
+    """
+    Reads the datafile. CSV datafiles are converted once, and their converted copy is memory-mapped on later runs.
+
+    Args:
+        filename (str): The datafile, in the CSV, Feather or Parquet format
+
+    Returns:
+        pyarrow.Table: The contents of the datafile
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".feather", ".arrow"):
+        return pyarrow.feather.read_table(filename, memory_map=True)
+    if extension == ".parquet":
+        from pyarrow import parquet
+        return parquet.read_table(filename, memory_map=True)
+
+    # The converted copy is named by the datafile's contents
+    directory = dataset_cache_dir or os.path.dirname(os.path.abspath(filename))
+    path = os.path.join(directory, get_checksum(filename) + ".feather")
+    if os.path.exists(path):
+        print(f"Reading {filename} from its converted copy, {path}")
+        return pyarrow.feather.read_table(path, memory_map=True)
+    return convert(filename, path)
+
+
+def conform(table: pyarrow.Table, schema: dict) -> pyarrow.Table:
+    """
+    Returns the columns of a table in the order and with the types given by a schema. Other columns (such as the
+    target) are left out.
+
+    Args:
+        table (pyarrow.Table): The table to conform
+        schema (dict): The name and type (as a string) of each column, as returned by get_schema
+
+    Returns:
+        pyarrow.Table: The conformed table
+    """
+    missing_columns = [name for name in schema if name not in table.column_names]
+    if missing_columns:
+        raise ValueError(f"The columns {', '.join(missing_columns)} that the model was trained with are missing "
+                         f"from {settings.datafile}")
+
+    columns = []
+    for name, alias in schema.items():
+        column = table.column(name)
+        if str(column.type) != alias:
+            # Only casts that don't lose information are made, e.g. from 1.0 to 1 but not from 1.5 to 1
+            try:
+                column = column.cast(pyarrow.type_for_alias(alias))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError) as error:
+                raise ValueError(f"Column '{name}' of {settings.datafile} is {column.type}, and can't be converted "
+                                 f"to the type the model was trained with, {alias}: {error}")
+        columns.append(column)
+    return pyarrow.table(columns, names=list(schema))
+
+
+def to_descriptors(table: pyarrow.Table):
+    """
+    Returns the columns of a table as an array of descriptors, or a CSR sparse matrix if
+    "is_using_sparse_descriptors" is set in settings.py
+    """
+    descriptors = table.to_pandas(split_blocks=True).to_numpy()
+    if settings.is_using_sparse_descriptors:
+        import scipy.sparse
+        descriptors = scipy.sparse.csr_matrix(descriptors.astype(np.float64))
+    return descriptors
+
+
+with settings.context as context:
+    # Train
+    # By default, we don't do train/test splitting: the train and test represent the same dataset at first.
+    # Other units (such as a train/test splitter) down the line can adjust this as-needed.
+    if settings.is_workflow_running_to_train:
+        data = read_table(settings.datafile)
+
+        # Handle the case where we are clustering
+        if settings.is_clustering:
+            target = data.column(0).to_numpy()  # Just get the first column, it's not going to get used anyway
+        else:
+            if settings.target_column_name not in data.column_names:
+                raise ValueError(f"The target column '{settings.target_column_name}' (target_column_name in settings.py)"
+                                 f" is not one of the columns of {settings.datafile}: {', '.join(data.column_names)}")
+            target = data.column(settings.target_column_name).to_numpy()
+            data = data.drop([settings.target_column_name])
+
+        # Handle the case where we are classifying. In this case, we must convert any labels provided to be
+        # categorical. Specifically, labels are encoded with values between 0 and (N_Classes - 1)
+        if settings.is_classification:
+            # sklearn takes a while to import, so it's only imported when it's used
+            import sklearn.preprocessing
+            label_encoder = sklearn.preprocessing.LabelEncoder()
+            target = label_encoder.fit_transform(target)
+            context.save(label_encoder, "label_encoder")
+
+        target = target.reshape(-1, 1)  # Reshape array from a row vector into a column vector
+
+        context.save(target, "train_target")
+        context.save(target, "test_target")
+
+        # The target column and the schema of the descriptors are kept for the predict workflow
+        context.save({"target_column_name": None if settings.is_clustering else settings.target_column_name,
+                      "columns": get_schema(data)}, "dataset_schema")
+
+        descriptors = to_descriptors(data)
+
+        context.save(descriptors, "train_descriptors")
+        context.save(descriptors, "test_descriptors")
+
+    else:
+        # The descriptors are put in the same order, and given the same types, as they were trained with
+        dataset_schema = context.load("dataset_schema")
+        if dataset_schema["target_column_name"] not in (None, settings.target_column_name):
+            raise ValueError(f"The model was trained to predict '{dataset_schema['target_column_name']}', but "
+                             f"target_column_name in settings.py is '{settings.target_column_name}'")
+        data = conform(read_table(settings.datafile), dataset_schema["columns"])
+        descriptors = to_descriptors(data)
+        context.save(descriptors, "descriptors")
@@ -12,7 +12,6 @@
 #                                                                   #
 # ----------------------------------------------------------------- #
 
-import sklearn.model_selection
 import numpy as np
 import settings
 
@@ -23,6 +22,9 @@ percent_held_as_test = {{ mlTrainTestSplit.fraction_held_as_test_set }}
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        # sklearn is only needed to split the data, so it isn't imported when predicting
+        import sklearn.model_selection
+
         # Load training data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
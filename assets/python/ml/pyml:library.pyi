@@ -0,0 +1,1900 @@
+# ----------------------------------------------------------------- #
+#                                                                   #
+#   Library of the PythonML jobs on the Exabyte.io Platform         #
+#                                                                   #
+#   This file shouldn't be modified by users. It is imported by     #
+#   settings.py, which re-exports what the workflow units use, so   #
+#   units keep calling e.g. settings.context. The variables used    #
+#   here are defined in settings.py, and are read from it when      #
+#   they're used.                                                   #
+#                                                                   #
+#   Included here is the "Context" object, which helps maintain     #
+#   certain Python objects between workflow units, and between      #
+#   predict runs, along with the tools the units share.             #
+#                                                                   #
+#   Numpy arrays and pandas DataFrames are stored in columnar       #
+#   formats (.npy and Arrow/Feather), and are memory-mapped when    #
+#   they are loaded. Any other object is stored with pickle. Each   #
+#   type of object can optionally be compressed, and float arrays   #
+#   can be stored as float32, to make the context smaller.          #
+# ----------------------------------------------------------------- #
+
+
+import collections, contextlib, hashlib, io, json, pickle, os, shutil, struct, sys, tempfile, time
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # File locks aren't available on Windows, where the context index is written without one
+    fcntl = None
+
+# The settings.py module this library is configured by. settings.py sets it with configure() as it imports the library.
+settings = None
+
+
+def configure(settings_module):
+    """
+    Sets the settings.py module that the variables used by this library (e.g. "context_dir_pathname") are read from
+
+    Args:
+        settings_module (module): The settings.py module, as it is being imported
+    """
+    global settings
+    settings = settings_module
+
+
+def _atomic_write(path: str, write):
+    """
+    Writes a file by first writing to a temporary file in the same directory, then renaming it over the destination.
+
+    The rename leaves any memory-mapped views of the previous file intact, and readers never see a partial file.
+
+    Args:
+        path (str): Destination path
+        write (callable): Function taking an open binary file handle, which writes the contents of the file
+    """
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as file_handle:
+            write(file_handle)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+# The storage backends used by the "Context" class below. Each backend is responsible for one kind of object, and
+# knows how to write it to disk and read it back. When an object is saved, the first backend whose "accepts" method
+# returns True is used. When an object is loaded, the backend is found by the extension of the file.
+class PickleBackend(object):
+    """
+    Stores any pickle-able object. This is the fallback for objects no other backend accepts (models, scalers, etc).
+    """
+
+    extension = ".pkl"
+
+    @staticmethod
+    def accepts(obj: object) -> bool:
+        return True
+
+    @staticmethod
+    def write(obj: object, file_handle):
+        pickle.dump(obj, file_handle)
+
+    @staticmethod
+    def read(file_handle):
+        return pickle.load(file_handle)
+
+    @staticmethod
+    def dump(obj: object, path: str):
+        # Replace rather than overwrite the file, as it may be hard-linked elsewhere (e.g. in the unit cache)
+        if os.path.exists(path):
+            os.remove(path)
+        with open(path, "wb") as file_handle:
+            pickle.dump(obj, file_handle)
+
+    @staticmethod
+    def load(path: str):
+        with open(path, "rb") as file_handle:
+            obj = pickle.load(file_handle)
+        return obj
+
+
+class NumpyBackend(object):
+    """
+    Stores numeric Numpy arrays in the .npy format. Arrays are loaded as read-only, memory-mapped views of the file, so
+    they are neither deserialized nor copied into memory when they are loaded.
+    """
+
+    extension = ".npy"
+
+    @staticmethod
+    def accepts(obj: object) -> bool:
+        return isinstance(obj, np.ndarray) and not obj.dtype.hasobject
+
+    @staticmethod
+    def write(obj: np.ndarray, file_handle):
+        np.save(file_handle, obj, allow_pickle=False)
+
+    @staticmethod
+    def read(file_handle) -> np.ndarray:
+        return np.load(file_handle, allow_pickle=False)
+
+    @staticmethod
+    def dump(obj: np.ndarray, path: str):
+        _atomic_write(path, lambda file_handle: NumpyBackend.write(obj, file_handle))
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        # np.asarray drops the np.memmap subclass, but still returns a view into the memory-mapped file
+        return np.asarray(np.load(path, mmap_mode="r", allow_pickle=False))
+
+
+class FeatherBackend(object):
+    """
+    Stores pandas DataFrames in the Arrow (Feather) format, if pyarrow is installed. The file is memory-mapped when
+    loaded. DataFrames that Feather can't represent (non-default index, non-string column names) fall back to pickle.
+    """
+
+    extension = ".feather"
+
+    @staticmethod
+    def accepts(obj: object) -> bool:
+        # If pandas hasn't been imported, the object can't be a DataFrame
+        pandas = sys.modules.get("pandas")
+        if pandas is None or not isinstance(obj, pandas.DataFrame):
+            return False
+        try:
+            import pyarrow.feather
+        except ImportError:
+            return False
+        has_default_index = isinstance(obj.index, pandas.RangeIndex) and obj.index.start == 0 and obj.index.step == 1
+        return has_default_index and all(isinstance(column, str) for column in obj.columns)
+
+    @staticmethod
+    def write(obj: object, file_handle):
+        import pyarrow.feather
+        pyarrow.feather.write_feather(obj, file_handle, compression="uncompressed")
+
+    @staticmethod
+    def read(file_handle):
+        import pyarrow.feather
+        return pyarrow.feather.read_table(file_handle).to_pandas(split_blocks=True)
+
+    @staticmethod
+    def dump(obj: object, path: str):
+        _atomic_write(path, lambda file_handle: FeatherBackend.write(obj, file_handle))
+
+    @staticmethod
+    def load(path: str):
+        import pyarrow.feather
+        table = pyarrow.feather.read_table(path, memory_map=True)
+        return table.to_pandas(split_blocks=True)
+
+
+def is_sparse(obj: object) -> bool:
+    """
+    Returns whether an object is a SciPy sparse matrix. If SciPy hasn't been imported, the object can't be one.
+    """
+    scipy_sparse = sys.modules.get("scipy.sparse")
+    return scipy_sparse is not None and scipy_sparse.issparse(obj)
+
+
+class SparseBackend(object):
+    """
+    Stores SciPy sparse matrices in the .npz format written by scipy.sparse.save_npz, as the indices and values of
+    their non-zero entries. They are read into memory when loaded.
+    """
+
+    extension = ".npz"
+
+    @staticmethod
+    def accepts(obj: object) -> bool:
+        return is_sparse(obj)
+
+    @staticmethod
+    def write(obj: object, file_handle):
+        import scipy.sparse
+        scipy.sparse.save_npz(file_handle, obj, compressed=False)
+
+    @staticmethod
+    def read(file_handle):
+        import scipy.sparse
+        return scipy.sparse.load_npz(file_handle)
+
+    @staticmethod
+    def dump(obj: object, path: str):
+        _atomic_write(path, lambda file_handle: SparseBackend.write(obj, file_handle))
+
+    @staticmethod
+    def load(path: str):
+        import scipy.sparse
+        return scipy.sparse.load_npz(path)
+
+
+def _compressor(compression: str):
+    """
+    Returns the functions used to compress and decompress data in a compression format. The compression libraries are
+    optional, so they are only imported once they're used.
+
+    Args:
+        compression (str): "zstd", "lz4" or "gzip"
+
+    Returns:
+        tuple: The compress and decompress functions, each taking and returning bytes
+    """
+    if compression == "zstd":
+        import zstandard
+        # zstd compresses on all of the cores
+        return zstandard.ZstdCompressor(threads=-1).compress, zstandard.ZstdDecompressor().decompress
+    elif compression == "lz4":
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    elif compression == "gzip":
+        import gzip
+        return gzip.compress, gzip.decompress
+    raise ValueError(f"Unknown compression '{compression}'. It must be either 'zstd', 'lz4', 'gzip', or None.")
+
+
+def _downcast_floats(obj: object):
+    """
+    Converts the float64 values of a Numpy array, a pandas DataFrame or a sparse matrix to float32
+
+    Returns:
+        tuple: The downcast object, and the largest relative error it introduced. If the object has no float64 values,
+               or has values that are out of the range of float32, the object is returned unchanged with an error of
+               None.
+    """
+    pandas = sys.modules.get("pandas")
+    if isinstance(obj, np.ndarray):
+        if obj.dtype != np.float64:
+            return obj, None
+        values = obj
+        downcast = downcast_values = obj.astype(np.float32)
+    elif is_sparse(obj):
+        if obj.dtype != np.float64:
+            return obj, None
+        downcast = obj.astype(np.float32)
+        # Only the non-zero values are stored, so only they can change
+        values, downcast_values = obj.tocsr().data, downcast.tocsr().data
+    elif pandas is not None and isinstance(obj, pandas.DataFrame):
+        columns = [column for column, dtype in obj.dtypes.items() if dtype == np.float64]
+        if not columns:
+            return obj, None
+        values = obj[columns].to_numpy()
+        downcast = obj.astype(dict.fromkeys(columns, np.float32))
+        downcast_values = downcast[columns].to_numpy()
+    else:
+        return obj, None
+
+    is_finite = np.isfinite(values)
+    if (np.isfinite(downcast_values) != is_finite).any():
+        return obj, None
+    is_nonzero = is_finite & (values != 0)
+    errors = np.abs(downcast_values[is_nonzero] - values[is_nonzero]) / np.abs(values[is_nonzero])
+    return downcast, float(errors.max()) if errors.size else 0.0
+
+
+def _object_size(obj: object) -> int:
+    """
+    Returns the size of the values of an array or DataFrame, in bytes
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if is_sparse(obj):
+        obj = obj.tocsr()
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    return int(obj.memory_usage(index=False).sum())
+
+
+class SavePolicy(object):
+    """
+    Wraps a backend, to change how the type of object it stores is saved. The objects can be compressed (with zstd, lz4
+    or gzip), and float arrays and DataFrames can be downcast to float32. Both make the files smaller, and so make the
+    context quicker to copy into the predict workflow and to load. What each saves, and the largest rounding error
+    introduced by downcasting, is printed as each object is saved.
+
+    Compressed files are decompressed into memory when they are loaded, so unlike uncompressed arrays and DataFrames,
+    they aren't memory-mapped.
+
+    Attributes:
+        backend: The backend being wrapped
+        compression (str): "zstd", "lz4", "gzip", or None to not compress
+        is_downcasting_floats (bool): Whether float64 values are saved as float32
+        extension (str): Extension of the files written, e.g. ".npy.zst"
+    """
+
+    compression_extensions = {"zstd": ".zst", "lz4": ".lz4", "gzip": ".gz"}
+
+    def __init__(self, backend, compression: str = None, is_downcasting_floats: bool = False):
+        if compression is not None and compression not in self.compression_extensions:
+            raise ValueError(f"Unknown compression '{compression}'. It must be either 'zstd', 'lz4', 'gzip', or None.")
+        self.backend = backend
+        self.compression = compression
+        self.is_downcasting_floats = is_downcasting_floats
+        self.extension = backend.extension + self.compression_extensions.get(compression, "")
+
+    def accepts(self, obj: object) -> bool:
+        return self.backend.accepts(obj)
+
+    def prepare(self, obj: object, name: str) -> object:
+        """
+        Returns the object as it will be saved. This is called by Context.save() before the object is either written
+        or kept in memory, so that later units see the same values either way.
+        """
+        if not self.is_downcasting_floats:
+            return obj
+        downcast, error = _downcast_floats(obj)
+        if error is not None:
+            print(f"Downcast {name} to float32: {_object_size(obj)} -> {_object_size(downcast)} bytes, largest "
+                  f"relative error {error:.2e}")
+        return downcast
+
+    def dump(self, obj: object, path: str):
+        if self.compression is None:
+            self.backend.dump(obj, path)
+            return
+        compress, _ = _compressor(self.compression)
+        buffer = io.BytesIO()
+        self.backend.write(obj, buffer)
+        data = compress(buffer.getbuffer())
+        _atomic_write(path, lambda file_handle: file_handle.write(data))
+        print(f"Compressed {os.path.basename(path)} with {self.compression}: {buffer.tell()} -> {len(data)} bytes")
+
+    def load(self, path: str):
+        if self.compression is None:
+            return self.backend.load(path)
+        _, decompress = _compressor(self.compression)
+        with open(path, "rb") as file_handle:
+            data = decompress(file_handle.read())
+        return self.backend.read(io.BytesIO(data))
+
+
+def _link_or_copy(source: str, destination: str):
+    """
+    Makes the file at "destination" a hard link to "source", falling back to a copy if the filesystem doesn't support
+    hard links. Any existing file at "destination" is atomically replaced.
+    """
+    temporary_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        os.link(source, temporary_path)
+    except OSError:
+        shutil.copyfile(source, temporary_path)
+    os.replace(temporary_path, destination)
+
+
+class ArrayWriter(object):
+    """
+    Writes a Numpy array to a .npy file one block of rows at a time, so that the full array never has to be held in
+    memory. The number of rows doesn't need to be known ahead of time: space is reserved at the start of the file for
+    the header, which is written when the writer is closed.
+
+    Typically obtained from Context.array_writer():
+
+        with context.array_writer("train_descriptors") as writer:
+            for block in blocks:
+                writer.append(block)
+    """
+
+    # Bytes reserved for the .npy header. Numpy aligns the start of the data to a multiple of 64 bytes.
+    header_size = 256
+
+    def __init__(self, path: str, on_close=None):
+        """
+        Args:
+            path (str): Path of the .npy file to write
+            on_close (callable): Called without arguments once the file has been written
+        """
+        self.path = path
+        self.dtype = None
+        self.row_shape = None
+        self.n_rows = 0
+        self._on_close = on_close
+        file_descriptor, self._temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        self._file_handle = os.fdopen(file_descriptor, "wb")
+        self._file_handle.write(b"\x00" * self.header_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, block):
+        """
+        Appends rows to the array. The dtype and the shape of each row are set by the first block. Later blocks are
+        cast to that dtype, as long as no values are lost: e.g. floats can't be appended to an array of integers.
+
+        Args:
+            block (array-like): Rows to append
+
+        Raises:
+            ValueError: If the rows have a different shape, or can't be cast to the array's dtype without losing values
+        """
+        block = np.asarray(block)
+        if self.dtype is None:
+            self.dtype = block.dtype
+            self.row_shape = block.shape[1:]
+        elif block.shape[1:] != self.row_shape:
+            raise ValueError(f"Cannot append rows of shape {block.shape[1:]} to an array with rows of shape "
+                             f"{self.row_shape}")
+        # Casting between kinds (e.g. from floats to integers) is refused outright. Within a kind (e.g. from 64-bit to
+        # 32-bit floats), the block is only accepted if its values survive the cast.
+        is_lossless = np.can_cast(block.dtype, self.dtype)
+        if not is_lossless and np.can_cast(block.dtype, self.dtype, "same_kind"):
+            round_trip = block.astype(self.dtype).astype(block.dtype)
+            is_lossless = np.array_equal(round_trip, block, equal_nan=block.dtype.kind in "fc")
+        if not is_lossless:
+            raise ValueError(f"Cannot append rows of dtype {block.dtype} to an array of dtype {self.dtype} without "
+                             f"losing values")
+        np.ascontiguousarray(block, dtype=self.dtype).tofile(self._file_handle)
+        self.n_rows += len(block)
+
+    def close(self):
+        """
+        Writes the header and moves the finished file into place
+        """
+        if self.dtype is None:
+            self.abort()
+            raise ValueError(f"No data was appended to {self.path}")
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.n_rows,) + self.row_shape,
+        }).encode("latin1")
+        # The header is preceded by the magic string and version (8 bytes), and its own length (2 bytes)
+        header = header.ljust(self.header_size - 10 - 1) + b"\n"
+        if len(header) != self.header_size - 10:
+            self.abort()
+            raise ValueError(f"The header for {self.path} does not fit in {self.header_size} bytes")
+        self._file_handle.seek(0)
+        self._file_handle.write(np.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header)
+        self._file_handle.close()
+        os.replace(self._temporary_path, self.path)
+        if self._on_close is not None:
+            self._on_close()
+
+    def abort(self):
+        """
+        Discards everything written so far
+        """
+        self._file_handle.close()
+        if os.path.exists(self._temporary_path):
+            os.remove(self._temporary_path)
+
+
+def _digest_object(obj: object) -> str:
+    """
+    Returns a hash of an object's contents. Numeric arrays are hashed from their data, anything else from its pickle.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        hasher.update(repr((obj.dtype.str, obj.shape)).encode())
+        hasher.update(np.ascontiguousarray(obj).data)
+    else:
+        hasher.update(pickle.dumps(obj, protocol=4))
+    return hasher.hexdigest()
+
+
+class UnitCache(object):
+    """
+    Stores the outputs of workflow units, so that a unit that is re-run with the same inputs can be skipped.
+
+    Entries are keyed by a hash of the unit's source code (along with settings.py, this module, and the path, size and
+    modification time of the datafile), by hashes of the context objects the unit loaded, and by whether the objects
+    it only checked for were in the context.
+    The outputs of an entry are the context objects the unit saved, and any files it wrote to the working directory.
+    Once the cache grows past "max_bytes", the least recently used entries are evicted.
+
+    The cache is used by the Context object: entering "with settings.context" either restores a unit's outputs from
+    the cache and exits the unit, or starts recording what the unit loads and saves.
+    """
+
+    manifest_basename = "manifest.json"
+    digests_basename = "digests.json"
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Args:
+            cache_dir (str): Directory the cache is stored in
+            max_bytes (int): Size the cache is evicted down to after each new entry
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # Hashes of source files and of objects loaded from disk, of the format {"path:size:mtime": hash}, so files are
+        # only hashed once
+        digests_path = os.path.join(cache_dir, self.digests_basename)
+        self._file_digests = {}
+        if os.path.exists(digests_path):
+            with open(digests_path, "r") as file_handle:
+                self._file_digests = json.load(file_handle)
+
+    def digest(self, context, name: str) -> str:
+        """
+        Returns the hash of an object in the context
+        """
+        if name in context._deferred_objects:
+            return _digest_object(context._deferred_objects[name])
+        path = context.context_paths[name]
+        key = self._stat_key(path)
+        if key not in self._file_digests:
+            self._file_digests[key] = _digest_object(context._get_backend_for_path(path).load(path))
+        return self._file_digests[key]
+
+    @staticmethod
+    def _stat_key(path: str) -> str:
+        stat = os.stat(path)
+        return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _unit_key(self, unit_path: str) -> str:
+        """
+        Returns the key of a unit's entries. The source files are hashed once, and their hashes are kept along with
+        those of the context objects. The datafile, which can be large, is only keyed by its path, size and
+        modification time.
+        """
+        parts = []
+        for path in (unit_path, settings.__file__, __file__):
+            if os.path.exists(path):
+                key = self._stat_key(path)
+                if key not in self._file_digests:
+                    with open(path, "rb") as file_handle:
+                        self._file_digests[key] = hashlib.blake2b(file_handle.read(), digest_size=16).hexdigest()
+                parts.append(self._file_digests[key])
+        if os.path.exists(settings.datafile):
+            parts.append(self._stat_key(settings.datafile))
+        return hashlib.blake2b(json.dumps(parts).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _snapshot_files() -> dict:
+        return {entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+                for entry in os.scandir(".") if entry.is_file()}
+
+    def _find_entry(self, unit_key: str, context):
+        unit_dir = os.path.join(self.cache_dir, unit_key)
+        if not os.path.isdir(unit_dir):
+            return None
+        for inputs_key in os.listdir(unit_dir):
+            entry_dir = os.path.join(unit_dir, inputs_key)
+            with open(os.path.join(entry_dir, self.manifest_basename), "r") as file_handle:
+                manifest = json.load(file_handle)
+            if all(self._matches(context, name, digest) for name, digest in manifest["inputs"].items()):
+                return entry_dir, manifest
+        return None
+
+    def _matches(self, context, name: str, digest) -> bool:
+        """
+        Returns whether an input of a cached unit is the same in the context. The input is either the hash of an
+        object the unit loaded, or whether an object the unit only checked for was in the context.
+        """
+        if isinstance(digest, bool):
+            return (name in context) == digest
+        return name in context and self.digest(context, name) == digest
+
+    def begin(self, context):
+        """
+        Called as a unit enters the context. If the unit's outputs are in the cache, restores them and exits the unit.
+        Otherwise, starts recording the unit's inputs and outputs.
+        """
+        unit_path = getattr(sys.modules.get("__main__"), "__file__", None)
+        if unit_path is None:
+            return
+        unit_key = self._unit_key(unit_path)
+        found = self._find_entry(unit_key, context)
+        if found is not None:
+            self._restore(context, *found)
+            print(f"Restored the outputs of {os.path.basename(unit_path)} from the unit cache")
+            raise SystemExit(0)
+        context._recording = {"unit_key": unit_key, "inputs": {}, "outputs": set(), "files": self._snapshot_files()}
+
+    def _restore(self, context, entry_dir: str, manifest: dict):
+        for name, basename in manifest["outputs"].items():
+            path = os.path.join(entry_dir, basename)
+            if context.is_deferring_writes:
+                context.save(context._get_backend_for_path(path).load(path), name)
+            else:
+                context._link_into_context(path, name)
+        for basename in manifest["files"]:
+            shutil.copy2(os.path.join(entry_dir, "files", basename), basename)
+        if not context.is_deferring_writes:
+            context._update_context()
+        # Mark the entry as recently used
+        os.utime(os.path.join(entry_dir, self.manifest_basename))
+
+    def end(self, context):
+        """
+        Called as a unit exits the context without error. Stores the unit's outputs in the cache.
+        """
+        record = context._recording
+        inputs_key = hashlib.blake2b(json.dumps(sorted(record["inputs"].items())).encode(), digest_size=16).hexdigest()
+        entry_dir = os.path.join(self.cache_dir, record["unit_key"], inputs_key)
+        temporary_dir = tempfile.mkdtemp(dir=self.cache_dir, suffix=".tmp")
+        os.makedirs(os.path.join(temporary_dir, "files"))
+
+        outputs = {}
+        for name in record["outputs"]:
+            if name in context._deferred_objects:
+                obj = context._deferred_objects[name]
+                backend = next(backend for backend in context.backends if backend.accepts(obj))
+                outputs[name] = f"{name}{backend.extension}"
+                backend.dump(obj, os.path.join(temporary_dir, outputs[name]))
+            else:
+                path = context.context_paths[name]
+                outputs[name] = f"{name}{context._get_backend_for_path(path).extension}"
+                _link_or_copy(path, os.path.join(temporary_dir, outputs[name]))
+
+        files = [basename for basename, stat in self._snapshot_files().items() if record["files"].get(basename) != stat]
+        for basename in files:
+            shutil.copy2(basename, os.path.join(temporary_dir, "files", basename))
+
+        with open(os.path.join(temporary_dir, self.manifest_basename), "w") as file_handle:
+            json.dump({"inputs": record["inputs"], "outputs": outputs, "files": files}, file_handle)
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        os.rename(temporary_dir, entry_dir)
+
+        with open(os.path.join(self.cache_dir, self.digests_basename), "w") as file_handle:
+            json.dump(self._file_digests, file_handle)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is no larger than "max_bytes"
+        """
+        entries = []
+        for unit_key in os.listdir(self.cache_dir):
+            unit_dir = os.path.join(self.cache_dir, unit_key)
+            if not os.path.isdir(unit_dir) or unit_dir.endswith(".tmp"):
+                continue
+            for inputs_key in os.listdir(unit_dir):
+                entry_dir = os.path.join(unit_dir, inputs_key)
+                size = sum(os.path.getsize(os.path.join(root, basename))
+                           for root, _, basenames in os.walk(entry_dir) for basename in basenames)
+                last_used = os.path.getmtime(os.path.join(entry_dir, self.manifest_basename))
+                entries.append((last_used, size, entry_dir))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir)
+            total_size -= size
+
+
+def _peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process, in bytes, or None where it can't be measured (e.g. Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, and macOS reports bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class Profiler(object):
+    """
+    Records the wall time, CPU time and peak memory of each unit, and the time spent and bytes moved by each save and
+    load. Each record is appended to a JSON lines file as it is made, so the file accumulates the records of every unit
+    in a job. Each line is a Chrome trace event, so wrapping the lines in a JSON array gives a trace that can be viewed
+    in chrome://tracing or Perfetto.
+
+    Attributes:
+        path (str): File the records are appended to
+        unit (str): Name of the unit being run, if any
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.unit = None
+        self._unit_start = None
+
+    def record(self, name: str, category: str, start_time: float, duration: float, **args):
+        """
+        Appends a record to the profile
+
+        Args:
+            name (str): What is being recorded, e.g. the name of a unit or of a saved object
+            category (str): Kind of record, e.g. "unit", "save" or "load"
+            start_time (float): When it started, in seconds since the epoch
+            duration (float): How long it took, in seconds
+            args: Any other metrics to record
+        """
+        event = {"name": name, "cat": category, "ph": "X", "ts": round(start_time * 1e6),
+                 "dur": round(duration * 1e6), "pid": os.getpid(), "tid": 0, "args": dict(args, unit=self.unit)}
+        # Records are small enough to be appended in a single write, so records from concurrent units don't interleave
+        with open(self.path, "a") as file_handle:
+            file_handle.write(json.dumps(event) + "\n")
+
+    @contextlib.contextmanager
+    def measure(self, name: str, category: str, path: str = None):
+        """
+        Records how long the block takes. If a path is given, its size is recorded as the bytes moved, once the block
+        is done. If the block raises an error, it is still recorded, and flagged as failed.
+        """
+        start_time, start_counter = time.time(), time.perf_counter()
+        is_failed = True
+        try:
+            yield
+            is_failed = False
+        finally:
+            duration = time.perf_counter() - start_counter
+            n_bytes = os.path.getsize(path) if path is not None and os.path.exists(path) else None
+            self.record(name, category, start_time, duration, bytes=n_bytes, is_failed=is_failed)
+
+    def begin(self):
+        """
+        Called as a unit enters the context. The unit is named after the script being run, or after sys.argv[0] when
+        __main__ has no file (e.g. a unit run with "python -c", or by a preloader).
+        """
+        unit_path = getattr(sys.modules.get("__main__"), "__file__", None) or (sys.argv[0] if sys.argv else None)
+        self.unit = os.path.basename(unit_path) if unit_path else None
+        self._unit_start = (time.time(), time.perf_counter(), time.process_time())
+
+    def end(self, is_failed: bool):
+        """
+        Called as a unit exits the context. Records the unit's wall time, CPU time, and peak memory. The peak memory is
+        that of the whole process, so when several units are run in one process (e.g. by the workflow runner), it is
+        the peak of this unit and every unit before it.
+        """
+        start_time, start_counter, start_cpu_time = self._unit_start
+        self.record(self.unit or "unit", "unit", start_time, time.perf_counter() - start_counter,
+                    cpu_time=time.process_time() - start_cpu_time, peak_rss_bytes=_peak_rss_bytes(),
+                    is_failed=is_failed)
+        self.unit = self._unit_start = None
+
+
+# The "Context" class allows for data to be saved and loaded between units, and between train and predict runs.
+# Variables which have been saved using the "Save" method are written to disk, and the predict workflow is automatically
+# configured to obtain these files when it starts.
+class Context(object):
+    """
+    Saves and loads objects from the disk, useful for preserving data between workflow units
+
+    Attributes:
+        context_paths (dict): Dictionary of the format {variable_name: path}, that governs where
+                              objects are saved.
+        backends (tuple): Storage backends, in order of preference. The last one should accept any object. Backends
+                          wrapped in a SavePolicy are compressed and/or downcast as they are saved.
+        is_deferring_writes (bool): Whether saved objects are being kept in memory, rather than written to disk. See
+                                    deferred_writes().
+        unit_cache (UnitCache): If set, units whose inputs haven't changed since they were last run are skipped, and
+                                their outputs are restored from this cache instead.
+        profiler (Profiler): If set, the time and memory used by each unit, and by each save and load, are recorded
+
+    Methods:
+        save: Used to save objects to the context directory
+        load: Used to load objects from the context directory
+        deferred_writes: Used to keep saved objects in memory, until they are flushed to the context directory
+        flush: Used to write any objects kept in memory to the context directory
+    """
+
+    def __init__(self, context_file_basename="workflow_context_file_mapping",
+                 backends=(NumpyBackend, FeatherBackend, SparseBackend, PickleBackend), unit_cache: UnitCache = None,
+                 profiler: Profiler = None, context_dir_pathname: str = None):
+        """
+        Constructor for Context objects
+
+        Args:
+            context_file_basename (str): Name of the file to store context paths in
+            backends (tuple): Storage backends, in order of preference
+            unit_cache (UnitCache): Cache of unit outputs, or None to always run units
+            profiler (Profiler): Profiler to record metrics with, or None to not record any
+            context_dir_pathname (str): Directory the objects are saved in. Defaults to "context_dir_pathname" in
+                                        settings.py, which the predict workflow is generated with.
+        """
+        self.backends = tuple(backends)
+        self.unit_cache = unit_cache
+        self.profiler = profiler
+        # What the current unit has loaded and saved, while it is being recorded for the unit cache
+        self._recording = None
+        self.is_deferring_writes = False
+        # Objects saved while writes are deferred, of the format {variable_name: object}
+        self._deferred_objects = {}
+        # What each of the deferred objects was saved from, so that an object saved under several names is written once
+        self._deferred_sources = {}
+        # Read-only copies of the arrays saved while writes are deferred, of the format {id(array): (array, copy)}
+        self._array_snapshots = {}
+
+        context_dir_pathname = context_dir_pathname or settings.context_dir_pathname
+        self._context_dir_pathname = context_dir_pathname
+        self._context_file = os.path.join(context_dir_pathname, context_file_basename)
+        self._journal_file = f"{self._context_file}.journal"
+        self._lock_file = f"{self._context_file}.lock"
+
+        # Make context dir if it does not exist
+        if not os.path.exists(context_dir_pathname):
+            os.makedirs(context_dir_pathname)
+
+        # Read in the context sources dictionary, a dictionary of {varname: path}. "_committed_paths" is the index as
+        # of the last time it was read or written, so that only this process's own changes are merged into it.
+        with self._index_lock():
+            self.context_paths: dict = self._read_index()
+        self._committed_paths = dict(self.context_paths)
+
+    def __enter__(self):
+        if self.unit_cache is not None and self._recording is None:
+            self.unit_cache.begin(self)
+        if self.profiler is not None and self.profiler.unit is None:
+            self.profiler.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.is_deferring_writes:
+            self._update_context()
+        if self._recording is not None:
+            if exc_type is None:
+                self.unit_cache.end(self)
+            self._recording = None
+        if self.profiler is not None and self.profiler.unit is not None:
+            self.profiler.end(is_failed=exc_type is not None)
+
+    def __contains__(self, item):
+        is_in_context = item in self._deferred_objects or item in self.context_paths
+        # A unit may depend on whether an object is in the context (e.g. only saving a default if it isn't), so the
+        # answer is recorded as one of its inputs for the unit cache, unless the unit loads the object anyway
+        recording = self._recording
+        if recording is not None and item not in recording["outputs"] and item not in recording["inputs"]:
+            recording["inputs"][item] = is_in_context
+        return is_in_context
+
+    @contextlib.contextmanager
+    def _index_lock(self):
+        """
+        Holds an exclusive lock on the context index, so that units sharing the context directory (e.g. parallel
+        branches of a workflow) don't overwrite each other's changes
+        """
+        if fcntl is None:
+            yield
+            return
+        lock_descriptor = os.open(self._lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(lock_descriptor)
+
+    def _read_index(self) -> dict:
+        """
+        Reads the context index, and replays the journal on top of it. The journal holds the changes made since the
+        index was last written, including those of any unit that crashed before it could write the index.
+        """
+        context_paths = {}
+        if os.path.exists(self._context_file):
+            with open(self._context_file, "rb") as file_handle:
+                context_paths = pickle.load(file_handle)
+        if os.path.exists(self._journal_file):
+            with open(self._journal_file, "r") as file_handle:
+                for line in file_handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may have been cut short by a crash
+                        continue
+                    context_paths[entry["name"]] = entry["path"]
+        return context_paths
+
+    def _journal(self, name: str, path: str):
+        """
+        Appends a change to the context index to the journal. The index itself is only written when the context is
+        exited (or flushed), so saving several objects doesn't rewrite it several times.
+        """
+        with self._index_lock():
+            with open(self._journal_file, "a") as file_handle:
+                file_handle.write(json.dumps({"name": name, "path": path}) + "\n")
+
+    def _update_context(self):
+        """
+        Commits the context index. Any changes made by other processes since the index was last read are merged with
+        this process's changes, and the index is written to a temporary file that is renamed over the old one, so that
+        it is never left partially written. The journal is then cleared, as the index holds all of its changes.
+        """
+        changes = {name: path for name, path in self.context_paths.items() if self._committed_paths.get(name) != path}
+        with self._index_lock():
+            context_paths = self._read_index()
+            context_paths.update(changes)
+            _atomic_write(self._context_file, lambda file_handle: pickle.dump(context_paths, file_handle))
+            if os.path.exists(self._journal_file):
+                os.remove(self._journal_file)
+        self.context_paths.update(context_paths)
+        self._committed_paths = dict(self.context_paths)
+
+    def _get_backend_for_path(self, path: str):
+        for backend in self.backends:
+            if path.endswith(backend.extension):
+                return backend
+        # Files saved differently than the context is set up to save them (e.g. the uncompressed arrays written by
+        # array_writer(), or files saved before the settings were changed) can still be loaded
+        for compression, extension in SavePolicy.compression_extensions.items():
+            if path.endswith(extension):
+                backend = self._get_backend_for_path(path[:-len(extension)])
+                return SavePolicy(getattr(backend, "backend", backend), compression)
+        for backend in (NumpyBackend, FeatherBackend, SparseBackend):
+            if path.endswith(backend.extension):
+                return backend
+        return PickleBackend
+
+    def _remove_stale_file(self, previous_path: str, path: str):
+        # If an object is re-saved with a different backend (e.g. an array replaced by a scalar), the old file would
+        # otherwise be left behind. Files outside of the context directory (e.g. test fixtures) are never removed.
+        if previous_path is None or previous_path == path:
+            return
+        previous_dir = os.path.dirname(os.path.abspath(previous_path))
+        if previous_dir == os.path.abspath(self._context_dir_pathname) and os.path.exists(previous_path):
+            os.remove(previous_path)
+
+    def load(self, name: str):
+        """
+        Returns a contextd object. Numpy arrays and DataFrames are returned as read-only, memory-mapped views.
+
+        Args:
+            name (str): The name in self.context_paths of the object
+        """
+        recording = self._recording
+        if recording is not None and name not in recording["outputs"]:
+            # An object the unit has only checked for so far (see __contains__) is recorded by its hash from now on
+            if not isinstance(recording["inputs"].get(name), str):
+                recording["inputs"][name] = self.unit_cache.digest(self, name)
+        if name in self._deferred_objects:
+            return self._deferred_objects[name]
+        path = self.context_paths[name]
+        if self.profiler is None:
+            return self._get_backend_for_path(path).load(path)
+        with self.profiler.measure(name, "load", path):
+            return self._get_backend_for_path(path).load(path)
+
+    def save(self, obj: object, name: str, *other_names: str):
+        """
+        Saves an object to disk, using the first backend that accepts it
+
+        Args:
+            name (str): Friendly name for the object, used for lookup in load() method
+            obj (object): Object to store on disk
+            other_names (str): Additional names to save the same object under. As in array_writer(), these are hard
+                               links to the same file, so the object is only written to disk once.
+        """
+        if self._recording is not None:
+            self._recording["outputs"].update((name,) + other_names)
+
+        if self.is_deferring_writes and isinstance(obj, np.ndarray):
+            obj = self._snapshot_array(obj)
+        source = obj
+
+        backend = next(backend for backend in self.backends if backend.accepts(obj))
+        if isinstance(backend, SavePolicy):
+            obj = backend.prepare(obj, name)
+
+        if self.is_deferring_writes:
+            if isinstance(obj, np.ndarray):
+                # Arrays loaded from disk are read-only, so make sure units can't modify the saved array either
+                obj.flags.writeable = False
+            for each_name in (name,) + other_names:
+                self._deferred_objects[each_name] = obj
+                self._deferred_sources[each_name] = source
+            return
+
+        path = os.path.join(self._context_dir_pathname, f"{name}{backend.extension}")
+        previous_path = self.context_paths.get(name)
+        self.context_paths[name] = path
+        if self.profiler is None:
+            backend.dump(obj, path)
+        else:
+            with self.profiler.measure(name, "save", path):
+                backend.dump(obj, path)
+        self._remove_stale_file(previous_path, path)
+        self._journal(name, path)
+        for other_name in other_names:
+            self._link_into_context(path, other_name)
+
+    def _snapshot_array(self, array: np.ndarray) -> np.ndarray:
+        """
+        Returns a read-only copy of an array saved while writes are deferred, so that changing the array afterwards
+        doesn't change what was saved (as it doesn't once the array is written to disk). An array saved again without
+        having changed (e.g. as both the train and the test target) gets the same copy, so that it's only written once.
+        """
+        base = array
+        while isinstance(base, np.ndarray):
+            if base.flags.writeable:
+                break
+            base = base.base
+        else:
+            # Nothing can change the array, e.g. a memory-mapped array loaded from the context
+            return array
+        previous_array, snapshot = self._array_snapshots.get(id(array), (None, None))
+        if previous_array is array and np.array_equal(array, snapshot, equal_nan=array.dtype.kind in "fc"):
+            return snapshot
+        snapshot = array.copy()
+        snapshot.flags.writeable = False
+        self._array_snapshots[id(array)] = (array, snapshot)
+        return snapshot
+
+    def _link_into_context(self, source_path: str, name: str):
+        """
+        Saves an existing file under "name", by hard-linking it into the context directory
+        """
+        path = os.path.join(self._context_dir_pathname, f"{name}{self._get_backend_for_path(source_path).extension}")
+        if path != source_path:
+            _link_or_copy(source_path, path)
+        if self._recording is not None:
+            self._recording["outputs"].add(name)
+        self._deferred_objects.pop(name, None)
+        self._deferred_sources.pop(name, None)
+        previous_path = self.context_paths.get(name)
+        self.context_paths[name] = path
+        self._remove_stale_file(previous_path, path)
+        self._journal(name, path)
+
+    def array_writer(self, name: str, *other_names: str) -> ArrayWriter:
+        """
+        Returns an ArrayWriter, which saves an array block-by-block for arrays that are too large to hold in memory.
+        The array is saved once the writer is closed, after which it can be loaded with load() like any other array.
+
+        Args:
+            name (str): Friendly name for the array, used for lookup in load() method
+            other_names (str): Additional names to save the same array under. These are hard links to the same file,
+                               so the data is only written to disk once.
+        """
+        path = os.path.join(self._context_dir_pathname, f"{name}{NumpyBackend.extension}")
+
+        def register_names():
+            for each_name in (name,) + other_names:
+                self._link_into_context(path, each_name)
+
+        return ArrayWriter(path, on_close=register_names)
+
+    @contextlib.contextmanager
+    def deferred_writes(self):
+        """
+        Keeps objects saved within this block in memory, and writes them to the context directory when the block
+        exits. Used to run several units in one interpreter without writing every intermediate object to disk.
+        flush() can be called within the block to write the objects saved so far (e.g. as a checkpoint).
+        """
+        self.is_deferring_writes = True
+        try:
+            yield self
+        finally:
+            self.is_deferring_writes = False
+            self.flush()
+
+    def flush(self):
+        """
+        Writes any objects that are being kept in memory to the context directory
+        """
+        is_deferring_writes = self.is_deferring_writes
+        self.is_deferring_writes = False
+        try:
+            while self._deferred_objects:
+                name, obj = self._deferred_objects.popitem()
+                source = self._deferred_sources.pop(name)
+                # An object saved under several names is written once, and linked under the others
+                other_names = [other_name for other_name, other_source in self._deferred_sources.items()
+                               if other_source is source]
+                for other_name in other_names:
+                    del self._deferred_objects[other_name]
+                    del self._deferred_sources[other_name]
+                self.save(obj, name, *other_names)
+            self._array_snapshots.clear()
+            self._update_context()
+        finally:
+            self.is_deferring_writes = is_deferring_writes
+
+
+def batch_slices(n_rows: int, batch_size: int = None) -> list:
+    """
+    Splits a number of rows into batches
+
+    Args:
+        n_rows (int): Number of rows to split
+        batch_size (int): Number of rows per batch. Defaults to "training_batch_size", or a single batch if it is unset
+
+    Returns:
+        list: Slices over the rows of each batch
+    """
+    batch_size = max(1, batch_size or settings.training_batch_size or n_rows)
+    return [slice(start, start + batch_size) for start in range(0, n_rows, batch_size)]
+
+
+def partial_fit_in_batches(estimator, array, batch_size: int = None):
+    """
+    Fits an estimator that supports partial_fit() (e.g. a scaler) over batches of rows of an array
+
+    Returns:
+        The fitted estimator
+    """
+    for rows in batch_slices(array.shape[0], batch_size):
+        estimator.partial_fit(array[rows])
+    return estimator
+
+
+def transform_in_batches(transformer, array, name: str, *other_names: str, batch_size: int = None):
+    """
+    Transforms an array over batches of rows, and saves the result to the context one batch at a time, so that neither
+    the array nor the result has to be held in memory.
+
+    Args:
+        transformer: A fitted transformer (e.g. a scaler)
+        array (numpy.ndarray): The array to transform; typically a memory-mapped array loaded from the context
+        name (str): Name to save the result under
+        other_names (str): Additional names to save the same result under, as in Context.array_writer()
+        batch_size (int): Number of rows per batch. Defaults to "training_batch_size"
+    """
+    # Sparse matrices are small enough to be transformed at once, and can't be written as an array
+    if is_sparse(array):
+        settings.context.save(transformer.transform(array), name, *other_names)
+        return
+    with settings.context.array_writer(name, *other_names) as writer:
+        for rows in batch_slices(array.shape[0], batch_size):
+            writer.append(transformer.transform(array[rows]))
+
+
+def get_n_cores() -> int:
+    """
+    Returns the number of cores the units may use: "n_cores" if it is set, or the cores available to this process
+    """
+    if settings.n_cores:
+        return settings.n_cores
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def thread_limits(n_threads: int = None):
+    """
+    Limits the number of threads used by the BLAS and OpenMP libraries that have been loaded. Used as a context manager,
+    the previous limits are restored when the block exits. Does nothing if "threadpoolctl" isn't installed.
+
+    Args:
+        n_threads (int): Maximum number of threads. Defaults to "blas_threads", or to get_n_cores() if it isn't set
+
+    Returns:
+        A context manager
+    """
+    try:
+        import threadpoolctl
+    except ImportError:
+        # Suppresses no exceptions, so it does nothing
+        return contextlib.suppress()
+    return threadpoolctl.threadpool_limits(limits=n_threads or settings.blas_threads or get_n_cores())
+
+
+# The model used by each prediction worker process. It is sent to each worker once, rather than once per batch.
+_worker_model = None
+
+
+def _limit_model_jobs(model, n_jobs: int):
+    """
+    Sets the number of jobs of a model that predicts in parallel, such as a random forest
+    """
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = n_jobs
+
+
+def _initialize_prediction_worker(model, n_threads: int):
+    global _worker_model
+    # The limits last for the whole life of the worker process
+    thread_limits(n_threads)
+    _limit_model_jobs(model, n_threads)
+    _worker_model = model
+
+
+def _predict_batch(batch):
+    return _worker_model.predict(batch)
+
+
+def _predict_batches(model, batches, n_jobs: int):
+    """
+    Yields the predictions for each batch, in order. When using several processes, only a few batches are in flight
+    at any time, so that the whole dataset is never queued up for the workers at once.
+    """
+    if n_jobs == 1:
+        with thread_limits():
+            for batch in batches:
+                yield model.predict(batch)
+        return
+
+    import multiprocessing
+    n_threads = max(1, get_n_cores() // n_jobs)
+    # A multiprocessing pool rather than a ProcessPoolExecutor, which only takes an initializer from Python 3.7
+    with multiprocessing.Pool(n_jobs, _initialize_prediction_worker, (model, n_threads)) as pool:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_predict_batch, (batch,)))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def predict_in_batches(model, descriptors, filename: str = "predictions.csv", postprocess=None, fmt: str = "%s",
+                       batch_size: int = None, n_jobs: int = None):
+    """
+    Makes predictions over fixed-size batches of descriptors, and appends them to a CSV file as they are made.
+
+    Args:
+        model: A trained model with a predict() method
+        descriptors (numpy.ndarray): Descriptors to predict on; typically a memory-mapped array loaded from the context,
+                                     or a sparse matrix
+        filename (str): File the predictions are written to, under a "prediction" header
+        postprocess (callable): Applied to the predictions of each batch before they are written, e.g. to transform
+                                them back to their original labels
+        fmt (str): Format used to write each prediction, as in numpy.savetxt
+        batch_size (int): Number of rows per batch. Defaults to "prediction_batch_size"
+        n_jobs (int): Number of processes to predict with, or -1 to use every core. Defaults to "prediction_n_jobs"
+    """
+    batch_size = batch_size or settings.prediction_batch_size
+    n_jobs = n_jobs or settings.prediction_n_jobs
+    if n_jobs < 0:
+        n_jobs = get_n_cores()
+
+    batches = (descriptors[start:start + batch_size] for start in range(0, descriptors.shape[0], batch_size))
+    with open(filename, "w") as file_handle:
+        file_handle.write("prediction\n")
+        for predictions in _predict_batches(model, batches, n_jobs):
+            if postprocess is not None:
+                predictions = postprocess(predictions)
+            np.savetxt(file_handle, predictions, fmt=fmt)
+
+
+# The Numba kernel that walks the trees, compiled the first time it is needed; or False if Numba isn't installed
+_tree_walker = None
+
+
+def _walk_trees(descriptors, roots, feature, threshold, children, missing_go_to_left, leaves):
+    """
+    Finds the leaf each row of the descriptors reaches in each tree, as in CompiledTrees.leaves(). Compiled by Numba,
+    without the GIL, so that blocks of rows can be walked in parallel threads.
+    """
+    # Each tree is walked by every row in turn, so that its nodes stay in the cache
+    for tree in range(roots.shape[0]):
+        for row in range(descriptors.shape[0]):
+            node = roots[tree]
+            while children[node, 0] != node:
+                value = descriptors[row, feature[node]]
+                # Missing values fail every comparison
+                if value <= threshold[node] or (value != value and missing_go_to_left[node]):
+                    node = children[node, 0]
+                else:
+                    node = children[node, 1]
+            leaves[tree, row] = node
+
+
+def _get_tree_walker():
+    """
+    Returns the compiled _walk_trees(), or None if Numba isn't installed. The compiled kernel is cached on disk.
+    """
+    global _tree_walker
+    if _tree_walker is None:
+        try:
+            import numba
+        except ImportError:
+            _tree_walker = False
+        else:
+            _tree_walker = numba.njit(cache=True, nogil=True)(_walk_trees)
+    return _tree_walker or None
+
+
+class CompiledTrees(object):
+    """
+    A trained scikit-learn tree ensemble, flattened into contiguous arrays of the nodes of all of its trees. Supports
+    random forests, bagged trees and AdaBoost regressors, and gradient-boosted trees, with a single target.
+
+    The leaves of every tree are found together, one level of the trees at a time, and combined the same way the model
+    combines the predictions of its trees, in the same order, so that the predictions match model.predict() exactly.
+
+    Attributes:
+        combination (str): How the trees are combined; "mean", "weighted_median" or "boosting"
+        feature (numpy.ndarray): The descriptor each node splits on. Leaves split on descriptor 0.
+        threshold (numpy.ndarray): The threshold each node splits at. Descriptors at or below it go to the left child.
+        children (numpy.ndarray): The left and right children of each node, of shape (n_nodes, 2). Leaves are their own
+                                  children, so that the walk stays on a leaf once it has reached one.
+        missing_go_to_left (numpy.ndarray): Whether missing descriptors go to the left child of each node
+        value (numpy.ndarray): The value of each node, of shape (n_nodes, n_values): the class probabilities for
+                               classifiers, or the prediction for regressors
+        roots (numpy.ndarray): The index of the root node of each tree
+        depth (int): The depth of the deepest tree
+        classes (numpy.ndarray): The classes of a classifier, or None for a regressor
+    """
+
+    # The number of (tree, row) pairs walked at once. Larger batches of rows are split up, to bound the memory used.
+    block_size = 2 ** 22
+
+    # The number of threads the Numba kernel walks the trees with; if None, get_n_cores() is used. Set by the prediction
+    # workers, as for models that predict in parallel.
+    n_jobs = None
+
+    def __init__(self, model):
+        """
+        Args:
+            model: A trained RandomForestRegressor, RandomForestClassifier, BaggingRegressor, AdaBoostRegressor,
+                   GradientBoostingRegressor or GradientBoostingClassifier
+        """
+        import sklearn.ensemble
+        self.classes = None
+        self.n_features = model.n_features_in_ if hasattr(model, "n_features_in_") else model.n_features_
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only models with a single target can be compiled")
+        trees, features = getattr(model, "estimators_", None), None
+
+        if isinstance(model, sklearn.ensemble.RandomForestClassifier):
+            self.combination = "mean"
+            self.classes = model.classes_
+        elif isinstance(model, sklearn.ensemble.RandomForestRegressor):
+            self.combination = "mean"
+        elif isinstance(model, sklearn.ensemble.BaggingRegressor):
+            self.combination = "mean"
+            features = model.estimators_features_
+        elif isinstance(model, sklearn.ensemble.AdaBoostRegressor):
+            self.combination = "weighted_median"
+            self.estimator_weights = model.estimator_weights_[:len(trees)]
+        elif isinstance(model, (sklearn.ensemble.GradientBoostingRegressor,
+                                sklearn.ensemble.GradientBoostingClassifier)):
+            self.combination = "boosting"
+            init = model.init_
+            if not (init == "zero" or type(init).__module__.startswith("sklearn.dummy")):
+                raise ValueError("Only gradient-boosted models initialized with a constant can be compiled")
+            # The trees of each stage (one per class, for multi-class classifiers) are added to the initial prediction
+            # in order, stage by stage
+            self.n_trees_per_stage = trees.shape[1]
+            trees = trees.reshape(-1)
+            self.learning_rate = model.learning_rate
+            self.initial_prediction = model._raw_predict_init(np.zeros((1, self.n_features), dtype=np.float32))[0]
+            if isinstance(model, sklearn.ensemble.GradientBoostingClassifier):
+                self.classes = model.classes_
+                self.decision = self._boosting_decision(model)
+        else:
+            raise ValueError(f"Models of type {type(model).__name__} can't be compiled")
+
+        offsets = np.cumsum([0] + [tree.tree_.node_count for tree in trees])
+        self.roots = offsets[:-1]
+        self.depth = max(tree.tree_.max_depth for tree in trees)
+        self.feature = np.zeros(offsets[-1], dtype=np.intp)
+        self.threshold = np.zeros(offsets[-1], dtype=np.float64)
+        self.children = np.zeros((offsets[-1], 2), dtype=np.intp)
+        self.missing_go_to_left = np.zeros(offsets[-1], dtype=bool)
+        values = []
+        for index, (tree, start) in enumerate(zip(trees, self.roots)):
+            nodes = tree.tree_
+            rows = slice(start, start + nodes.node_count)
+            is_leaf = nodes.children_left < 0
+            node_indices = start + np.arange(nodes.node_count)
+            feature = np.where(is_leaf, 0, nodes.feature)
+            # Bagged trees are fit on a subset of the descriptors, which their features index into
+            self.feature[rows] = feature if features is None else features[index][feature]
+            self.threshold[rows] = nodes.threshold
+            self.children[rows, 0] = np.where(is_leaf, node_indices, start + nodes.children_left)
+            self.children[rows, 1] = np.where(is_leaf, node_indices, start + nodes.children_right)
+            # Trees only send missing descriptors to a chosen side in scikit-learn 1.3 and later
+            if hasattr(nodes, "missing_go_to_left"):
+                self.missing_go_to_left[rows] = nodes.missing_go_to_left
+            value = nodes.value[:, 0, :]
+            if self.classes is not None and self.combination == "mean":
+                # Normalized as in DecisionTreeClassifier.predict_proba()
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            values.append(value)
+        self.value = np.concatenate(values)
+
+    @staticmethod
+    def _boosting_decision(model) -> str:
+        """
+        Returns how a gradient-boosted classifier turns its raw predictions into classes. Since scikit-learn 1.3, the
+        raw predictions are compared to 0 (binary) or their largest is taken (multi-class). Before, the deviance losses
+        took the largest of the class probabilities, which can differ when the raw predictions are within rounding of
+        each other.
+        """
+        loss = getattr(model, "_loss", None) or model.loss_
+        is_binary = model.estimators_.shape[1] == 1
+        if not hasattr(loss, "_raw_prediction_to_decision") or type(loss).__name__ == "ExponentialLoss":
+            return "threshold" if is_binary else "argmax"
+        return "expit" if is_binary else "softmax"
+
+    def leaves(self, descriptors: np.ndarray) -> np.ndarray:
+        """
+        Returns the index of the leaf each row of the descriptors reaches in each tree, of shape (n_trees, n_rows)
+
+        Args:
+            descriptors (numpy.ndarray): Dense float32 descriptors
+        """
+        n_rows = descriptors.shape[0]
+        walk = _get_tree_walker()
+        if walk is not None:
+            descriptors = np.ascontiguousarray(descriptors)
+            leaves = np.empty((len(self.roots), n_rows), dtype=np.intp)
+            arrays = (self.roots, self.feature, self.threshold, self.children, self.missing_go_to_left)
+            n_threads = min(self.n_jobs or get_n_cores(), n_rows)
+            if n_threads <= 1:
+                walk(descriptors, *arrays, leaves)
+                return leaves
+            import concurrent.futures
+            blocks = np.array_split(np.arange(n_rows), n_threads)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+                for future in [executor.submit(walk, descriptors[rows[0]:rows[-1] + 1], *arrays,
+                                               leaves[:, rows[0]:rows[-1] + 1]) for rows in blocks]:
+                    future.result()
+            return leaves
+
+        # Every (tree, row) pair moves down one level of its tree at a time. The descriptors and children are indexed
+        # as flat arrays, which is quicker than indexing them in two dimensions.
+        flat_descriptors = np.ascontiguousarray(descriptors).ravel()
+        row_offsets = np.tile(np.arange(n_rows) * descriptors.shape[1], len(self.roots))
+        flat_children = self.children.ravel()
+        has_missing_values = bool(np.isnan(flat_descriptors).any())
+        nodes = np.repeat(self.roots, n_rows)
+        for _ in range(self.depth):
+            values = flat_descriptors.take(row_offsets + self.feature.take(nodes))
+            is_right = values > self.threshold.take(nodes)
+            if has_missing_values:
+                is_right |= np.isnan(values) & ~self.missing_go_to_left.take(nodes)
+            nodes = flat_children.take(2 * nodes + is_right)
+        return nodes.reshape(len(self.roots), n_rows)
+
+    def _predict_block(self, descriptors: np.ndarray) -> np.ndarray:
+        # The values of the leaf reached in each tree, of shape (n_trees, n_rows, n_values)
+        tree_values = self.value[self.leaves(descriptors)]
+        n_rows = descriptors.shape[0]
+
+        if self.combination == "mean":
+            total = np.zeros(tree_values.shape[1:])
+            for values in tree_values:
+                total += values
+            total /= len(tree_values)
+            if self.classes is not None:
+                return self.classes.take(np.argmax(total, axis=1), axis=0)
+            return total[:, 0]
+
+        if self.combination == "weighted_median":
+            # As in AdaBoostRegressor._get_median_predict()
+            predictions = tree_values[:, :, 0].T
+            sorted_trees = np.argsort(predictions, axis=1)
+            weight_cdf = np.cumsum(self.estimator_weights[sorted_trees], axis=1, dtype=np.float64)
+            is_median_or_above = weight_cdf >= 0.5 * weight_cdf[:, -1][:, np.newaxis]
+            median_trees = sorted_trees[np.arange(n_rows), is_median_or_above.argmax(axis=1)]
+            return predictions[np.arange(n_rows), median_trees]
+
+        raw_predictions = np.tile(self.initial_prediction, (n_rows, 1)).astype(np.float64)
+        for tree, values in enumerate(tree_values):
+            raw_predictions[:, tree % self.n_trees_per_stage] += self.learning_rate * values[:, 0]
+        if self.classes is None:
+            return raw_predictions.ravel()
+        if self.decision == "threshold":
+            return self.classes.take((raw_predictions.ravel() >= 0).astype(int), axis=0)
+        if self.decision == "expit":
+            import scipy.special
+            probabilities = np.empty((n_rows, 2))
+            probabilities[:, 1] = scipy.special.expit(raw_predictions.ravel())
+            probabilities[:, 0] = 1 - probabilities[:, 1]
+            raw_predictions = probabilities
+        elif self.decision == "softmax":
+            import scipy.special
+            raw_predictions = np.exp(raw_predictions - scipy.special.logsumexp(raw_predictions, axis=1)[:, np.newaxis])
+        return self.classes.take(np.argmax(raw_predictions, axis=1), axis=0)
+
+    def predict(self, descriptors) -> np.ndarray:
+        """
+        Predicts as the compiled model's predict() would
+
+        Args:
+            descriptors: The descriptors, as an array or a sparse matrix. As in scikit-learn, they are compared to the
+                         thresholds as float32.
+
+        Returns:
+            numpy.ndarray: The predictions
+        """
+        n_rows = descriptors.shape[0]
+        if len(descriptors.shape) != 2 or descriptors.shape[1] != self.n_features:
+            raise ValueError(f"Expected descriptors with {self.n_features} columns, got shape {descriptors.shape}")
+        rows_per_block = max(1, self.block_size // len(self.roots))
+        predictions = []
+        # An empty batch still makes one (empty) block, so that the predictions have the right type
+        for start in range(0, max(n_rows, 1), rows_per_block):
+            block = descriptors[start:start + rows_per_block]
+            block = block.toarray() if is_sparse(block) else block
+            predictions.append(self._predict_block(np.asarray(block, dtype=np.float32)))
+        return np.concatenate(predictions)
+
+
+# The model, descriptors and target used by each cross-validation worker process
+_worker_cross_validation = None
+
+
+def _memory_mapped_path(array: np.ndarray) -> str:
+    """
+    Returns the path of the .npy file an array is a memory-mapped view of (as the arrays loaded from the context are),
+    or None if it isn't a view of the whole of one
+    """
+    base = array.base
+    if not isinstance(base, np.memmap) or base.filename is None or base.shape != array.shape:
+        return None
+    if base.ctypes.data != array.ctypes.data or not array.flags.c_contiguous:
+        return None
+    return base.filename if base.filename.endswith(".npy") else None
+
+
+def _share_array(array, directory: str):
+    """
+    Returns what to send worker processes for them to memory-map an array: the path of the .npy file it is a view of,
+    or of a file in "directory" that it is written to once (e.g. if it was compressed in the context). Sparse matrices
+    are returned unchanged, and so are sent to each worker.
+    """
+    if not isinstance(array, np.ndarray):
+        return array
+    path = _memory_mapped_path(array)
+    if path is None:
+        path = os.path.join(directory, f"shared_{len(os.listdir(directory))}.npy")
+        np.save(path, array, allow_pickle=False)
+    return path
+
+
+def _load_shared_array(array):
+    """
+    Memory-maps an array shared by _share_array() in a worker process
+    """
+    if isinstance(array, str):
+        return np.load(array, mmap_mode="r", allow_pickle=False)
+    return array
+
+
+def _initialize_cross_validation_worker(model, descriptors, target, n_threads: int):
+    global _worker_cross_validation
+    thread_limits(n_threads)
+    _limit_model_jobs(model, n_threads)
+    _worker_cross_validation = (model, _load_shared_array(descriptors), target)
+
+
+def _fit_fold(fold, model, descriptors, target) -> np.ndarray:
+    """
+    Fits a copy of a model on the training rows of a fold, and returns its predictions for the held-out rows
+    """
+    import sklearn.base
+    train_rows, test_rows = fold
+    model = sklearn.base.clone(model)
+    model.fit(descriptors[train_rows], target[train_rows])
+    return model.predict(descriptors[test_rows])
+
+
+def _fit_worker_fold(fold) -> np.ndarray:
+    return _fit_fold(fold, *_worker_cross_validation)
+
+
+def cross_validation_folds(target: np.ndarray, n_folds: int, seed: int = 0, is_stratified: bool = False) -> list:
+    """
+    Splits the rows of a dataset into shuffled folds
+
+    Args:
+        target (numpy.ndarray): The flattened target. Only its length is used, unless the folds are stratified.
+        n_folds (int): Number of folds
+        seed (int): Seed of the shuffle
+        is_stratified (bool): Whether each fold keeps the proportions of each class in the target
+
+    Returns:
+        list: The indices of the (training rows, held-out rows) of each fold
+    """
+    import sklearn.model_selection
+    if is_stratified:
+        splitter = sklearn.model_selection.StratifiedKFold(n_folds, shuffle=True, random_state=seed)
+    else:
+        splitter = sklearn.model_selection.KFold(n_folds, shuffle=True, random_state=seed)
+    return list(splitter.split(np.zeros((len(target), 1)), target))
+
+
+def cross_validate(model, descriptors, target: np.ndarray, n_folds: int, seed: int = 0, is_stratified: bool = False,
+                   target_scaler=None, n_jobs: int = None) -> dict:
+    """
+    Scores a model by k-fold cross-validation. Regression models are scored by their RMSE (and R2), in the units of the
+    original target if its scaler is given. Classification models are scored by their accuracy (and macro-averaged F1).
+
+    Args:
+        model: An unfitted, or fitted, model. Each fold fits a fresh copy of it with the same parameters.
+        descriptors: The descriptors; typically a memory-mapped array loaded from the context, or a sparse matrix
+        target (numpy.ndarray): The flattened target
+        n_folds (int): Number of folds
+        seed (int): Seed of the shuffle of the rows into folds
+        is_stratified (bool): Whether each fold keeps the proportions of each class in the target
+        target_scaler: The scaler of a regression target, used to unscale it before it is scored
+        n_jobs (int): Number of processes to fit the folds with, or -1 to fit them all at once. Defaults to
+                      "cross_validation_n_jobs"
+
+    Returns:
+        dict: Of the format {metric: {"mean": ..., "std": ..., "folds": [...]}}
+    """
+    import sklearn.metrics
+    folds = cross_validation_folds(target, n_folds, seed, is_stratified)
+    n_jobs = n_jobs or settings.cross_validation_n_jobs
+    if n_jobs < 0:
+        n_jobs = get_n_cores()
+    n_jobs = min(n_jobs, len(folds))
+
+    if n_jobs == 1:
+        with thread_limits():
+            predictions = [_fit_fold(fold, model, descriptors, target) for fold in folds]
+    else:
+        import multiprocessing
+        with tempfile.TemporaryDirectory(dir=".") as directory:
+            initargs = (model, _share_array(descriptors, directory), target, max(1, get_n_cores() // n_jobs))
+            with multiprocessing.Pool(n_jobs, _initialize_cross_validation_worker, initargs) as pool:
+                predictions = pool.map(_fit_worker_fold, folds, chunksize=1)
+
+    scores = collections.defaultdict(list)
+    for (_, test_rows), fold_predictions in zip(folds, predictions):
+        fold_target = target[test_rows]
+        if settings.is_classification:
+            scores["accuracy"].append(sklearn.metrics.accuracy_score(fold_target, fold_predictions))
+            scores["F1"].append(sklearn.metrics.f1_score(fold_target, fold_predictions, average="macro"))
+        else:
+            if target_scaler is not None:
+                fold_target = target_scaler.inverse_transform(fold_target.reshape(-1, 1)).reshape(-1)
+                fold_predictions = target_scaler.inverse_transform(fold_predictions.reshape(-1, 1)).reshape(-1)
+            scores["RMSE"].append(np.sqrt(sklearn.metrics.mean_squared_error(fold_target, fold_predictions)))
+            scores["R2"].append(sklearn.metrics.r2_score(fold_target, fold_predictions))
+
+    metrics = {}
+    for metric, values in scores.items():
+        metrics[metric] = {"mean": float(np.mean(values)), "std": float(np.std(values)),
+                           "folds": [float(value) for value in values]}
+        print(f"Cross-validated {metric} = {metrics[metric]['mean']} +/- {metrics[metric]['std']} over "
+              f"{len(folds)} folds")
+    return metrics
+
+
+# The training set, and the number of threads, used by each model-fitting worker process
+_worker_training_set = None
+
+
+def _initialize_fitting_worker(descriptors, target, n_threads: int):
+    global _worker_training_set
+    thread_limits(n_threads)
+    _worker_training_set = (_load_shared_array(descriptors), _load_shared_array(target), n_threads)
+
+
+def _fit_model(model, descriptors, target) -> tuple:
+    """
+    Fits a model, and returns it along with the time the fit took, in seconds
+    """
+    start_time = time.perf_counter()
+    model.fit(descriptors, target)
+    return model, time.perf_counter() - start_time
+
+
+def _fit_worker_model(model) -> tuple:
+    descriptors, target, n_threads = _worker_training_set
+    _limit_model_jobs(model, n_threads)
+    return _fit_model(model, descriptors, target)
+
+
+def fit_models(models: dict, descriptors, target: np.ndarray, n_jobs: int = None) -> dict:
+    """
+    Fits several models on the same training set, in parallel processes
+
+    Args:
+        models (dict): Unfitted models, by name
+        descriptors: The training descriptors; typically a memory-mapped array loaded from the context, or a sparse
+                     matrix
+        target (numpy.ndarray): The flattened training target
+        n_jobs (int): Number of processes to fit the models with, or -1 to fit them all at once. Defaults to
+                      "model_zoo_n_jobs"
+
+    Returns:
+        dict: The fitted models, and the time each took to fit in seconds, of the format {name: (model, seconds)}
+    """
+    n_jobs = n_jobs or settings.model_zoo_n_jobs
+    if n_jobs < 0:
+        n_jobs = get_n_cores()
+    n_jobs = min(n_jobs, len(models))
+
+    if n_jobs <= 1:
+        with thread_limits():
+            return {name: _fit_model(model, descriptors, target) for name, model in models.items()}
+
+    import multiprocessing
+    with tempfile.TemporaryDirectory(dir=".") as directory:
+        initargs = (_share_array(descriptors, directory), _share_array(target, directory),
+                    max(1, get_n_cores() // n_jobs))
+        with multiprocessing.Pool(n_jobs, _initialize_fitting_worker, initargs) as pool:
+            return dict(zip(models, pool.map(_fit_worker_model, models.values(), chunksize=1)))
+
+
+# Helpers for the pre-processing units. Rows are selected with boolean masks over the arrays in the context, so that
+# missing values and duplicates can be removed from the target and descriptors together, without first copying them
+# into a single DataFrame. The descriptors may also be sparse matrices (see "is_using_sparse_descriptors").
+def missing_values(array: np.ndarray) -> np.ndarray:
+    """
+    Returns a boolean array of the same shape as "array", which is True wherever a value is missing (NaN or None)
+    """
+    if array.dtype.kind in "fc":
+        return np.isnan(array)
+    if array.dtype.kind == "O":
+        return np.vectorize(lambda value: value is None or value != value, otypes=[bool])(array)
+    return np.zeros(array.shape, dtype=bool)
+
+
+def rows_with_missing_values(array, columns: np.ndarray = None) -> np.ndarray:
+    """
+    Returns a boolean mask of the rows of a 2-D array or sparse matrix that have a missing value in any of the given
+    columns (by default, in any column)
+    """
+    if not is_sparse(array):
+        is_missing = missing_values(np.asarray(array))
+        return (is_missing if columns is None else is_missing[:, columns]).any(axis=1)
+    # Only the stored values of a sparse matrix can be missing
+    array = array.tocsr()
+    is_missing = missing_values(array.data)
+    if columns is not None:
+        is_missing &= np.isin(array.indices, columns)
+    rows = np.repeat(np.arange(array.shape[0]), np.diff(array.indptr))
+    return np.bincount(rows[is_missing], minlength=array.shape[0]) > 0
+
+
+def columns_with_missing_values(array) -> np.ndarray:
+    """
+    Returns a boolean mask of the columns of a 2-D array or sparse matrix that have a missing value in any row
+    """
+    if not is_sparse(array):
+        return missing_values(np.asarray(array)).any(axis=0)
+    array = array.tocsr()
+    return np.bincount(array.indices[missing_values(array.data)], minlength=array.shape[1]) > 0
+
+
+def select(array, rows: np.ndarray, columns: np.ndarray = None):
+    """
+    Copies the given rows, and optionally columns, out of a 2-D array or sparse matrix
+
+    Args:
+        array: The array or sparse matrix
+        rows (numpy.ndarray): Indices of the rows to keep
+        columns (numpy.ndarray): Indices of the columns to keep. Defaults to every column.
+    """
+    if is_sparse(array):
+        array = array.tocsr()[rows]
+        return array if columns is None else array[:, columns]
+    # np.ix_ copies the rows and columns out in one step
+    return array[rows] if columns is None else array[np.ix_(rows, columns)]
+
+
+def sparse_aware_scaler(scaler, descriptors):
+    """
+    Returns a scaler that keeps the descriptors sparse, if they are a sparse matrix. A StandardScaler is switched to not
+    center the descriptors, and a MinMaxScaler is replaced with a MaxAbsScaler, which scales non-negative descriptors
+    to the same range of [0, 1]. Otherwise, the scaler is returned as it is.
+    """
+    if not is_sparse(descriptors):
+        return scaler
+    import sklearn.preprocessing
+    if isinstance(scaler, sklearn.preprocessing.StandardScaler):
+        return scaler.set_params(with_mean=False)
+    if isinstance(scaler, sklearn.preprocessing.MinMaxScaler):
+        return sklearn.preprocessing.MaxAbsScaler(copy=scaler.copy)
+    return scaler
+
+
+# Constants of the SplitMix64 finalizer, used to mix the bits of each value when hashing rows
+_HASH_SHIFTS = (np.uint64(30), np.uint64(27), np.uint64(31))
+_HASH_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+
+def _hash_column(column: np.ndarray) -> np.ndarray:
+    """
+    Returns a 64-bit hash of each value in a column. Equal values get equal hashes.
+    """
+    if column.dtype.kind == "f":
+        # Adding 0.0 turns -0.0 into 0.0, which compare equal but have different bits
+        bits = (column.astype(np.float64) + 0.0).view(np.uint64)
+    elif column.dtype.kind in "iub":
+        bits = column.astype(np.int64).view(np.uint64)
+    else:
+        bits = np.fromiter((hash(value) for value in column), dtype=np.int64, count=len(column)).view(np.uint64)
+
+    with np.errstate(over="ignore"):
+        bits = (bits ^ (bits >> _HASH_SHIFTS[0])) * _HASH_MULTIPLIERS[0]
+        bits = (bits ^ (bits >> _HASH_SHIFTS[1])) * _HASH_MULTIPLIERS[1]
+        return bits ^ (bits >> _HASH_SHIFTS[2])
+
+
+def _hash_sparse_rows(matrix) -> np.ndarray:
+    """
+    Returns a 64-bit hash of each row of a sparse matrix, from the columns and values of its non-zero entries. Equal
+    rows get equal hashes, however their entries are stored.
+    """
+    matrix = matrix.tocsr()
+    with np.errstate(over="ignore"):
+        entry_hashes = (_hash_column(matrix.indices) * _HASH_MULTIPLIERS[1]) ^ _hash_column(matrix.data)
+        # Explicitly stored zeros are the same as the zeros that aren't stored
+        entry_hashes[matrix.data == 0] = 0
+        # The entries of each row are summed, which doesn't depend on their order. Sums of a row's entries are the
+        # differences of the running sum, which wraps around consistently.
+        running_sum = np.concatenate((np.zeros(1, dtype=np.uint64), np.cumsum(entry_hashes, dtype=np.uint64)))
+        return running_sum[matrix.indptr[1:]] - running_sum[matrix.indptr[:-1]]
+
+
+def duplicate_rows(columns, rows: np.ndarray = None) -> np.ndarray:
+    """
+    Finds the rows that are duplicates of an earlier row. Each row is hashed one column at a time, so that only a
+    column's worth of memory is needed on top of the hashes. Rows with the same hash are then compared, so that hash
+    collisions are never mistaken for duplicates.
+
+    Args:
+        columns (list): The columns that make up each row, as 1-D arrays of the same length (e.g. the target, and
+                        column views of the descriptors). Sparse descriptors can be given as a single sparse matrix,
+                        whose rows are part of each row. Missing values in a sparse matrix never equal each other.
+        rows (numpy.ndarray): Boolean mask of the rows to consider. Rows outside of the mask are never duplicates, and
+                              are not compared against. Defaults to every row.
+
+    Returns:
+        numpy.ndarray: Boolean mask, which is True for each row that repeats an earlier row
+    """
+    n_rows = columns[0].shape[0]
+    hashes = np.zeros(n_rows, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in columns:
+            hashes *= _HASH_MULTIPLIERS[0]
+            hashes ^= _hash_sparse_rows(column) if is_sparse(column) else _hash_column(np.asarray(column))
+
+    candidates = np.arange(n_rows) if rows is None else np.flatnonzero(rows)
+    _, first_indices, groups = np.unique(hashes[candidates], return_index=True, return_inverse=True)
+    originals = candidates[first_indices[groups]]
+    is_repeat = originals != candidates
+    repeats, originals = candidates[is_repeat], originals[is_repeat]
+
+    # Confirm that rows with the same hash are equal. Missing values are treated as equal to each other.
+    is_equal = np.ones(len(repeats), dtype=bool)
+    for column in columns:
+        if is_sparse(column):
+            column = column.tocsr()
+            is_equal &= (column[repeats] != column[originals]).getnnz(axis=1) == 0
+            continue
+        column = np.asarray(column)
+        repeat_values, original_values = column[repeats], column[originals]
+        is_equal &= (repeat_values == original_values) | (missing_values(repeat_values) &
+                                                           missing_values(original_values))
+
+    result = np.zeros(n_rows, dtype=bool)
+    result[repeats[is_equal]] = True
+    return result
+
+
+def downsample(n_rows: int, max_rows: int = None, strata: np.ndarray = None, seed: int = 0) -> np.ndarray:
+    """
+    Chooses at most "max_rows" of "n_rows" rows at random. If strata are given, each stratum gets an equal share of the
+    rows, or all of its rows if it has fewer than that. Small strata, such as the extremes of a distribution or a small
+    cluster, are then kept in full rather than thinned out along with the rest.
+
+    Args:
+        n_rows (int): Number of rows to choose from
+        max_rows (int): Maximum number of rows to choose. Defaults to "plot_max_points"
+        strata (numpy.ndarray): Integer label of the stratum of each row, e.g. from numpy.digitize()
+        seed (int): Seed of the random choice, so that the same rows are chosen each time
+
+    Returns:
+        numpy.ndarray: Indices of the chosen rows, in ascending order
+    """
+    max_rows = max_rows or settings.plot_max_points
+    if n_rows <= max_rows:
+        return np.arange(n_rows)
+    random = np.random.default_rng(seed)
+    if strata is None:
+        return np.sort(random.choice(n_rows, max_rows, replace=False))
+
+    _, strata = np.unique(strata, return_inverse=True)
+    counts = np.bincount(strata)
+    # The largest share per stratum that doesn't take more than "max_rows" rows in total
+    low, high = 0, int(counts.max())
+    while low < high:
+        share = (low + high + 1) // 2
+        if np.minimum(counts, share).sum() <= max_rows:
+            low = share
+        else:
+            high = share - 1
+
+    # Within each stratum, the rows with the lowest random keys are chosen
+    order = np.lexsort((random.random(n_rows), strata))
+    stratum_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ranks = np.arange(n_rows) - stratum_starts[strata[order]]
+    return np.sort(order[ranks < low])
@@ -0,0 +1,145 @@
+# ------------------------------------------------------------ #
+# Workflow unit for a ridge-regression model in Scikit-Learn.  #
+# Alpha is taken from Scikit-Learn's defaults.  The            #
+# hyperparameters are tuned by a successive halving search     #
+# over the values in the search space below, fitting           #
+# candidates in parallel on all of the available cores. The    #
+# model with the best cross-validation score is saved.         #
+#                                                              #
+# When then workflow is in Training mode, the model is trained #
+# and then it is saved, along with the RMSE and some           #
+# predictions made using the training data (e.g. for use in a  #
+# parity plot or calculation of other error metrics). When the #
+# workflow is run in Predict mode, the model is loaded,        #
+# predictions are made, they are un-transformed using the      #
+# trained scaler from the training run, and they are written   #
+# to a file named "predictions.csv"                            #
+# ------------------------------------------------------------ #
+
+
+import numpy as np
+import settings
+
+# Each candidate set of hyperparameters is scored by `n_folds`-fold cross-validation. In each round of the search, only
+# the best 1 / `halving_factor` of the candidates are kept, and they are trained on `halving_factor` times as many
+# samples as in the previous round.
+n_folds = 5
+halving_factor = 3
+
+with settings.context as context:
+    # Train
+    if settings.is_workflow_running_to_train:
+        # The packages used to train the model are only imported when training
+        import sklearn.ensemble
+        import sklearn.tree
+
+        # Enables the successive halving searches
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        import sklearn.model_selection
+        import sklearn.metrics
+
+        # Restore the data
+        train_target = context.load("train_target")
+        test_target = context.load("test_target")
+        train_descriptors = context.load("train_descriptors")
+        test_descriptors = context.load("test_descriptors")
+
+        # Flatten the targets
+        train_target = train_target.flatten()
+        test_target = test_target.flatten()
+
+        # Initialize the Base Estimator
+        base_estimator = sklearn.tree.DecisionTreeRegressor(
+            criterion="mse",
+            splitter="best",
+            max_depth=None,
+            min_samples_split=2,
+            min_samples_leaf=1,
+            min_weight_fraction_leaf=0.0,
+            max_features=None,
+            max_leaf_nodes=None,
+            min_impurity_decrease=0.0,
+            ccp_alpha=0.0,
+        )
+
+        # Initialize the Model
+        model = sklearn.ensemble.AdaBoostRegressor(
+            n_estimators=50,
+            learning_rate=1,
+            loss="linear",
+            base_estimator=base_estimator,
+        )
+
+        # Search the hyperparameters by successive halving, in parallel over the cores allowed in settings.py
+        search_space = {
+            "n_estimators": [25, 50, 100],
+            "learning_rate": [0.1, 0.5, 1],
+            "base_estimator__max_depth": [3, 6, None],
+        }
+        search = sklearn.model_selection.HalvingRandomSearchCV(
+            model,
+            search_space,
+            factor=halving_factor,
+            cv=n_folds,
+            n_jobs=settings.get_n_cores(),
+        )
+        with settings.thread_limits():
+            search.fit(train_descriptors, train_target)
+        print(f"Best hyperparameters: {search.best_params_}")
+
+        # The best model is saved under the same name as the regular flavor's model, so that it predicts the same way
+        model = search.best_estimator_
+        context.save(model, "adaboosted_trees")
+        if settings.is_using_compiled_trees:
+            # Also save the trees as flat arrays, which the predict workflow uses in place of the model
+            context.save(settings.CompiledTrees(model), "adaboosted_trees_compiled_trees")
+        with settings.thread_limits():
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
+
+        # Scale predictions so they have the same shape as the saved target
+        train_predictions = train_predictions.reshape(-1, 1)
+        test_predictions = test_predictions.reshape(-1, 1)
+
+        # Scale for RMSE calc on the test set
+        target_scaler = context.load("target_scaler")
+
+        # Unflatten the target
+        test_target = test_target.reshape(-1, 1)
+        y_true = target_scaler.inverse_transform(test_target)
+        y_pred = target_scaler.inverse_transform(test_predictions)
+
+        # RMSE
+        mse = sklearn.metrics.mean_squared_error(y_true, y_pred)
+        rmse = np.sqrt(mse)
+        print(f"RMSE = {rmse}")
+        context.save(rmse, "RMSE")
+
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(
+                model,
+                train_descriptors,
+                train_target,
+                **context.load("cross_validation"),
+                target_scaler=target_scaler,
+            )
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
+        context.save(train_predictions, "train_predictions")
+        context.save(test_predictions, "test_predictions")
+
+    # Predict
+    else:
+        # Restore data
+        descriptors = context.load("descriptors")
+
+        # Restore model
+        # The trees saved as flat arrays are used in place of the model, if they were saved when it was trained
+        if settings.is_using_compiled_trees and "adaboosted_trees_compiled_trees" in context:
+            model = context.load("adaboosted_trees_compiled_trees")
+        else:
+            model = context.load("adaboosted_trees")
+
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv")
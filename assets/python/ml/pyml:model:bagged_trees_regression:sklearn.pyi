@@ -14,15 +14,17 @@
 # ------------------------------------------------------------ #
 
 
-import sklearn.ensemble
-import sklearn.tree
-import sklearn.metrics
 import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        # The packages used to train the model are only imported when training
+        import sklearn.ensemble
+        import sklearn.tree
+        import sklearn.metrics
+
         # Restore the data
         train_target = context.load("train_target")
         test_target = context.load("test_target")
@@ -57,13 +59,19 @@ with settings.context as context:
             oob_score=False,
             verbose=0,
             base_estimator=base_estimator,
+            n_jobs=settings.get_n_cores(),
         )
 
-        # Train the model and save
-        model.fit(train_descriptors, train_target)
+        # Train the model and save, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            model.fit(train_descriptors, train_target)
         context.save(model, "bagged_trees")
-        train_predictions = model.predict(train_descriptors)
-        test_predictions = model.predict(test_descriptors)
+        if settings.is_using_compiled_trees:
+            # Also save the trees as flat arrays, which the predict workflow uses in place of the model
+            context.save(settings.CompiledTrees(model), "bagged_trees_compiled_trees")
+        with settings.thread_limits():
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
 
         # Scale predictions so they have the same shape as the saved target
         train_predictions = train_predictions.reshape(-1, 1)
@@ -83,6 +91,17 @@ with settings.context as context:
         print(f"RMSE = {rmse}")
         context.save(rmse, "RMSE")
 
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(
+                model,
+                train_descriptors,
+                train_target,
+                **context.load("cross_validation"),
+                target_scaler=target_scaler,
+            )
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
         context.save(train_predictions, "train_predictions")
         context.save(test_predictions, "test_predictions")
 
@@ -92,10 +111,11 @@ with settings.context as context:
         descriptors = context.load("descriptors")
 
         # Restore model
-        model = context.load("bagged_trees")
-
-        # Make some predictions
-        predictions = model.predict(descriptors)
-
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # The trees saved as flat arrays are used in place of the model, if they were saved when it was trained
+        if settings.is_using_compiled_trees and "bagged_trees_compiled_trees" in context:
+            model = context.load("bagged_trees_compiled_trees")
+        else:
+            model = context.load("bagged_trees")
+
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv")
@@ -13,14 +13,15 @@
 #   written to a filed named "predictions.csv"                      #
 # ----------------------------------------------------------------- #
 
-import xgboost
-import sklearn.metrics
 import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        import xgboost
+        import sklearn.metrics
+
         # Restore the data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
@@ -45,17 +46,18 @@ with settings.context as context:
                                       scale_pos_weight=1,
                                       objective='binary:logistic',
                                       eval_metric='logloss',
-                                      use_label_encoder=False)
+                                      use_label_encoder=False,
+                                      n_jobs=settings.get_n_cores())
 
-        # Train the model and save
-        model.fit(train_descriptors, train_target)
+        # Train the model and save, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            model.fit(train_descriptors, train_target)
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
+            test_probabilities = model.predict_proba(test_descriptors)
         context.save(model, "extreme_gradboosted_tree_classification")
-        train_predictions = model.predict(train_descriptors)
-        test_predictions = model.predict(test_descriptors)
 
         # Save the probabilities of the model
-
-        test_probabilities = model.predict_proba(test_descriptors)
         context.save(test_probabilities, "test_probabilities")
 
         # Print some information to the screen for the regression problem
@@ -65,6 +67,12 @@ with settings.context as context:
         print(confusion_matrix)
         context.save(confusion_matrix, "confusion_matrix")
 
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(model, train_descriptors, train_target,
+                                                               **context.load("cross_validation"))
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
         # Ensure predictions have the same shape as the saved target
         train_predictions = train_predictions.reshape(-1, 1)
         test_predictions = test_predictions.reshape(-1, 1)
@@ -79,12 +87,8 @@ with settings.context as context:
         # Restore model
         model = context.load("extreme_gradboosted_tree_classification")
 
-        # Make some predictions
-        predictions = model.predict(descriptors)
-
-        # Transform predictions back to their original labels
-        label_encoder: sklearn.preprocessing.LabelEncoder = context.load("label_encoder")
-        predictions = label_encoder.inverse_transform(predictions)
+        # Predictions are transformed back to their original labels
+        label_encoder = context.load("label_encoder")
 
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv", postprocess=label_encoder.inverse_transform)
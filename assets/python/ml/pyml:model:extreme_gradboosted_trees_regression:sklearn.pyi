@@ -15,14 +15,15 @@
 #   written to a filed named "predictions.csv"                      #
 # ----------------------------------------------------------------- #
 
-import xgboost
-import sklearn.metrics
 import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        import xgboost
+        import sklearn.metrics
+
         # Restore the data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
@@ -46,13 +47,15 @@ with settings.context as context:
                                      reg_alpha=0,
                                      scale_pos_weight=1,
                                      objective='reg:squarederror',
-                                     eval_metric='rmse')
+                                     eval_metric='rmse',
+                                     n_jobs=settings.get_n_cores())
 
-        # Train the model and save
-        model.fit(train_descriptors, train_target)
+        # Train the model and save, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            model.fit(train_descriptors, train_target)
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
         context.save(model, "extreme_gradboosted_tree_regression")
-        train_predictions = model.predict(train_descriptors)
-        test_predictions = model.predict(test_descriptors)
 
         # Scale predictions so they have the same shape as the saved target
         train_predictions = train_predictions.reshape(-1, 1)
@@ -73,6 +76,13 @@ with settings.context as context:
         print(f"RMSE = {rmse}")
         context.save(rmse, "RMSE")
 
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(model, train_descriptors, train_target,
+                                                               **context.load("cross_validation"),
+                                                               target_scaler=target_scaler)
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
     # Predict
     else:
         # Restore data
@@ -81,12 +91,11 @@ with settings.context as context:
         # Restore model
         model = context.load("extreme_gradboosted_tree_regression")
 
-        # Make some predictions and unscale
-        predictions = model.predict(descriptors)
-        predictions = predictions.reshape(-1, 1)
+        # Predictions are unscaled using the scaler from the training run
         target_scaler = context.load("target_scaler")
 
-        predictions = target_scaler.inverse_transform(predictions)
+        def unscale(predictions):
+            return target_scaler.inverse_transform(predictions.reshape(-1, 1))
 
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv", postprocess=unscale, fmt="%.18e")
@@ -12,14 +12,15 @@
 #   written to a filed named "predictions.csv"                      #
 # ----------------------------------------------------------------- #
 
-import sklearn.ensemble
-import sklearn.metrics
 import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        import sklearn.ensemble
+        import sklearn.metrics
+
         # Restore the data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
@@ -53,15 +54,18 @@ with settings.context as context:
                                                             tol=0.0001,
                                                             ccp_alpha=0.0)
 
-        # Train the model and save
-        model.fit(train_descriptors, train_target)
+        # Train the model and save, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            model.fit(train_descriptors, train_target)
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
+            test_probabilities = model.predict_proba(test_descriptors)
         context.save(model, "gradboosted_trees_classification")
-        train_predictions = model.predict(train_descriptors)
-        test_predictions = model.predict(test_descriptors)
+        if settings.is_using_compiled_trees:
+            # Also save the trees as flat arrays, which the predict workflow uses in place of the model
+            context.save(settings.CompiledTrees(model), "gradboosted_trees_classification_compiled_trees")
 
         # Save the probabilities of the model
-
-        test_probabilities = model.predict_proba(test_descriptors)
         context.save(test_probabilities, "test_probabilities")
 
         # Print some information to the screen for the regression problem
@@ -71,6 +75,12 @@ with settings.context as context:
         print(confusion_matrix)
         context.save(confusion_matrix, "confusion_matrix")
 
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(model, train_descriptors, train_target,
+                                                               **context.load("cross_validation"))
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
         # Ensure predictions have the same shape as the saved target
         train_predictions = train_predictions.reshape(-1, 1)
         test_predictions = test_predictions.reshape(-1, 1)
@@ -83,14 +93,14 @@ with settings.context as context:
         descriptors = context.load("descriptors")
 
         # Restore model
-        model = context.load("gradboosted_trees_classification")
-
-        # Make some predictions
-        predictions = model.predict(descriptors)
+        # The trees saved as flat arrays are used in place of the model, if they were saved when it was trained
+        if settings.is_using_compiled_trees and "gradboosted_trees_classification_compiled_trees" in context:
+            model = context.load("gradboosted_trees_classification_compiled_trees")
+        else:
+            model = context.load("gradboosted_trees_classification")
 
-        # Transform predictions back to their original labels
-        label_encoder: sklearn.preprocessing.LabelEncoder = context.load("label_encoder")
-        predictions = label_encoder.inverse_transform(predictions)
+        # Predictions are transformed back to their original labels
+        label_encoder = context.load("label_encoder")
 
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv", postprocess=label_encoder.inverse_transform)
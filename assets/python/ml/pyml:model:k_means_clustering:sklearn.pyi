@@ -10,14 +10,20 @@
 # ------------------------------------------------------------ #
 
 
-import sklearn.cluster
-import sklearn.metrics
 import numpy as np
 import settings
 
+# `n_epochs` is the number of passes made over the training set when the model is trained incrementally, in batches of
+# "training_batch_size" rows (see settings.py).
+n_epochs = 5
+
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        # The packages used to train the model are only imported when training
+        import sklearn.cluster
+        import sklearn.metrics
+
         # Restore the data
         train_descriptors = context.load("train_descriptors")
         test_descriptors = context.load("test_descriptors")
@@ -34,11 +40,27 @@ with settings.context as context:
             verbose=0,
         )
 
-        # Train the model and save
-        model.fit(train_descriptors)
+        # Train the model, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            if settings.training_batch_size:
+                # Train the model incrementally, reading one batch of the training set into memory at a time
+                model = sklearn.cluster.MiniBatchKMeans(
+                    n_clusters=4,
+                    init="k-means++",
+                    tol=0.0,
+                    verbose=0,
+                )
+                for epoch in range(n_epochs):
+                    for rows in settings.batch_slices(train_descriptors.shape[0]):
+                        model.partial_fit(train_descriptors[rows])
+            else:
+                model.fit(train_descriptors)
+
+        # Save the model
         context.save(model, "k_means")
-        train_labels = model.predict(train_descriptors)
-        test_labels = model.predict(test_descriptors)
+        with settings.thread_limits():
+            train_labels = model.predict(train_descriptors)
+            test_labels = model.predict(test_descriptors)
 
         context.save(train_labels, "train_labels")
         context.save(test_labels, "test_labels")
@@ -51,8 +73,5 @@ with settings.context as context:
         # Restore model
         model = context.load("k_means")
 
-        # Make some predictions
-        predictions = model.predict(descriptors)
-
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv")
@@ -14,14 +14,16 @@
 # ------------------------------------------------------------ #
 
 
-import sklearn.kernel_ridge
-import sklearn.metrics
 import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        # The packages used to train the model are only imported when training
+        import sklearn.kernel_ridge
+        import sklearn.metrics
+
         # Restore the data
         train_target = context.load("train_target")
         test_target = context.load("test_target")
@@ -38,11 +40,13 @@ with settings.context as context:
             kernel="linear",
         )
 
-        # Train the model and save
-        model.fit(train_descriptors, train_target)
+        # Train the model and save, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            model.fit(train_descriptors, train_target)
         context.save(model, "kernel_ridge")
-        train_predictions = model.predict(train_descriptors)
-        test_predictions = model.predict(test_descriptors)
+        with settings.thread_limits():
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
 
         # Scale predictions so they have the same shape as the saved target
         train_predictions = train_predictions.reshape(-1, 1)
@@ -62,6 +66,17 @@ with settings.context as context:
         print(f"RMSE = {rmse}")
         context.save(rmse, "RMSE")
 
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(
+                model,
+                train_descriptors,
+                train_target,
+                **context.load("cross_validation"),
+                target_scaler=target_scaler,
+            )
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
         context.save(train_predictions, "train_predictions")
         context.save(test_predictions, "test_predictions")
 
@@ -73,8 +88,5 @@ with settings.context as context:
         # Restore model
         model = context.load("kernel_ridge")
 
-        # Make some predictions
-        predictions = model.predict(descriptors)
-
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv")
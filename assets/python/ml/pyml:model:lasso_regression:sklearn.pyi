@@ -15,14 +15,20 @@
 # ------------------------------------------------------------ #
 
 
-import sklearn.linear_model
-import sklearn.metrics
 import numpy as np
 import settings
 
+# `n_epochs` is the number of passes made over the training set when the model is trained incrementally, in batches of
+# "training_batch_size" rows (see settings.py).
+n_epochs = 5
+
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        # The packages used to train the model are only imported when training
+        import sklearn.linear_model
+        import sklearn.metrics
+
         # Restore the data
         train_target = context.load("train_target")
         test_target = context.load("test_target")
@@ -44,11 +50,33 @@ with settings.context as context:
             selection="cyclic",
         )
 
-        # Train the model and save
-        model.fit(train_descriptors, train_target)
+        # Train the model, using no more threads than are allowed in settings.py
+        with settings.thread_limits():
+            if settings.training_batch_size:
+                # Train the model incrementally, reading one batch of the training set into memory at a time
+                # SGD can't constrain the coefficients, so if the model above is set to be positive, they are projected
+                # back onto the non-negative ones after each batch
+                is_positive = model.positive
+                model = sklearn.linear_model.SGDRegressor(
+                    penalty="l1",
+                    fit_intercept=True,
+                    learning_rate="invscaling",
+                    # The regularization matches that of the model above
+                    alpha=model.alpha,
+                )
+                for epoch in range(n_epochs):
+                    for rows in settings.batch_slices(train_descriptors.shape[0]):
+                        model.partial_fit(train_descriptors[rows], train_target[rows])
+                        if is_positive:
+                            np.maximum(model.coef_, 0, out=model.coef_)
+            else:
+                model.fit(train_descriptors, train_target)
+
+        # Save the model
         context.save(model, "LASSO")
-        train_predictions = model.predict(train_descriptors)
-        test_predictions = model.predict(test_descriptors)
+        with settings.thread_limits():
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
 
         # Scale predictions so they have the same shape as the saved target
         train_predictions = train_predictions.reshape(-1, 1)
@@ -68,6 +96,17 @@ with settings.context as context:
         print(f"RMSE = {rmse}")
         context.save(rmse, "RMSE")
 
+        # Cross-validate the model, if the workflow has a cross-validation unit
+        if "cross_validation" in context:
+            cross_validation_metrics = settings.cross_validate(
+                model,
+                train_descriptors,
+                train_target,
+                **context.load("cross_validation"),
+                target_scaler=target_scaler,
+            )
+            context.save(cross_validation_metrics, "cross_validation_metrics")
+
         context.save(train_predictions, "train_predictions")
         context.save(test_predictions, "test_predictions")
 
@@ -79,8 +118,5 @@ with settings.context as context:
         # Restore model
         model = context.load("LASSO")
 
-        # Make some predictions
-        predictions = model.predict(descriptors)
-
-        # Save the predictions to file
-        np.savetxt("predictions.csv", predictions, header="prediction", comments="", fmt="%s")
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv")
@@ -0,0 +1,225 @@
+# ------------------------------------------------------------ #
+# Workflow unit to screen several models at once. The training #
+# and testing sets are loaded once, and every model in         #
+# `models_to_fit` is fit on them in parallel processes, which  #
+# share the training set by memory-mapping it from the         #
+# context. Each model is saved under the same name its own     #
+# flavor saves it under, along with a leaderboard ranking the  #
+# models by their score on the testing set. The predictions of #
+# the best model are saved for post-processing.                #
+#                                                              #
+# When the workflow is run in Predict mode, the best model is  #
+# loaded, and its predictions are written to a file named      #
+# "predictions.csv"                                            #
+# ------------------------------------------------------------ #
+
+
+import numpy as np
+import settings
+
+# `models_to_fit` is the list of models to screen, by their name in model.yaml. Remove any that aren't wanted.
+models_to_fit = [
+    "adaboosted_trees",
+    "bagged_trees",
+    "gradboosted_trees",
+    "kernel_ridge",
+    "LASSO",
+    "multilayer_perceptron",
+    "random_forest",
+    "ridge",
+]
+
+
+def make_model(name: str):
+    """
+    Returns an unfitted model, with the same parameters as in its own flavor
+    """
+    if name == "adaboosted_trees":
+        import sklearn.ensemble
+        import sklearn.tree
+
+        base_estimator = sklearn.tree.DecisionTreeRegressor(
+            criterion="mse",
+            splitter="best",
+            max_depth=None,
+            min_samples_split=2,
+            min_samples_leaf=1,
+            min_weight_fraction_leaf=0.0,
+            max_features=None,
+            max_leaf_nodes=None,
+            min_impurity_decrease=0.0,
+            ccp_alpha=0.0,
+        )
+        return sklearn.ensemble.AdaBoostRegressor(
+            n_estimators=50,
+            learning_rate=1,
+            loss="linear",
+            base_estimator=base_estimator,
+        )
+    elif name == "bagged_trees":
+        import sklearn.ensemble
+        import sklearn.tree
+
+        base_estimator = sklearn.tree.DecisionTreeRegressor(
+            criterion="mse",
+            splitter="best",
+            max_depth=None,
+            min_samples_split=2,
+            min_samples_leaf=1,
+            min_weight_fraction_leaf=0.0,
+            max_features=None,
+            max_leaf_nodes=None,
+            min_impurity_decrease=0.0,
+            ccp_alpha=0.0,
+        )
+        return sklearn.ensemble.BaggingRegressor(
+            n_estimators=10,
+            max_samples=1.0,
+            max_features=1.0,
+            bootstrap=True,
+            bootstrap_features=False,
+            oob_score=False,
+            verbose=0,
+            base_estimator=base_estimator,
+            n_jobs=settings.get_n_cores(),
+        )
+    elif name == "gradboosted_trees":
+        import sklearn.ensemble
+
+        return sklearn.ensemble.GradientBoostingRegressor(
+            loss="ls",
+            learning_rate=0.1,
+            n_estimators=100,
+            subsample=1.0,
+            criterion="friedman_mse",
+            min_samples_split=2,
+            min_samples_leaf=1,
+            min_weight_fraction_leaf=0.0,
+            max_depth=3,
+            min_impurity_decrease=0.0,
+            max_features=None,
+            alpha=0.9,
+            verbose=0,
+            max_leaf_nodes=None,
+            validation_fraction=0.1,
+            n_iter_no_change=None,
+            tol=0.0001,
+            ccp_alpha=0.0,
+        )
+    elif name == "kernel_ridge":
+        import sklearn.kernel_ridge
+
+        return sklearn.kernel_ridge.KernelRidge(
+            alpha=1.0,
+            kernel="linear",
+        )
+    elif name == "LASSO":
+        import sklearn.linear_model
+
+        return sklearn.linear_model.Lasso(
+            alpha=0.1,
+            fit_intercept=True,
+            normalize=False,
+            precompute=False,
+            tol=0.0001,
+            positive=True,
+            selection="cyclic",
+        )
+    elif name == "multilayer_perceptron":
+        import sklearn.neural_network
+
+        return sklearn.neural_network.MLPRegressor(
+            hidden_layer_sizes=(100,),
+            activation="relu",
+            solver="adam",
+            max_iter=300,
+            early_stopping=False,
+            validation_fraction=0.1,
+        )
+    elif name == "random_forest":
+        import sklearn.ensemble
+
+        return sklearn.ensemble.RandomForestRegressor(
+            n_estimators=100,
+            criterion="mse",
+            max_depth=None,
+            min_samples_split=2,
+            min_samples_leaf=1,
+            min_weight_fraction_leaf=0.0,
+            max_features="auto",
+            max_leaf_nodes=None,
+            min_impurity_decrease=0.0,
+            bootstrap=True,
+            max_samples=None,
+            oob_score=False,
+            ccp_alpha=0.0,
+            verbose=0,
+            n_jobs=settings.get_n_cores(),
+        )
+    elif name == "ridge":
+        import sklearn.linear_model
+
+        return sklearn.linear_model.Ridge(
+            alpha=1.0,
+        )
+    raise ValueError(f"Unknown model '{name}'")
+
+
+with settings.context as context:
+    # Train
+    if settings.is_workflow_running_to_train:
+        import sklearn.metrics
+
+        # Restore the data, once for all of the models
+        train_target = context.load("train_target").reshape(-1)
+        test_target = context.load("test_target").reshape(-1)
+        train_descriptors = context.load("train_descriptors")
+        test_descriptors = context.load("test_descriptors")
+
+        # Scale for RMSE calc on the test set
+        target_scaler = context.load("target_scaler")
+        y_true = target_scaler.inverse_transform(test_target.reshape(-1, 1))
+
+        # Fit the models in parallel processes (see "model_zoo_n_jobs" in settings.py)
+        fitted_models = settings.fit_models(
+            {name: make_model(name) for name in models_to_fit}, train_descriptors, train_target
+        )
+
+        # Score each model on the testing set, and save it under the same name as its own flavor does
+        leaderboard = []
+        for name, (model, fit_time) in fitted_models.items():
+            context.save(model, name)
+            with settings.thread_limits():
+                test_predictions = model.predict(test_descriptors)
+            y_pred = target_scaler.inverse_transform(test_predictions.reshape(-1, 1))
+            score = np.sqrt(sklearn.metrics.mean_squared_error(y_true, y_pred))
+            leaderboard.append({"model": name, "RMSE": float(score), "fit_time": fit_time})
+
+        # Rank the models, best first
+        leaderboard.sort(key=lambda entry: entry["RMSE"])
+        print(f"{'Model':<30} {'RMSE':>12} {'Fit time (s)':>14}")
+        for entry in leaderboard:
+            print(f"{entry['model']:<30} {entry['RMSE']:>12.6g} {entry['fit_time']:>14.2f}")
+        context.save(leaderboard, "model_zoo_leaderboard")
+
+        # Save the predictions of the best model, as its own flavor does
+        best_model_name = leaderboard[0]["model"]
+        context.save(best_model_name, "model_zoo_best_model")
+        model = fitted_models[best_model_name][0]
+        with settings.thread_limits():
+            train_predictions = model.predict(train_descriptors)
+            test_predictions = model.predict(test_descriptors)
+        context.save(leaderboard[0]["RMSE"], "RMSE")
+        context.save(train_predictions.reshape(-1, 1), "train_predictions")
+        context.save(test_predictions.reshape(-1, 1), "test_predictions")
+
+    # Predict
+    else:
+        # Restore data
+        descriptors = context.load("descriptors")
+
+        # Restore the best model
+        model = context.load(context.load("model_zoo_best_model"))
+
+        # Make predictions in batches, and save them to file
+        settings.predict_in_batches(model, descriptors, "predictions.csv")
@@ -14,13 +14,21 @@
 # ----------------------------------------------------------------- #
 
 
-import matplotlib.pyplot as plt
-
+import numpy as np
 import settings
 
+# Datasets of more than "plot_max_points" points (see settings.py) are drawn with a sample of points from each set,
+# stratified over the target so that the extremes are kept. If `is_plotting_density` is True, they are drawn as a
+# hexagonal-bin density plot of every point instead.
+is_plotting_density = False
+n_strata = 100
+
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        # Nothing is plotted when predicting, so matplotlib is only imported here
+        import matplotlib.pyplot as plt
+
         # Restore the data
         train_target = context.load("train_target")
         train_predictions = context.load("train_predictions")
@@ -29,36 +37,47 @@ with settings.context as context:
 
         # Un-transform the data
         target_scaler = context.load("target_scaler")
-        train_target = target_scaler.inverse_transform(train_target)
-        train_predictions = target_scaler.inverse_transform(train_predictions)
-        test_target = target_scaler.inverse_transform(test_target)
-        test_predictions = target_scaler.inverse_transform(test_predictions)
+        train_target = target_scaler.inverse_transform(train_target).ravel()
+        train_predictions = target_scaler.inverse_transform(train_predictions).ravel()
+        test_target = target_scaler.inverse_transform(test_target).ravel()
+        test_predictions = target_scaler.inverse_transform(test_predictions).ravel()
 
-        # Plot the data
-        plt.scatter(train_target, train_predictions, c="#203d78", label="Training Set")
+        # Scale the plot to fit both the targets and the predictions
+        sets = [("Training Set", "#203d78", train_target, train_predictions)]
         if settings.is_using_train_test_split:
-            plt.scatter(test_target, test_predictions, c="#67ac5b", label="Testing Set")
+            sets.append(("Testing Set", "#67ac5b", test_target, test_predictions))
+        limits = (min(min(target.min(), predictions.min()) for _, _, target, predictions in sets),
+                  max(max(target.max(), predictions.max()) for _, _, target, predictions in sets))
+
+        # Plot the data
+        n_points = sum(len(target) for _, _, target, _ in sets)
+        if is_plotting_density and n_points > settings.plot_max_points:
+            all_targets = np.concatenate([target for _, _, target, _ in sets])
+            all_predictions = np.concatenate([predictions for _, _, _, predictions in sets])
+            plt.hexbin(all_targets, all_predictions, gridsize=200, bins="log", mincnt=1, cmap="viridis",
+                       extent=(limits[0], limits[1], limits[0], limits[1]))
+            plt.colorbar(label="Number of Points")
+        else:
+            strata_edges = np.linspace(limits[0], limits[1], n_strata)
+            for label, color, target, predictions in sets:
+                # Each set gets a share of the points in proportion to its size
+                max_rows = max(1, settings.plot_max_points * len(target) // n_points)
+                rows = settings.downsample(len(target), max_rows, strata=np.digitize(target, strata_edges))
+                if len(rows) < len(target):
+                    label = f"{label} ({len(rows)} of {len(target)} points)"
+                plt.scatter(target[rows], predictions[rows], c=color, label=label)
         plt.xlabel("Actual Value")
         plt.ylabel("Predicted Value")
-
-        # Scale the plot
-        target_range = (min(min(train_target), min(test_target)),
-                        max(max(train_target), max(test_target)))
-        predictions_range = (min(min(train_predictions), min(test_predictions)),
-                             max(max(train_predictions), max(test_predictions)))
-
-        limits = (min(min(target_range), min(target_range)),
-                  max(max(predictions_range), max(predictions_range)))
-        plt.xlim = (limits[0], limits[1])
-        plt.ylim = (limits[0], limits[1])
+        plt.xlim(limits)
+        plt.ylim(limits)
 
         # Draw a parity line, as a guide to the eye
-        plt.plot((limits[0], limits[1]), (limits[0], limits[1]), c="black", linestyle="dotted", label="Parity")
+        plt.plot(limits, limits, c="black", linestyle="dotted", label="Parity")
         plt.legend()
 
         # Save the figure
         plt.tight_layout()
-        plt.savefig("my_parity_plot.png", dpi=600)
+        plt.savefig("my_parity_plot.png", dpi=settings.plot_dpi)
 
     # Predict
     else:
@@ -18,27 +18,43 @@
 #                                                                   #
 # ----------------------------------------------------------------- #
 
-import pandas as pd
-import matplotlib.cm
-import matplotlib.lines
-import matplotlib.pyplot as plt
-import sklearn.decomposition
+import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        import matplotlib.cm
+        import matplotlib.lines
+        import matplotlib.pyplot as plt
+        import sklearn.decomposition
+
         # Restore the data
         train_labels = context.load("train_labels")
         train_descriptors = context.load("train_descriptors")
         test_labels = context.load("test_labels")
         test_descriptors = context.load("test_descriptors")
 
+        # Large datasets are plotted with a sample of the points in each cluster (see "plot_max_points" in settings.py).
+        # Each set gets a share of the points in proportion to its size.
+        n_points = len(train_labels) + len(test_labels)
+        train_share = max(1, settings.plot_max_points * len(train_labels) // n_points)
+        test_share = max(1, settings.plot_max_points * len(test_labels) // n_points)
+        train_rows = settings.downsample(len(train_labels), train_share, strata=train_labels)
+        test_rows = settings.downsample(len(test_labels), test_share, strata=test_labels)
+        train_labels, train_descriptors = train_labels[train_rows], train_descriptors[train_rows]
+        test_labels, test_descriptors = test_labels[test_rows], test_descriptors[test_rows]
+
         # Unscale the descriptors
         descriptor_scaler = context.load("descriptor_scaler")
         train_descriptors = descriptor_scaler.inverse_transform(train_descriptors)
         test_descriptors = descriptor_scaler.inverse_transform(test_descriptors)
 
+        # PCA needs dense descriptors. Only the sampled rows are densified, so this stays small.
+        if settings.is_sparse(train_descriptors):
+            train_descriptors = train_descriptors.toarray()
+            test_descriptors = test_descriptors.toarray()
+
         # We need at least 2 dimensions, exit if the dataset is 1D
         if train_descriptors.ndim < 2:
             raise ValueError("The train descriptors do not have enough dimensions to be plot in 2D")
@@ -51,14 +67,12 @@ with settings.context as context:
         ylabel = "Principle Component 2"
 
         # Determine the labels we're going to be using, and generate their colors
-        labels = set(train_labels)
-        colors = {}
-        for count, label in enumerate(labels):
-            cm = matplotlib.cm.get_cmap('jet', len(labels))
-            color = cm(count / len(labels))
-            colors[label] = color
-        train_colors = [colors[label] for label in train_labels]
-        test_colors = [colors[label] for label in test_labels]
+        labels = np.unique(np.concatenate((train_labels, test_labels)))
+        cm = matplotlib.cm.get_cmap('jet', len(labels))
+        label_colors = cm(np.arange(len(labels)) / len(labels))
+        colors = dict(zip(labels, map(tuple, label_colors)))
+        train_colors = label_colors[np.searchsorted(labels, train_labels)]
+        test_colors = label_colors[np.searchsorted(labels, test_labels)]
 
         # Train / Test Split Visualization
         plt.title("Train Test Split Visualization")
@@ -69,7 +83,7 @@ with settings.context as context:
         xmin, xmax, ymin, ymax = plt.axis()
         plt.legend()
         plt.tight_layout()
-        plt.savefig("train_test_split.png", dpi=600)
+        plt.savefig("train_test_split.png", dpi=settings.plot_dpi)
         plt.close()
 
         def clusters_legend(cluster_colors):
@@ -97,7 +111,7 @@ with settings.context as context:
         plt.scatter(train_descriptors[:, 0], train_descriptors[:, 1], c=train_colors)
         clusters_legend(colors)
         plt.tight_layout()
-        plt.savefig("train_clusters.png", dpi=600)
+        plt.savefig("train_clusters.png", dpi=settings.plot_dpi)
         plt.close()
 
         # Testing Set Clusters
@@ -109,7 +123,7 @@ with settings.context as context:
         plt.scatter(test_descriptors[:, 0], test_descriptors[:, 1], c=test_colors)
         clusters_legend(colors)
         plt.tight_layout()
-        plt.savefig("test_clusters.png", dpi=600)
+        plt.savefig("test_clusters.png", dpi=settings.plot_dpi)
         plt.close()
 
 
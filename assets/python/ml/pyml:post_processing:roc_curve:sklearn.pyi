@@ -8,22 +8,23 @@
 # ----------------------------------------------------------------- #
 
 
-import matplotlib.pyplot as plt
-import matplotlib.collections
-import sklearn.metrics
 import numpy as np
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        import matplotlib.pyplot as plt
+        import matplotlib.collections
+        import sklearn.metrics
+
         # Restore the data
         test_target = context.load("test_target").flatten()
         # Slice the first column because Sklearn's ROC curve prefers probabilities for the positive class
         test_probabilities = context.load("test_probabilities")[:, 1]
 
         # Exit if there's more than one label in the predictions
-        if len(set(test_target)) > 2:
+        if len(np.unique(test_target)) > 2:
             exit()
 
         # ROC curve function in sklearn prefers the positive class
@@ -32,6 +33,13 @@ with settings.context as context:
         thresholds[0] -= 1  # Sklearn arbitrarily adds 1 to the first threshold
         roc_auc = np.round(sklearn.metrics.auc(false_positive_rate, true_positive_rate), 3)
 
+        # Thin out long curves, keeping their ends, so that they take a bounded time to draw
+        if len(thresholds) > settings.plot_max_points:
+            points = np.unique(np.linspace(0, len(thresholds) - 1, settings.plot_max_points).round().astype(int))
+            false_positive_rate = false_positive_rate[points]
+            true_positive_rate = true_positive_rate[points]
+            thresholds = thresholds[points]
+
         # Plot the curve
         fig, ax = plt.subplots()
         points = np.array([false_positive_rate, true_positive_rate]).T.reshape(-1, 1, 2)
@@ -49,7 +57,7 @@ with settings.context as context:
         plt.xlabel("False Positive Rate")
         plt.ylabel("True Positive Rate")
         plt.tight_layout()
-        plt.savefig("my_roc_curve.png", dpi=600)
+        plt.savefig("my_roc_curve.png", dpi=settings.plot_dpi)
 
     # Predict
     else:
@@ -0,0 +1,153 @@
+# ----------------------------------------------------------------- #
+#                                                                   #
+#   Fused Pre-Processing workflow unit                              #
+#                                                                   #
+#   This workflow unit removes missing values, drops duplicate      #
+#   rows, and scales the data, all in a single unit. It does the    #
+#   same work as the "remove_missing", "remove_duplicates", and     #
+#   "standardization" or "min_max_scaler" units run one after the   #
+#   other, but only copies the data once, and only saves it once.   #
+#                                                                   #
+#   The rows to keep are found with boolean masks over the arrays,  #
+#   and duplicates are found by hashing each row. If the workflow   #
+#   does not split the data into training and testing sets, the     #
+#   two are the same, and are only processed once.                  #
+#                                                                   #
+#   Sparse descriptors (see "is_using_sparse_descriptors" in        #
+#   settings.py) are kept sparse: they are scaled without being     #
+#   centered, and a "min_max" scaler divides by the maximum         #
+#   absolute value instead.                                         #
+#                                                                   #
+#   During a predict workflow, the descriptors are scaled using the #
+#   scaler from the training run, and any columns that were removed #
+#   in training are removed from them too.                          #
+# ----------------------------------------------------------------- #
+
+
+import numpy as np
+import settings
+
+# `to_drop` can be "rows", "columns", "both", or None
+# If it is set to "rows" (by default), then all rows with missing values will be dropped.
+# If it is set to "columns", then all descriptor columns with missing values in the training set will be dropped.
+# If it is set to "both", then all rows and columns with missing values will be dropped.
+# If it is set to None, missing values are left alone.
+# Rows with missing values are always dropped from the testing set, unless `to_drop` is None.
+to_drop = "rows"
+
+# `is_removing_duplicates` controls whether duplicate rows are dropped.
+is_removing_duplicates = True
+
+# `scaler` can be "standardization", "min_max", or None
+# "standardization" (by default) scales the data to a mean of 0 and a standard deviation of 1.
+# "min_max" scales the data to lie between 0 and 1.
+# None leaves the data unscaled.
+scaler = "standardization"
+
+
+def select_rows(target, descriptors, columns, is_training_set):
+    """
+    Finds the rows to keep from a dataset, and copies them (and the columns to keep) out of the original arrays.
+
+    Args:
+        target (numpy.ndarray): The target
+        descriptors (numpy.ndarray): The descriptors, as an array or a sparse matrix
+        columns (numpy.ndarray): Indices of the descriptor columns to keep
+        is_training_set (bool): Whether this is the training set
+
+    Returns:
+        tuple: The selected target and descriptors
+    """
+    # Targets and descriptors may also have been saved as pandas objects
+    target = np.asarray(target).reshape(len(target), -1)
+    if not settings.is_sparse(descriptors):
+        descriptors = np.asarray(descriptors)
+
+    rows = np.ones(len(target), dtype=bool)
+    if to_drop is not None and (to_drop in ("rows", "both") or not is_training_set):
+        rows &= ~settings.missing_values(target).any(axis=1)
+        rows &= ~settings.rows_with_missing_values(descriptors, columns)
+
+    if is_removing_duplicates:
+        if settings.is_sparse(descriptors):
+            # The rows of a sparse matrix are hashed together, rather than column by column
+            row_columns = [target[:, 0], descriptors[:, columns]]
+        else:
+            row_columns = [target[:, 0]] + [descriptors[:, column] for column in columns]
+        rows &= ~settings.duplicate_rows(row_columns, rows)
+
+    rows = np.flatnonzero(rows)
+    return target[rows], settings.select(descriptors, rows, columns)
+
+
+with settings.context as context:
+    # Train
+    if settings.is_workflow_running_to_train:
+        import sklearn.preprocessing
+        scaler_class = {
+            "standardization": sklearn.preprocessing.StandardScaler,
+            "min_max": sklearn.preprocessing.MinMaxScaler,
+            None: None,
+        }[scaler]
+
+        # Restore the data
+        train_target = context.load("train_target")
+        train_descriptors = context.load("train_descriptors")
+        if not settings.is_sparse(train_descriptors):
+            train_descriptors = np.asarray(train_descriptors)
+
+        # Columns are dropped based on the training set, and then from every dataset, so that they all line up
+        columns = np.arange(train_descriptors.shape[1])
+        if to_drop in ("columns", "both"):
+            columns = np.flatnonzero(~settings.columns_with_missing_values(train_descriptors))
+            context.save(columns, "descriptor_columns")
+
+        train_target, train_descriptors = select_rows(train_target, train_descriptors, columns, True)
+        if settings.is_using_train_test_split:
+            test_target, test_descriptors = select_rows(context.load("test_target"), context.load("test_descriptors"),
+                                                        columns, False)
+
+        # Scale the data. The selected rows are already a copy, so they are scaled in-place. The scalers are switched
+        # back to copying before they are saved, as the arrays they are used on later (such as the descriptors at
+        # predict time) are read-only.
+        if scaler_class is not None:
+            descriptor_scaler = settings.sparse_aware_scaler(scaler_class(copy=False), train_descriptors)
+            train_descriptors = descriptor_scaler.fit_transform(train_descriptors)
+            if settings.is_using_train_test_split:
+                test_descriptors = descriptor_scaler.transform(test_descriptors)
+            context.save(descriptor_scaler.set_params(copy=True), "descriptor_scaler")
+
+            # Our target is only continuous if it's a regression problem
+            if settings.is_regression:
+                target_scaler = scaler_class(copy=False)
+                train_target = target_scaler.fit_transform(train_target)
+                if settings.is_using_train_test_split:
+                    test_target = target_scaler.transform(test_target)
+                context.save(target_scaler.set_params(copy=True), "target_scaler")
+
+        # Store the data. Without a train/test split, the testing set is the training set, so it's saved once under
+        # both names.
+        if settings.is_using_train_test_split:
+            context.save(train_target, "train_target")
+            context.save(train_descriptors, "train_descriptors")
+            context.save(test_target, "test_target")
+            context.save(test_descriptors, "test_descriptors")
+        else:
+            context.save(train_target, "train_target", "test_target")
+            context.save(train_descriptors, "train_descriptors", "test_descriptors")
+
+    # Predict
+    else:
+        # Restore data
+        descriptors = context.load("descriptors")
+
+        if "descriptor_columns" in context:
+            descriptors = descriptors[:, context.load("descriptor_columns")]
+
+        if scaler is not None:
+            # Get the scaler, and scale the data
+            descriptor_scaler = context.load("descriptor_scaler")
+            descriptors = descriptor_scaler.transform(descriptors)
+
+        # Store the data
+        context.save(descriptors, "descriptors")
@@ -15,13 +15,13 @@
 # ----------------------------------------------------------------- #
 
 
-import sklearn.preprocessing
-
 import settings
 
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
+        import sklearn.preprocessing
+
         # Restore the data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
@@ -30,12 +30,25 @@ with settings.context as context:
 
         # Descriptor MinMax Scaler
         scaler = sklearn.preprocessing.MinMaxScaler
-        descriptor_scaler = scaler()
-        train_descriptors = descriptor_scaler.fit_transform(train_descriptors)
-        test_descriptors = descriptor_scaler.transform(test_descriptors)
-        context.save(descriptor_scaler, "descriptor_scaler")
-        context.save(train_descriptors, "train_descriptors")
-        context.save(test_descriptors, "test_descriptors")
+        # Sparse descriptors are scaled without centering them, so that they stay sparse
+        descriptor_scaler = settings.sparse_aware_scaler(scaler(), train_descriptors)
+        if settings.training_batch_size:
+            # Fit and apply the scaler one batch at a time. Without a train/test split, the testing set is the training
+            # set, so it's only scaled and saved once.
+            descriptor_scaler = settings.partial_fit_in_batches(descriptor_scaler, train_descriptors)
+            context.save(descriptor_scaler, "descriptor_scaler")
+            if settings.is_using_train_test_split:
+                settings.transform_in_batches(descriptor_scaler, train_descriptors, "train_descriptors")
+                settings.transform_in_batches(descriptor_scaler, test_descriptors, "test_descriptors")
+            else:
+                settings.transform_in_batches(descriptor_scaler, train_descriptors, "train_descriptors",
+                                              "test_descriptors")
+        else:
+            train_descriptors = descriptor_scaler.fit_transform(train_descriptors)
+            test_descriptors = descriptor_scaler.transform(test_descriptors)
+            context.save(descriptor_scaler, "descriptor_scaler")
+            context.save(train_descriptors, "train_descriptors")
+            context.save(test_descriptors, "test_descriptors")
 
         # Our target is only continuous if it's a regression problem
         if settings.is_regression:
@@ -54,8 +67,9 @@ with settings.context as context:
         # Get the scaler
         descriptor_scaler = context.load("descriptor_scaler")
 
-        # Scale the data
-        descriptors = descriptor_scaler.transform(descriptors)
-
-        # Store the data
-        context.save(descriptors, "descriptors")
+        # Scale the data, and store it
+        if settings.training_batch_size:
+            settings.transform_in_batches(descriptor_scaler, descriptors, "descriptors")
+        else:
+            descriptors = descriptor_scaler.transform(descriptors)
+            context.save(descriptors, "descriptors")
@@ -7,39 +7,58 @@
 # ----------------------------------------------------------------- #
 
 
-import pandas
+import numpy as np
 import settings
 
+
+def drop_duplicates(target, descriptors):
+    """
+    Drops the rows of a dataset that repeat an earlier row. Rows are compared by hashing, one column at a time, rather
+    than by joining the target and descriptors into a DataFrame.
+
+    Args:
+        target (numpy.ndarray): The target
+        descriptors (numpy.ndarray): The descriptors, as an array or a sparse matrix
+
+    Returns:
+        tuple: The target and descriptors, without the duplicate rows
+    """
+    # Targets and descriptors may also have been saved as pandas objects
+    target = np.asarray(target).reshape(len(target), -1)
+    if settings.is_sparse(descriptors):
+        # The rows of a sparse matrix are hashed together, rather than column by column
+        columns = [target[:, 0], descriptors]
+    else:
+        descriptors = np.asarray(descriptors)
+        columns = [target[:, 0]] + [descriptors[:, column] for column in range(descriptors.shape[1])]
+    rows = np.flatnonzero(~settings.duplicate_rows(columns))
+    return target[rows], settings.select(descriptors, rows)
+
+
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
         # Restore the data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
-        test_target = context.load("test_target")
-        test_descriptors = context.load("test_descriptors")
 
         # Drop duplicates from the training set
-        df = pandas.DataFrame(train_target, columns=["target"])
-        df = df.join(pandas.DataFrame(train_descriptors))
-        df = df.drop_duplicates()
-        train_target = df.pop("target").to_numpy()
-        train_target = train_target.reshape(-1, 1)
-        train_descriptors = df.to_numpy()
-
-        # Drop duplicates from the testing set
-        df = pandas.DataFrame(test_target, columns=["target"])
-        df = df.join(pandas.DataFrame(test_descriptors))
-        df = df.drop_duplicates()
-        test_target = df.pop("target").to_numpy()
-        test_target = test_target.reshape(-1, 1)
-        test_descriptors = df.to_numpy()
-
-        # Store the data
-        context.save(train_target, "train_target")
-        context.save(train_descriptors, "train_descriptors")
-        context.save(test_target, "test_target")
-        context.save(test_descriptors, "test_descriptors")
+        train_target, train_descriptors = drop_duplicates(train_target, train_descriptors)
+
+        # Store the data. Without a train/test split, the testing set is the training set, so it's only processed and
+        # saved once.
+        if settings.is_using_train_test_split:
+            # Drop duplicates from the testing set
+            test_target, test_descriptors = drop_duplicates(context.load("test_target"),
+                                                            context.load("test_descriptors"))
+
+            context.save(train_target, "train_target")
+            context.save(train_descriptors, "train_descriptors")
+            context.save(test_target, "test_target")
+            context.save(test_descriptors, "test_descriptors")
+        else:
+            context.save(train_target, "train_target", "test_target")
+            context.save(train_descriptors, "train_descriptors", "test_descriptors")
 
     # Predict
     else:
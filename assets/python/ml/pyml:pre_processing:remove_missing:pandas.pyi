@@ -14,7 +14,7 @@
 # ----------------------------------------------------------------- #
 
 
-import pandas
+import numpy as np
 import settings
 
 # `to_drop` can either be "rows" or "columns"
@@ -24,44 +24,65 @@ import settings
 to_drop = "rows"
 
 
+def drop_missing(target, descriptors, columns, is_dropping_rows):
+    """
+    Drops the rows with missing values from a dataset (if requested), and keeps only the given descriptor columns.
+    The rows and columns are found with boolean masks, and copied out of the original arrays once.
+
+    Args:
+        target (numpy.ndarray): The target
+        descriptors (numpy.ndarray): The descriptors, as an array or a sparse matrix
+        columns (numpy.ndarray): Indices of the descriptor columns to keep
+        is_dropping_rows (bool): Whether to drop the rows with missing values
+
+    Returns:
+        tuple: The target and descriptors, without the dropped rows and columns
+    """
+    # Targets and descriptors may also have been saved as pandas objects
+    target = np.asarray(target).reshape(len(target), -1)
+    if not settings.is_sparse(descriptors):
+        descriptors = np.asarray(descriptors)
+
+    rows = np.ones(len(target), dtype=bool)
+    if is_dropping_rows:
+        rows &= ~settings.missing_values(target).any(axis=1)
+        rows &= ~settings.rows_with_missing_values(descriptors, columns)
+    rows = np.flatnonzero(rows)
+    return target[rows], settings.select(descriptors, rows, columns)
+
+
 with settings.context as context:
     # Train
     if settings.is_workflow_running_to_train:
         # Restore the data
         train_target = context.load("train_target")
         train_descriptors = context.load("train_descriptors")
-        test_target = context.load("test_target")
-        test_descriptors = context.load("test_descriptors")
-
-        # Drop missing from the training set
-        df = pandas.DataFrame(train_target, columns=["target"])
-        df = df.join(pandas.DataFrame(train_descriptors))
+        if not settings.is_sparse(train_descriptors):
+            train_descriptors = np.asarray(train_descriptors)
 
-        directions = {
-            "rows": ("index",),
-            "columns": ("columns",),
-            "both": ("index", "columns"),
-        }[to_drop]
-        for direction in directions:
-            df = df.dropna(direction)
+        # Columns are dropped based on the training set, and then from the testing set too, so that the two line up
+        columns = np.arange(train_descriptors.shape[1])
+        if to_drop in ("columns", "both"):
+            columns = np.flatnonzero(~settings.columns_with_missing_values(train_descriptors))
 
-        train_target = df.pop("target").to_numpy()
-        train_target = train_target.reshape(-1, 1)
-        train_descriptors = df.to_numpy()
+        # Drop missing from the training set
+        train_target, train_descriptors = drop_missing(train_target, train_descriptors, columns,
+                                                       is_dropping_rows=to_drop in ("rows", "both"))
 
-        # Drop missing from the testing set
-        df = pandas.DataFrame(test_target, columns=["target"])
-        df = df.join(pandas.DataFrame(test_descriptors))
-        df = df.dropna()
-        test_target = df.pop("target").to_numpy()
-        test_target = test_target.reshape(-1, 1)
-        test_descriptors = df.to_numpy()
+        # Store the data. Without a train/test split, the testing set is the training set, so it's only processed and
+        # saved once.
+        if settings.is_using_train_test_split:
+            # Drop missing from the testing set. Rows with missing values are always dropped here.
+            test_target, test_descriptors = drop_missing(context.load("test_target"), context.load("test_descriptors"),
+                                                         columns, is_dropping_rows=True)
 
-        # Store the data
-        context.save(train_target, "train_target")
-        context.save(train_descriptors, "train_descriptors")
-        context.save(test_target, "test_target")
-        context.save(test_descriptors, "test_descriptors")
+            context.save(train_target, "train_target")
+            context.save(train_descriptors, "train_descriptors")
+            context.save(test_target, "test_target")
+            context.save(test_descriptors, "test_descriptors")
+        else:
+            context.save(train_target, "train_target", "test_target")
+            context.save(train_descriptors, "train_descriptors", "test_descriptors")
 
     # Predict
     else:
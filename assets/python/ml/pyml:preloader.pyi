@@ -0,0 +1,281 @@
+# ----------------------------------------------------------------- #
+#                                                                   #
+#   Warm-start preloader                                            #
+#                                                                   #
+#   Every workflow unit is normally run in a new Python process,    #
+#   which has to import the scientific Python stack all over again  #
+#   before it can do anything. The preloader keeps a server process #
+#   running in the background, which has already imported the       #
+#   packages in `preloaded_modules`. Each unit run through the      #
+#   preloader is run in a fork of the server, and so starts with    #
+#   those packages already imported.                                #
+#                                                                   #
+#   Usage:                                                          #
+#     python preloader.py --start     Starts the server             #
+#     python preloader.py unit.py     Runs a unit                   #
+#     python preloader.py --stop      Stops the server              #
+#                                                                   #
+#   If the server isn't running, or can't run on this platform      #
+#   (e.g. on Windows), the unit is run in this process instead.     #
+#   The server stops by itself once it has been idle for            #
+#   `idle_timeout` seconds.                                         #
+#                                                                   #
+#   settings.py is never preloaded, as it reads the context when it #
+#   is imported: each unit imports it afresh.                       #
+# ----------------------------------------------------------------- #
+
+
+import hashlib
+import importlib
+import json
+import os
+import runpy
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+# `preloaded_modules` are imported by the server before it starts running units. Modules that aren't installed are
+# skipped.
+preloaded_modules = [
+    "numpy",
+    "pandas",
+    "sklearn.ensemble",
+    "sklearn.linear_model",
+    "sklearn.metrics",
+    "sklearn.model_selection",
+    "sklearn.preprocessing",
+    "matplotlib.pyplot",
+    "xgboost",
+]
+
+# `idle_timeout` is how long, in seconds, the server waits for a unit to run before stopping
+idle_timeout = 600
+
+# Each Python interpreter and working directory gets its own server, so jobs (and virtual environments) don't share one
+_server_id = hashlib.sha256(f"{sys.executable}:{os.getcwd()}".encode()).hexdigest()[:16]
+socket_path = os.path.join(tempfile.gettempdir(), f"pyml_preloader_{_server_id}.sock")
+
+is_supported = hasattr(socket, "AF_UNIX") and hasattr(os, "fork")
+
+
+def run_unit(argv: list) -> int:
+    """
+    Runs a unit script as if it were the main program
+
+    Args:
+        argv (list): The unit script, followed by its arguments
+
+    Returns:
+        int: The exit status of the unit
+    """
+    sys.argv = list(argv)
+    sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+    try:
+        runpy.run_path(argv[0], run_name="__main__")
+    except SystemExit as exit_status:
+        if exit_status.code is None or isinstance(exit_status.code, int):
+            return exit_status.code or 0
+        print(exit_status.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def _receive_exactly(connection: socket.socket, n_bytes: int) -> bytes:
+    data = b""
+    while len(data) < n_bytes:
+        block = connection.recv(n_bytes - len(data))
+        if not block:
+            raise ConnectionError("The connection closed early")
+        data += block
+    return data
+
+
+def _send_message(connection: socket.socket, message: dict):
+    data = json.dumps(message).encode()
+    connection.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _receive_message(connection: socket.socket) -> dict:
+    n_bytes = struct.unpack("!I", _receive_exactly(connection, 4))[0]
+    return json.loads(_receive_exactly(connection, n_bytes).decode())
+
+
+def _run_forked_unit(connection: socket.socket, file_descriptors: list, request: dict):
+    """
+    Runs a unit in a freshly-forked copy of the server, with the standard streams, working directory and environment of
+    the client that requested it. Sends the unit's exit status back to the client, and exits.
+    """
+    exit_status = 1
+    try:
+        for standard_descriptor, file_descriptor in enumerate(file_descriptors):
+            os.dup2(file_descriptor, standard_descriptor)
+            os.close(file_descriptor)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["environment"])
+        exit_status = run_unit(request["argv"])
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        try:
+            connection.sendall(struct.pack("!i", exit_status))
+        finally:
+            os._exit(exit_status)
+
+
+def serve():
+    """
+    Imports the preloaded modules, then runs each unit it's sent in a fork of itself, until it's stopped or idle
+    """
+    from multiprocessing import reduction
+
+    for module in preloaded_modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(16)
+    server.settimeout(idle_timeout)
+
+    children = set()
+    try:
+        while True:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                connection = None
+            # Reap the units that have finished
+            for pid in list(children):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    children.remove(pid)
+            if connection is None:
+                if not children:
+                    break
+                continue
+
+            with connection:
+                connection.settimeout(None)
+                try:
+                    request = _receive_message(connection)
+                except ConnectionError:
+                    # Clients checking whether the server is running connect without sending anything
+                    continue
+                if request["command"] == "stop":
+                    break
+                # The client's stdin, stdout and stderr
+                file_descriptors = reduction.recvfds(connection, 3)
+                # Anything still buffered would otherwise be written out by the unit, to the client's streams
+                for stream in (sys.stdout, sys.stderr):
+                    stream.flush()
+                pid = os.fork()
+                if pid == 0:
+                    server.close()
+                    _run_forked_unit(connection, file_descriptors, request)
+                children.add(pid)
+                for file_descriptor in file_descriptors:
+                    os.close(file_descriptor)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def _connect():
+    """
+    Returns a connection to the server, or None if it isn't running
+    """
+    if not is_supported:
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def start_server(timeout: float = 120):
+    """
+    Starts the server in the background, and waits until it's ready to run units
+    """
+    if not is_supported:
+        print("The preloader isn't supported on this platform, so units will be run without it")
+        return
+    connection = _connect()
+    if connection is not None:
+        connection.close()
+        return
+    with open(os.devnull, "r+b") as devnull:
+        subprocess.Popen((sys.executable, os.path.abspath(__file__), "--serve"), stdin=devnull, stdout=devnull,
+                         stderr=devnull, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        connection = _connect()
+        if connection is not None:
+            connection.close()
+            return
+        time.sleep(0.1)
+    raise TimeoutError(f"The preloader did not start within {timeout} seconds")
+
+
+def stop_server():
+    connection = _connect()
+    if connection is not None:
+        with connection:
+            _send_message(connection, {"command": "stop"})
+
+
+def run(argv: list) -> int:
+    """
+    Runs a unit with the server if it's running, or in this process if it isn't
+
+    Args:
+        argv (list): The unit script, followed by its arguments
+
+    Returns:
+        int: The exit status of the unit
+    """
+    connection = _connect()
+    if connection is None:
+        return run_unit(argv)
+
+    from multiprocessing import reduction
+    with connection:
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        _send_message(connection, {"command": "run", "argv": argv, "cwd": os.getcwd(),
+                                   "environment": dict(os.environ)})
+        reduction.sendfds(connection, [0, 1, 2])
+        try:
+            return struct.unpack("!i", _receive_exactly(connection, 4))[0]
+        except ConnectionError:
+            print("The preloader stopped before the unit finished", file=sys.stderr)
+            return 1
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+    elif sys.argv[1:] == ["--start"]:
+        start_server()
+    elif sys.argv[1:] == ["--stop"]:
+        stop_server()
+    elif len(sys.argv) > 1:
+        sys.exit(run(sys.argv[1:]))
+    else:
+        print(f"Usage: {sys.argv[0]} [--start | --stop | unit.py [arguments ...]]", file=sys.stderr)
+        sys.exit(2)
@@ -8,9 +8,11 @@
 #   this file. This helps facilitate the workflow's behavior        #
 #   differing whether it is in a "train" or "predict" mode.         #
 #                                                                   #
-#   Also in this file is the "Context" object, which helps maintain #
-#   certain Python objects between workflow units, and between      #
-#   predict runs.                                                   #
+#   Also made available here is the "Context" object, which helps   #
+#   maintain certain Python objects between workflow units, and     #
+#   between predict runs. It is defined, along with the helpers     #
+#   used by the units, in pyml_library.py, which this file imports  #
+#   and configures.                                                 #
 #                                                                   #
 #   Whenever a python object needs to be stored for subsequent runs #
 #   (such as in the case of a trained model), context.save() can be #
@@ -19,7 +21,7 @@
 # ----------------------------------------------------------------- #
 
 
-import pickle, os
+import os, sys
 
 # ==================================================
 # Variables modified in the Important Settings menu
@@ -68,94 +70,119 @@ if is_workflow_running_to_predict:
 else:
     datafile = "{% raw %}{{DATASET_BASENAME}}{% endraw %}"
 
-# The "Context" class allows for data to be saved and loaded between units, and between train and predict runs.
-# Variables which have been saved using the "Save" method are written to disk, and the predict workflow is automatically
-# configured to obtain these files when it starts.
+# The "Context" object saves objects to the "context_dir_pathname" directory, from which they can be loaded by later
+# units, and by the predict workflow.
 #
-# IMPORTANT NOTE: Do *not* adjust the value of "context_dir_pathname" in the Context object. If the value is changed, then
-# files will not be correctly copied into the generated predict workflow. This will cause the predict workflow to be
-# generated in a broken state, and it will not be able to make any predictions.
-class Context(object):
-    """
-    Saves and loads objects from the disk, useful for preserving data between workflow units
-
-    Attributes:
-        context_paths (dict): Dictionary of the format {variable_name: path}, that governs where
-                              pickle saves files.
-
-    Methods:
-        save: Used to save objects to the context directory
-        load: Used to load objects from the context directory
-    """
-
-    def __init__(self, context_file_basename="workflow_context_file_mapping"):
-        """
-        Constructor for Context objects
-
-        Args:
-            context_file_basename (str): Name of the file to store context paths in
-        """
-
-        # Warning: DO NOT modify the context_dir_pathname variable below
-        # vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
-        context_dir_pathname = "{% raw %}{{ CONTEXT_DIR_RELATIVE_PATH }}{% endraw %}"
-        # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-        self._context_dir_pathname = context_dir_pathname
-        self._context_file = os.path.join(context_dir_pathname, context_file_basename)
-
-        # Make context dir if it does not exist
-        if not os.path.exists(context_dir_pathname):
-            os.makedirs(context_dir_pathname)
-
-        # Read in the context sources dictionary, if it exists
-        if os.path.exists(self._context_file):
-            with open(self._context_file, "rb") as file_handle:
-                self.context_paths: dict = pickle.load(file_handle)
-        else:
-            # Items is a dictionary of {varname: path}
-            self.context_paths = {}
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        self._update_context()
-
-    def __contains__(self, item):
-        return item in self.context_paths
-
-    def _update_context(self):
-        with open(self._context_file, "wb") as file_handle:
-            pickle.dump(self.context_paths, file_handle)
-
-    def load(self, name: str):
-        """
-        Returns a contextd object
-
-        Args:
-            name (str): The name in self.context_paths of the object
-        """
-        path = self.context_paths[name]
-        with open(path, "rb") as file_handle:
-            obj = pickle.load(file_handle)
-        return obj
-
-    def save(self, obj: object, name: str):
-        """
-        Saves an object to disk using pickle
-
-        Args:
-            name (str): Friendly name for the object, used for lookup in load() method
-            obj (object): Object to store on disk
-        """
-        path = os.path.join(self._context_dir_pathname, f"{name}.pkl")
-        self.context_paths[name] = path
-        with open(path, "wb") as file_handle:
-            pickle.dump(obj, file_handle)
-        self._update_context()
+# IMPORTANT NOTE: Do *not* adjust the value of "context_dir_pathname". If the value is changed, then files will not be
+# correctly copied into the generated predict workflow. This will cause the predict workflow to be generated in a
+# broken state, and it will not be able to make any predictions.
+# vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
+context_dir_pathname = "{% raw %}{{ CONTEXT_DIR_RELATIVE_PATH }}{% endraw %}"
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+# ============================================
+# Variables tuning how the units use resources
+# ============================================
+# Variables in this section control how the units store their data, and how much memory and how many cores they use.
+# They are read by the tools in pyml_library.py when those are used.
+
+# If "is_using_unit_cache" is True, the outputs of each unit are cached in "unit_cache_dir". When a unit is re-run
+# with the same source code and the same inputs (e.g. when only a later unit in the workflow has changed), it is skipped
+# and its previous outputs are restored instead. The cache is kept under "unit_cache_max_bytes" by evicting the least
+# recently used entries.
+is_using_unit_cache = False
+unit_cache_dir = os.path.join(os.path.expanduser("~"), ".pyml_unit_cache")
+unit_cache_max_bytes = 10 * 1024 ** 3
+
+# If "is_profiling" is True, the wall time, CPU time and peak memory of each unit, and the time spent and bytes moved by
+# each save and load, are appended to "profile_path" as JSON lines. The file accumulates records across all of the
+# units of a job.
+is_profiling = False
+profile_path = "pyml_profile.jsonl"
+
+# The context directory is copied into the predict workflow, so saving smaller files makes the predict workflow quicker
+# to start. "array_compression" is used for Numpy arrays, "dataframe_compression" for pandas DataFrames, and
+# "object_compression" for everything else (e.g. trained models and scalers). Each can be "zstd", "lz4", "gzip", or
+# None to not compress. zstd and lz4 need the "zstandard" and "lz4" packages. Compressed arrays and DataFrames are read
+# into memory when they are loaded, instead of being memory-mapped.
+array_compression = None
+dataframe_compression = None
+object_compression = None
+
+# If "is_downcasting_floats" is True, float64 arrays and DataFrame columns are saved as float32, halving their size. The
+# largest relative rounding error this introduces is printed for each object, and is typically around 1e-7.
+is_downcasting_floats = False
+
+# If "is_using_sparse_descriptors" is True, the descriptors are read as SciPy CSR sparse matrices, which only store
+# their non-zero values, and are saved to the context as such (compressed as arrays are, by "array_compression"). This
+# saves memory and time when most of the descriptors are zero, as with composition or fingerprint descriptors. The
+# pre-processing units keep the descriptors sparse: the standardization doesn't center them, and the min-max scaling is
+# replaced with max-abs scaling, which (for non-negative descriptors) scales them to the same range of [0, 1].
+is_using_sparse_descriptors = False
+
+# If "training_batch_size" is set to a number of rows, units that support it are trained incrementally, reading one
+# batch of that many rows from the context at a time: scalers are fit with partial_fit(), and the linear, neural network
+# and k-means models are trained with stochastic gradient descent or minibatch solvers. This allows datasets larger than
+# memory to be trained on. If it is set to None (by default), units are trained on the whole dataset at once.
+training_batch_size = None
+
+# "n_cores" is the number of cores the units may use. If it is None (by default), every core this process is allowed to
+# run on is used, which respects the CPU affinity set by a batch scheduler. Estimators that can fit or predict in
+# parallel are given "n_cores" jobs. The threads of the BLAS and OpenMP libraries, which NumPy and many estimators use
+# internally, are limited to "blas_threads" while fitting and predicting; if it is None, they are limited to "n_cores".
+# Lower these when several units or jobs share a node, so that they don't oversubscribe its cores.
+n_cores = None
+blas_threads = None
+
+# Predictions are made over batches of "prediction_batch_size" rows at a time, and are written to file as they are
+# made. This keeps the memory used while predicting flat, regardless of the size of the dataset. The batches are spread
+# over "prediction_n_jobs" processes; set it to -1 to use every core given by get_n_cores(). The cores are shared out
+# between the processes, so that each one predicts with get_n_cores() // "prediction_n_jobs" threads.
+prediction_batch_size = 100000
+prediction_n_jobs = 1
+
+# If "is_using_compiled_trees" is True, the random forest, bagged trees, AdaBoost and gradient-boosted tree flavors also
+# save their trained model as a CompiledTrees object, which the predict workflow loads in place of the model. This holds
+# the nodes of every tree in a few flat arrays, so it loads without importing scikit-learn or rebuilding each tree. Its
+# predictions are identical to those of the model. The trees are walked by a kernel compiled with Numba, in a thread for
+# each core given by get_n_cores(), if Numba is installed; otherwise, they are all walked at once with vectorized NumPy
+# operations, which is slower than scikit-learn for deep trees.
+is_using_compiled_trees = False
+
+# The folds of a cross-validation (see the "cross_validation" data input unit) are fit over "cross_validation_n_jobs"
+# processes; set it to -1 to fit every fold at once, up to get_n_cores() processes. As when predicting, the cores are
+# shared out between the processes. The processes memory-map the descriptors from the context, rather than each being
+# sent a copy of them, but each still copies the rows of the fold it is fitting.
+cross_validation_n_jobs = -1
+
+# The models screened by the "model_zoo" flavors are fit over "model_zoo_n_jobs" processes; set it to -1 to fit every
+# model at once, up to get_n_cores() processes. As when cross-validating, the cores are shared out between the
+# processes, which memory-map the training set from the context rather than each being sent a copy of it.
+model_zoo_n_jobs = -1
+
+# Plots are saved at "plot_dpi" dots per inch. Scatter plots of more than "plot_max_points" points are drawn with a
+# sample of that many points instead (see downsample()), and ROC curves are thinned to that many points, so that plots
+# take a bounded time and memory to draw whatever the size of the dataset.
+plot_dpi = 600
+plot_max_points = 100000
+
+# The tools used by the units, which read the variables above from this module
+import pyml_library
+from pyml_library import (ArrayWriter, CompiledTrees, Context, FeatherBackend, NumpyBackend, PickleBackend, Profiler,
+                          SavePolicy, SparseBackend, UnitCache, batch_slices, columns_with_missing_values,
+                          cross_validate, cross_validation_folds, downsample, duplicate_rows, fit_models, get_n_cores,
+                          is_sparse, missing_values, partial_fit_in_batches, predict_in_batches,
+                          rows_with_missing_values, select, sparse_aware_scaler, thread_limits, transform_in_batches)
+
+pyml_library.configure(sys.modules[__name__])
 
 # Generate a context object, so that the "with settings.context" can be used by other units in this workflow.
-context = Context()
+context = Context(backends=(SavePolicy(NumpyBackend, array_compression, is_downcasting_floats),
+                            SavePolicy(FeatherBackend, dataframe_compression, is_downcasting_floats),
+                            SavePolicy(SparseBackend, array_compression, is_downcasting_floats),
+                            SavePolicy(PickleBackend, object_compression)),
+                  unit_cache=UnitCache(unit_cache_dir, unit_cache_max_bytes) if is_using_unit_cache else None,
+                  profiler=Profiler(profile_path) if is_profiling else None)
 
 is_using_train_test_split = "is_using_train_test_split" in context and (context.load("is_using_train_test_split"))
 
@@ -0,0 +1,69 @@
+# ----------------------------------------------------------------- #
+#                                                                   #
+#   In-process workflow runner                                      #
+#                                                                   #
+#   Runs a sequence of PythonML workflow units, in order, within a  #
+#   single Python interpreter. Normally, each unit is run as its    #
+#   own process, which has to import the scientific Python stack    #
+#   and load its inputs from the context directory all over again.  #
+#                                                                   #
+#   Here, settings.py and any packages are only imported once, and  #
+#   objects saved to the context are kept in memory and shared      #
+#   between units. They are written to the context directory once   #
+#   all of the units have run, or after any of the units listed in  #
+#   `checkpoint_after`.                                             #
+#                                                                   #
+#   Units can also be given on the command line, e.g.:              #
+#     python workflow_runner.py read_csv.py min_max_scaler.py ...   #
+# ----------------------------------------------------------------- #
+
+
+import runpy
+import sys
+import time
+
+import settings
+
+# `units_to_run` is the list of unit scripts to run, in order, e.g. "data_input_read_csv_pandas.py".
+# If any units are given on the command line, they are run instead.
+units_to_run = []
+
+# `checkpoint_after` is a list of units (from `units_to_run`) after which the context is written to disk. If a later
+# unit fails, the work done up to the checkpoint will have been saved.
+checkpoint_after = []
+
+
+def run_unit(unit: str):
+    """
+    Runs a unit script as if it were the main program
+
+    Args:
+        unit (str): Path to the unit script
+    """
+    try:
+        runpy.run_path(unit, run_name="__main__")
+    except SystemExit as exit_status:
+        # Some units exit early when they have nothing to do
+        if exit_status.code not in (None, 0):
+            raise
+
+    # settings.py is only run once, so update the flags it derives from the context, as a unit may have changed them
+    settings.is_using_train_test_split = "is_using_train_test_split" in settings.context and (
+        settings.context.load("is_using_train_test_split"))
+
+    # Don't let one unit's plots be drawn on top of the next unit's
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is not None:
+        pyplot.close("all")
+
+
+if __name__ == "__main__":
+    units = sys.argv[1:] or units_to_run
+    with settings.context.deferred_writes() as context:
+        for unit in units:
+            print(f"Running {unit}")
+            start_time = time.perf_counter()
+            run_unit(unit)
+            print(f"Finished {unit} in {time.perf_counter() - start_time:.2f} s")
+            if unit in checkpoint_after:
+                context.flush()
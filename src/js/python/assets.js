@@ -31,6 +31,20 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(applicationName, "espresso_sync_phonon_files.pyi"),
+            name: "espresso_collect_dynmat.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
+        {
+            content: readAssetFile(applicationName, "espresso_sync_phonon_files.pyi"),
+            name: "espresso_link_outdir_save.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "requirements.j2.txt"),
             name: "pyml_requirements.txt",
@@ -45,6 +59,13 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile("python/ml", "pyml:library.pyi"),
+            name: "pyml_library.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:custom.pyi"),
             name: "pyml_custom.py",
@@ -52,6 +73,20 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile("python/ml", "pyml:workflow_runner.pyi"),
+            name: "pyml_workflow_runner.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
+        {
+            content: readAssetFile("python/ml", "pyml:preloader.pyi"),
+            name: "pyml_preloader.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:data_input:read_csv:pandas.pyi"),
             name: "data_input_read_csv_pandas.py",
@@ -59,6 +94,13 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile("python/ml", "pyml:data_input:read_feather:pyarrow.pyi"),
+            name: "data_input_read_feather_pyarrow.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:data_input:train_test_split:sklearn.pyi"),
             name: "data_input_train_test_split_sklearn.py",
@@ -66,6 +108,13 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile("python/ml", "pyml:data_input:cross_validation:sklearn.pyi"),
+            name: "data_input_cross_validation_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:pre_processing:min_max_scaler:sklearn.pyi"),
             name: "pre_processing_min_max_sklearn.py",
@@ -94,6 +143,13 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile("python/ml", "pyml:pre_processing:clean_and_scale:numpy.pyi"),
+            name: "pre_processing_clean_and_scale_numpy.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile(
                 "python/ml",
@@ -104,6 +160,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:adaboosted_trees_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_adaboosted_trees_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:model:bagged_trees_regression:sklearn.pyi"),
             name: "model_bagged_trees_regression_sklearn.py",
@@ -111,6 +177,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:bagged_trees_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_bagged_trees_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile(
                 "python/ml",
@@ -121,6 +197,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:gradboosted_trees_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_gradboosted_trees_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile(
                 "python/ml",
@@ -145,6 +231,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:kernel_ridge_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_kernel_ridge_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:model:lasso_regression:sklearn.pyi"),
             name: "model_lasso_regression_sklearn.py",
@@ -152,6 +248,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:lasso_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_lasso_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile(
                 "python/ml",
@@ -162,6 +268,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:multilayer_perceptron_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_mlp_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile(
                 "python/ml",
@@ -172,6 +288,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:random_forest_classification_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_random_forest_classification_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile(
                 "python/ml",
@@ -199,6 +325,16 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:random_forest_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_random_forest_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:model:ridge_regression:sklearn.pyi"),
             name: "model_ridge_regression_sklearn.py",
@@ -206,6 +342,23 @@ export default () => {
             applicationName,
             executableName,
         },
+        {
+            content: readAssetFile(
+                "python/ml",
+                "pyml:model:ridge_regression_hyperparameter_search:sklearn.pyi",
+            ),
+            name: "model_ridge_regression_hyperparameter_search_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
+        {
+            content: readAssetFile("python/ml", "pyml:model:model_zoo_regression:sklearn.pyi"),
+            name: "model_model_zoo_regression_sklearn.py",
+            contextProviders: [],
+            applicationName,
+            executableName,
+        },
         {
             content: readAssetFile("python/ml", "pyml:post_processing:parity_plot:matplotlib.pyi"),
             name: "post_processing_parity_plot_matplotlib.py",
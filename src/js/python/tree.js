@@ -27,12 +27,32 @@ export default {
                 ],
                 monitors: [monitors.standard_output],
             },
+            espresso_collect_dynmat: {
+                input: [
+                    {
+                        name: "espresso_collect_dynmat.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
+            espresso_link_outdir_save: {
+                input: [
+                    {
+                        name: "espresso_link_outdir_save.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
             "pyml:setup_variables_packages": {
                 input: [
                     {
                         name: "settings.py",
                         templateName: "pyml_settings.py",
                     },
+                    {
+                        name: "pyml_library.py",
+                        templateName: "pyml_library.py",
+                    },
                     {
                         name: "requirements.txt",
                         templateName: "pyml_requirements.txt",
@@ -49,6 +69,24 @@ export default {
                 ],
                 monitors: [monitors.standard_output],
             },
+            "pyml:workflow_runner": {
+                input: [
+                    {
+                        name: "pyml_workflow_runner.py",
+                        templateName: "pyml_workflow_runner.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
+            "pyml:preloader": {
+                input: [
+                    {
+                        name: "pyml_preloader.py",
+                        templateName: "pyml_preloader.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
             "pyml:data_input:read_csv:pandas": {
                 input: [
                     {
@@ -58,6 +96,15 @@ export default {
                 ],
                 monitors: [monitors.standard_output],
             },
+            "pyml:data_input:read_feather:pyarrow": {
+                input: [
+                    {
+                        name: "data_input_read_feather_pyarrow.py",
+                        templateName: "data_input_read_feather_pyarrow.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
             "pyml:data_input:train_test_split:sklearn": {
                 input: [
                     {
@@ -67,6 +114,15 @@ export default {
                 ],
                 monitors: [monitors.standard_output],
             },
+            "pyml:data_input:cross_validation:sklearn": {
+                input: [
+                    {
+                        name: "data_input_cross_validation_sklearn.py",
+                        templateName: "data_input_cross_validation_sklearn.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
             "pyml:pre_processing:min_max_scaler:sklearn": {
                 input: [
                     {
@@ -103,6 +159,15 @@ export default {
                 ],
                 monitors: [monitors.standard_output],
             },
+            "pyml:pre_processing:clean_and_scale:numpy": {
+                input: [
+                    {
+                        name: "pre_processing_clean_and_scale_numpy.py",
+                        templateName: "pre_processing_clean_and_scale_numpy.py",
+                    },
+                ],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:adaboosted_trees_regression:sklearn": {
                 input: [
                     {
@@ -113,6 +178,16 @@ export default {
                 monitors: [monitors.standard_output],
                 results: ["workflow:pyml_predict"],
             },
+            "pyml:model:adaboosted_trees_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_adaboosted_trees_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_adaboosted_trees_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:bagged_trees_regression:sklearn": {
                 input: [
                     {
@@ -123,6 +198,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:bagged_trees_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_bagged_trees_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_bagged_trees_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:gradboosted_trees_regression:sklearn": {
                 input: [
                     {
@@ -133,6 +218,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:gradboosted_trees_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_gradboosted_trees_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_gradboosted_trees_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:extreme_gradboosted_trees_regression:sklearn": {
                 input: [
                     {
@@ -163,6 +258,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:kernel_ridge_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_kernel_ridge_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_kernel_ridge_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:lasso_regression:sklearn": {
                 input: [
                     {
@@ -173,6 +278,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:lasso_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_lasso_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_lasso_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:multilayer_perceptron:sklearn": {
                 input: [
                     {
@@ -183,6 +298,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:multilayer_perceptron_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_mlp_hyperparameter_search_sklearn.py",
+                        templateName: "model_mlp_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:random_forest_classification:sklearn": {
                 input: [
                     {
@@ -193,6 +318,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:random_forest_classification_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_random_forest_classification_hyperparameter_search_sklearn.py",
+                        templateName: "model_random_forest_classification_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:gradboosted_trees_classification:sklearn": {
                 input: [
                     {
@@ -223,6 +358,16 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:random_forest_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_random_forest_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_random_forest_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:model:ridge_regression:sklearn": {
                 input: [
                     {
@@ -233,6 +378,26 @@ export default {
                 results: ["workflow:pyml_predict"],
                 monitors: [monitors.standard_output],
             },
+            "pyml:model:ridge_regression_hyperparameter_search:sklearn": {
+                input: [
+                    {
+                        name: "model_ridge_regression_hyperparameter_search_sklearn.py",
+                        templateName: "model_ridge_regression_hyperparameter_search_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
+            "pyml:model:model_zoo_regression:sklearn": {
+                input: [
+                    {
+                        name: "model_model_zoo_regression_sklearn.py",
+                        templateName: "model_model_zoo_regression_sklearn.py",
+                    },
+                ],
+                results: ["workflow:pyml_predict"],
+                monitors: [monitors.standard_output],
+            },
             "pyml:post_processing:parity_plot:matplotlib": {
                 input: [
                     {
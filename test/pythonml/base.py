@@ -1,13 +1,16 @@
 import os
 import sys
+import time
 import yaml
 import importlib
+import importlib.util
 import subprocess as sp
 from shutil import rmtree, copy
 from tempfile import mkdtemp
 from unittest import TestCase
 from functools import lru_cache
 
+import jinja2
 from parameterized import parameterized
 
 
@@ -21,13 +24,74 @@ def load_manifest():
         return yaml.safe_load(f)
 
 
+@lru_cache(maxsize=None)
+def render_settings(category: str) -> str:
+    """
+    Renders the settings asset into a settings.py for a training workflow, in the same two passes as the platform: the
+    workflow's ML settings first, then the variables of the job (left in raw blocks by the first pass).
+    """
+    dirname = os.path.abspath(os.path.dirname(__file__))
+    path = os.path.join(dirname, BaseTest.asset_dir, "pyml:setup_variables_packages.pyi")
+    with open(path, "r") as f:
+        template = f.read()
+    settings = jinja2.Template(template).render(
+        mlSettings={"target_column_name": "target", "problem_category": category}
+    )
+    return jinja2.Template(settings, keep_trailing_newline=True).render(
+        IS_WORKFLOW_RUNNING_TO_PREDICT=False,
+        DATASET_BASENAME=BaseTest.training_set_basename,
+        CONTEXT_DIR_RELATIVE_PATH=".job_context",
+    )
+
+
+@lru_cache(maxsize=None)
+def render_library() -> str:
+    """
+    Renders the library imported by settings.py. It has no variables of its own, but is rendered like every asset.
+    """
+    dirname = os.path.abspath(os.path.dirname(__file__))
+    with open(os.path.join(dirname, BaseTest.asset_dir, "pyml:library.pyi"), "r") as f:
+        return jinja2.Template(f.read(), keep_trailing_newline=True).render()
+
+
+def load_settings(path: str):
+    """
+    Loads a settings.py as a module, along with the pyml_library.py next to it, without adding their directory to
+    sys.path, or leaving them in sys.modules
+    """
+    modules = {}
+    for name in ("pyml_library", "settings"):
+        spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(path), f"{name}.py"))
+        modules[name] = (spec, importlib.util.module_from_spec(spec))
+    # The modules are only registered while they run, as settings.py imports the library, and pickles objects of its
+    # own classes (e.g. a DummyScaler)
+    previous = {name: sys.modules.get(name) for name in modules}
+    sys.modules.update((name, module) for name, (_, module) in modules.items())
+    try:
+        for spec, module in modules.values():
+            spec.loader.exec_module(module)
+    finally:
+        for name, module in previous.items():
+            if module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+    return modules["settings"][1]
+
+
 class BaseTest(TestCase):
     subdir = "fixtures"
     asset_dir = "../../assets/python/ml"
     settings_basename = "settings.py"
+    library_basename = "pyml_library.py"
+    training_set_basename = "data_to_train_with.csv"
+    predict_set_basename = "data_to_predict_with.csv"
     category = "regression"
     data_type = "scaled_data"
     needs_data = False
+    # Whether the test's settings.py is imported as the "settings" module, as the flavors import it. Otherwise, it is
+    # loaded from its path, leaving sys.path and sys.modules alone, so that tests don't affect each other's imports.
+    is_importing_settings = True
 
     @staticmethod
     def get_func_name(testcase_func, param_num, params):
@@ -52,24 +116,30 @@ class BaseTest(TestCase):
                 "flavors": [
                     flavor_map[unit] for unit in test["units_to_run"]
                 ],
-                **test
+                **test,
+                "flavor_settings": {
+                    flavor_map[unit]: overrides for unit, overrides in test.get("flavor_settings", {}).items()
+                },
             },) for name, test in manifest["tests"].items()
             if test["category"] == category
         ]
         return flavors
 
-    @staticmethod
-    def reload_settings():
+    def reload_settings(self):
+        if not self.is_importing_settings:
+            return load_settings(self.tmppath(self.settings_basename))
         import settings
         importlib.reload(settings)
         return settings
 
-    @staticmethod
-    def run_process(flavor: str):
+    def run_process(self, flavor: str, *args: str):
+        start = time.perf_counter()
         proc = sp.Popen(
-            (sys.executable, flavor), stdout=sp.PIPE, stderr=sp.PIPE
+            (sys.executable, flavor, *args), stdout=sp.PIPE, stderr=sp.PIPE
         )
         out, err = proc.communicate()
+        # The wall time of each process is kept, so that slow flavors can be reported
+        self.process_timings.append((" ".join((flavor, *args)), time.perf_counter() - start))
         if proc.returncode:
             raise Exception(f"out={out}, err={err}")
 
@@ -85,9 +155,12 @@ class BaseTest(TestCase):
         return os.path.join(dirname, self.asset_dir, basename)
 
     def copy_asset(self, flavor: str):
-        # This file is a Jinja template so copy a pre-rendered mock instead
+        # This file is a Jinja template, so it's rendered with the context the platform would give it
         if flavor == "pyml:data_input:train_test_split:sklearn.pyi":
-            copy(self.relpath("train_test_split.py"), self.tmppath(flavor))
+            with open(self.assetpath(flavor), "r") as template, open(self.tmppath(flavor), "w") as asset:
+                asset.write(jinja2.Template(template.read(), keep_trailing_newline=True).render(
+                    mlTrainTestSplit={"fraction_held_as_test_set": 0.2}
+                ))
         else:
             copy(self.assetpath(flavor), self.tmppath(flavor))
 
@@ -101,29 +174,31 @@ class BaseTest(TestCase):
         else:
             training_file = f"{self.category}_training_data.csv"
             predict_file = f"{self.category}_predict_data.csv"
-        copy(self.relpath(training_file), self.tmppath("data_to_train_with.csv"))
-        copy(self.relpath(predict_file), self.tmppath("data_to_predict_with.csv"))
+        copy(self.relpath(training_file), self.tmppath(self.training_set_basename))
+        copy(self.relpath(predict_file), self.tmppath(self.predict_set_basename))
 
     def setUp(self):
         self.orig_dir = os.getcwd()
         self.tmpdir = mkdtemp()
+        self.process_timings = []
         os.chdir(self.tmpdir)
-        sys.path.insert(0, self.tmpdir)
-        with open(self.relpath(self.settings_basename), 'r') as template, \
-                open(self.tmppath(self.settings_basename), 'w') as settings:
-            settings.write(
-                template.read()
-                    .replace("PROBLEM_CATEGORY_HERE", self.category)
-                    .replace("BASE_DIR = None", f'BASE_DIR = "{self.tmpdir}"')
-            )
+        if self.is_importing_settings:
+            sys.path.insert(0, self.tmpdir)
+        # settings.py is rendered from its asset, so that the tests always run against the current settings
+        with open(self.tmppath(self.settings_basename), 'w') as settings:
+            settings.write(render_settings(self.category))
+        with open(self.tmppath(self.library_basename), 'w') as library:
+            library.write(render_library())
         settings = self.reload_settings()
         self.context = settings.Context()
         if self.needs_data:
             self.copy_data()
 
     def tearDown(self):
-        del sys.modules["settings"]
-        sys.path.remove(self.tmpdir)
+        if self.is_importing_settings:
+            del sys.modules["settings"]
+            sys.modules.pop("pyml_library", None)
+            sys.path.remove(self.tmpdir)
         rmtree(self.tmpdir)
         os.chdir(self.orig_dir)
 
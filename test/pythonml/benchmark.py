@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+Benchmarks the workflows defined in integration_configuration.yaml on synthetic datasets of increasing size.
+
+Each workflow listed under "benchmarks" in integration_configuration.yaml is trained, then used to predict, on generated
+regression, classification or clustering data of each size. The units are run with the profiler in settings.py turned
+on, which records each unit's wall time and peak memory, and the bytes it saves to the context. The results are
+compared with a stored baseline, and any metric that has grown past its tolerance is reported as a regression.
+
+This isn't run as part of the unit tests, as the larger datasets take a long time to generate and to run.
+
+Usage:
+    python benchmark.py                         # Runs every benchmark, and compares it with the baseline
+    python benchmark.py --rows 1000 10000       # Only runs the benchmarks with these numbers of rows
+    python benchmark.py --tests Reg_ReadCSV...  # Only runs these workflows
+    python benchmark.py --update-baseline       # Stores the results as the new baseline
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from base import load_manifest
+from flavor import BaseFlavorTest
+
+# How much each metric may grow over the baseline before it's reported as a regression: a fraction of the baseline,
+# plus an absolute allowance for the noise in small measurements
+TOLERANCES = {
+    "wall_time": (0.25, 0.5),
+    "peak_rss_bytes": (0.10, 32 * 1024 ** 2),
+    "context_bytes": (0.01, 4096),
+}
+
+
+def write_dataset(path: str, category: str, n_rows: int, n_descriptors: int, has_target: bool, seed: int,
+                  chunk_size: int = 100000):
+    """
+    Writes a synthetic dataset to a CSV file, a chunk of rows at a time so that large datasets never have to be held in
+    memory. The descriptors are named "x1", "x2", etc. and the target is named "target".
+
+    Regression targets are a noisy linear function of the descriptors. Classification targets are the two classes on
+    either side of a noisy hyperplane. Clustering data is drawn from four Gaussian blobs, and has no target.
+    """
+    random = np.random.default_rng(seed)
+    # The weights and the cluster centers are the same for every dataset, so that the predict set matches the training set
+    weights = np.random.default_rng(0).normal(size=n_descriptors)
+    centers = np.random.default_rng(1).uniform(-10, 10, size=(4, n_descriptors))
+    columns = [f"x{column + 1}" for column in range(n_descriptors)]
+    if has_target and category != "clustering":
+        columns.append("target")
+
+    with open(path, "w") as file_handle:
+        file_handle.write(",".join(columns) + "\n")
+        for start in range(0, n_rows, chunk_size):
+            n_chunk_rows = min(chunk_size, n_rows - start)
+            if category == "clustering":
+                descriptors = centers[random.integers(len(centers), size=n_chunk_rows)]
+                descriptors += random.normal(size=descriptors.shape)
+            else:
+                descriptors = random.normal(size=(n_chunk_rows, n_descriptors))
+            chunk = descriptors
+            if len(columns) > n_descriptors:
+                target = descriptors @ weights + random.normal(scale=0.5, size=n_chunk_rows)
+                if category == "classification":
+                    target = (target > 0).astype(int)
+                chunk = np.column_stack((descriptors, target))
+            np.savetxt(file_handle, chunk, delimiter=",", fmt="%.8g")
+
+
+class FlavorBenchmark(BaseFlavorTest):
+    """
+    Runs a workflow from integration_configuration.yaml on a synthetic dataset, and measures each of its units. Used
+    outside of a test runner: setUp() and tearDown() are called by benchmark().
+    """
+
+    def __init__(self, category: str, training_set: str, predict_set: str):
+        super().__init__()
+        self.category = category
+        self.training_set = training_set
+        self.predict_set = predict_set
+
+    def copy_data(self):
+        for source, basename in ((self.training_set, self.training_set_basename),
+                                 (self.predict_set, self.predict_set_basename)):
+            # The datasets can be several gigabytes, so they're linked rather than copied where possible
+            try:
+                os.link(source, self.tmppath(basename))
+            except OSError:
+                shutil.copyfile(source, self.tmppath(basename))
+
+    def read_profile(self) -> dict:
+        """
+        Returns the metrics of each unit recorded in the profile so far, and clears the profile
+
+        Returns:
+            dict: Of the format {unit: {"wall_time": ..., "peak_rss_bytes": ..., "context_bytes": ...}}
+        """
+        settings = self.reload_settings()
+        profile_path = self.tmppath(settings.profile_path)
+        metrics = {}
+        with open(profile_path, "r") as profile:
+            for line in profile:
+                event = json.loads(line)
+                unit = event["args"]["unit"]
+                # Settings.py loads a few objects as it's imported, before any unit has started
+                if unit is None:
+                    continue
+                unit_metrics = metrics.setdefault(unit, {"wall_time": 0.0, "peak_rss_bytes": 0, "context_bytes": 0})
+                if event["cat"] == "unit":
+                    unit_metrics["wall_time"] += event["dur"] / 1e6
+                    unit_metrics["peak_rss_bytes"] = max(unit_metrics["peak_rss_bytes"],
+                                                         event["args"]["peak_rss_bytes"] or 0)
+                elif event["cat"] == "save":
+                    unit_metrics["context_bytes"] += event["args"]["bytes"] or 0
+        os.remove(profile_path)
+        return metrics
+
+    def benchmark(self, test_params: dict, settings: dict = None) -> dict:
+        """
+        Trains a workflow, then predicts with it
+
+        Args:
+            test_params (dict): The workflow's test from integration_configuration.yaml
+            settings (dict): Variables to override in settings.py, on top of the test's own
+
+        Returns:
+            dict: The metrics of each unit, of the format {"train": {unit: metrics}, "predict": {unit: metrics}}
+        """
+        self.setUp()
+        try:
+            self.apply_settings(dict(test_params.get("settings", {}), **(settings or {}), is_profiling=True))
+            unit_shortnames = load_manifest()["unit_shortnames"]
+            flavors = [unit_shortnames[unit] for unit in test_params["units_to_run"]]
+            flavor_settings = {unit_shortnames[unit]: overrides
+                               for unit, overrides in test_params.get("flavor_settings", {}).items()}
+            for flavor in flavors:
+                self.copy_workflow_asset(flavor, {"flavor_settings": flavor_settings})
+                self.run_process(flavor)
+            results = {"train": self.read_profile()}
+            self.set_to_predict_phase()
+            for flavor in flavors:
+                self.run_process(flavor)
+            results["predict"] = self.read_profile()
+            return results
+        finally:
+            self.tearDown()
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """
+    Returns a description of each metric that has regressed since the baseline
+    """
+    regressions = []
+    for key, metrics in sorted(results.items()):
+        for metric, value in metrics.items():
+            if key not in baseline or metric not in baseline[key]:
+                continue
+            baseline_value = baseline[key][metric]
+            relative_tolerance, absolute_tolerance = TOLERANCES[metric]
+            if value > baseline_value * (1 + relative_tolerance) + absolute_tolerance:
+                regressions.append(f"{key} {metric}: {value:.6g} (baseline {baseline_value:.6g})")
+    return regressions
+
+
+def main():
+    benchmarks = load_manifest()["benchmarks"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=lambda rows: int(float(rows)), nargs="+", default=benchmarks["n_rows"],
+                        help="Numbers of rows to benchmark with")
+    parser.add_argument("--tests", nargs="+", default=list(benchmarks["tests"]), help="Workflows to benchmark")
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "benchmark_baseline.json"),
+                        help="File the baseline is stored in")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "pyml_benchmark_data"),
+                        help="Directory the generated datasets are kept in, so they can be reused between runs")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    tests = load_manifest()["tests"]
+    results = {}
+    for name in args.tests:
+        test_params = tests[name]
+        benchmark = benchmarks["tests"][name]
+        category = test_params["category"]
+        for n_rows in args.rows:
+            if n_rows > benchmark["max_rows"]:
+                continue
+            datasets = []
+            for kind, has_target, seed in (("training", True, 2), ("predict", False, 3)):
+                path = os.path.join(args.data_dir, f"{category}_{kind}_{n_rows}x{benchmarks['n_descriptors']}.csv")
+                if not os.path.exists(path):
+                    print(f"Generating {path}")
+                    write_dataset(path + ".tmp", category, n_rows, benchmarks["n_descriptors"], has_target, seed)
+                    os.replace(path + ".tmp", path)
+                datasets.append(path)
+
+            print(f"Benchmarking {name} with {n_rows} rows")
+            phases = FlavorBenchmark(category, *datasets).benchmark(test_params, benchmark.get("settings"))
+            for phase, units in phases.items():
+                for unit, metrics in units.items():
+                    key = f"{name}/{n_rows}/{phase}/{unit}"
+                    results[key] = metrics
+                    print(f"  {phase:8} {unit:60} {metrics['wall_time']:9.2f} s "
+                          f"{metrics['peak_rss_bytes'] / 1024 ** 2:9.1f} MB peak "
+                          f"{metrics['context_bytes'] / 1024 ** 2:9.1f} MB saved")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as file_handle:
+            baseline = json.load(file_handle)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as file_handle:
+            json.dump(baseline, file_handle, indent=2, sort_keys=True)
+        print(f"Stored the results in {args.baseline}")
+        return
+
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not baseline:
+        print(f"There is no baseline in {args.baseline} to compare with. Run with --update-baseline to store one.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +0,0 @@
-version https://git-lfs.github.com/spec/v1
-oid sha256:f6a4db78e2f8e423955256658319a5ec4781fa096062d9399641f98a282d09ec
-size 7943
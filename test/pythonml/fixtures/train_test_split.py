@@ -1,3 +0,0 @@
-version https://git-lfs.github.com/spec/v1
-oid sha256:27ae9595f22a3c2978712e22edfac66d2a09b31d403ec7e72daa8758a1ee2b4a
-size 2119
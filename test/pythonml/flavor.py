@@ -1,5 +1,8 @@
+import glob
 import os
 import operator
+import pickle
+import re
 
 import numpy as np
 import pandas as pd
@@ -7,13 +10,42 @@ import pandas as pd
 from base import BaseTest
 
 
+def build_fixture_contexts(directory: str):
+    """
+    Converts the array fixtures in "<category>_pkls" to .npy files in a directory, once for every test. Tests then
+    memory-map the arrays, rather than unpickling them. The files are made read-only, as they are shared by tests that
+    run at the same time (see run_tests.py). Fixtures that aren't arrays are still loaded from their pickles.
+
+    Args:
+        directory (str): Directory to write the arrays to, with the same layout as the fixtures directory
+    """
+    fixtures_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), BaseTest.subdir)
+    for pickle_path in glob.glob(os.path.join(fixtures_dir, "*_pkls", "*", "*.pkl")):
+        try:
+            with open(pickle_path, "rb") as file_handle:
+                obj = pickle.load(file_handle)
+        except (ImportError, AttributeError, pickle.UnpicklingError):
+            # e.g. objects of classes defined in settings.py, or fixtures not checked out from git-lfs
+            continue
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject:
+            continue
+        path = os.path.join(directory, os.path.relpath(pickle_path, fixtures_dir))[:-len(".pkl")] + ".npy"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, obj)
+        os.chmod(path, 0o444)
+
+
 class BaseFlavorTest(BaseTest):
     """
     This class performs unit tests for the model flavors
     """
     needs_data = True
+    is_importing_settings = False
+    # Directory of the fixtures prebuilt by build_fixture_contexts(), or None to load every fixture from its pickle
+    fixture_context_dir = None
 
     def set_to_predict_phase(self):
+        # The predict workflow is given its own dataset, as the platform does when it generates the predict workflow
         with open(self.tmppath(self.settings_basename), "r") as settings:
             contents = settings.read()
         with open(self.tmppath(self.settings_basename), "w") as settings:
@@ -21,9 +53,31 @@ class BaseFlavorTest(BaseTest):
                 contents.replace(
                     "is_workflow_running_to_predict = False",
                     "is_workflow_running_to_predict = True",
+                ).replace(
+                    f'datafile = "{self.training_set_basename}"',
+                    f'datafile = "{self.predict_set_basename}"',
                 )
             )
 
+    def apply_settings(self, overrides: dict, basename: str = None):
+        """
+        Overrides variables in the test's settings.py, e.g. {"training_batch_size": 64}, or in one of its flavors
+        """
+        path = self.tmppath(basename or self.settings_basename)
+        with open(path, "r") as settings:
+            contents = settings.read()
+        for name, value in overrides.items():
+            contents = re.sub(rf"^{name} = .*$", f"{name} = {value!r}", contents, flags=re.MULTILINE)
+        with open(path, "w") as settings:
+            settings.write(contents)
+
+    def copy_workflow_asset(self, flavor: str, test_params: dict):
+        """
+        Copies a flavor of a workflow, with the variables overridden for it in the workflow's "flavor_settings"
+        """
+        self.copy_asset(flavor)
+        self.apply_settings(test_params.get("flavor_settings", {}).get(flavor, {}), flavor)
+
     def assert_preprocessing_success(self, operation: str, data: np.ndarray):
         if operation not in [
             "min_max_scaler",
@@ -128,15 +182,22 @@ class BaseFlavorTest(BaseTest):
             pickle_files = self.get_pickle_file_names(data_type)
             context.context_paths.update(
                 {
-                    pickle_file: self.relpath(
-                        "{}_pkls/{}/{}.pkl".format(
-                            self.category, data_type, pickle_file
-                        )
-                    )
+                    pickle_file: self.fixture_path(data_type, pickle_file)
                     for pickle_file in pickle_files
                 }
             )
 
+    def fixture_path(self, data_type: str, name: str) -> str:
+        """
+        Returns the path of a fixture, preferring its prebuilt array (see build_fixture_contexts) to its pickle
+        """
+        basename = "{}_pkls/{}/{}".format(self.category, data_type, name)
+        if self.fixture_context_dir is not None:
+            path = os.path.join(self.fixture_context_dir, basename + ".npy")
+            if os.path.exists(path):
+                return path
+        return self.relpath(basename + ".pkl")
+
     def parameterized_setup(self, flavor: str):
         if flavor.startswith("pyml:pre_processing:"):
             data_type = "unscaled_data"
@@ -212,8 +273,9 @@ class BaseFlavorTest(BaseTest):
             self.do_flavor(flavor, mode, kws or {})
 
     def run_workflow(self, test_params):
+        self.apply_settings(test_params.get("settings", {}))
         for flavor in test_params["flavors"]:
-            self.copy_asset(flavor)
+            self.copy_workflow_asset(flavor, test_params)
             self.run_process(flavor)
         if self.plot_unit in test_params["units_to_run"]:
             self.assert_postprocessing_success([self.plot_name])
@@ -222,3 +284,37 @@ class BaseFlavorTest(BaseTest):
         for flavor in test_params["flavors"]:
             self.run_process(flavor)
         self.assert_predicting_success()
+
+    def run_workflow_in_process(self, test_params):
+        self.apply_settings(test_params.get("settings", {}))
+        runner = "pyml:workflow_runner.pyi"
+        self.copy_asset(runner)
+        for flavor in test_params["flavors"]:
+            self.copy_workflow_asset(flavor, test_params)
+        self.run_process(runner, *test_params["flavors"])
+        if self.plot_unit in test_params["units_to_run"]:
+            self.assert_postprocessing_success([self.plot_name])
+        self.assert_training_success()
+        self.set_to_predict_phase()
+        self.run_process(runner, *test_params["flavors"])
+        self.assert_predicting_success()
+
+    def run_workflow_with_preloader(self, test_params):
+        self.apply_settings(test_params.get("settings", {}))
+        preloader = "pyml:preloader.pyi"
+        self.copy_asset(preloader)
+        for flavor in test_params["flavors"]:
+            self.copy_workflow_asset(flavor, test_params)
+        self.run_process(preloader, "--start")
+        try:
+            for flavor in test_params["flavors"]:
+                self.run_process(preloader, flavor)
+            if self.plot_unit in test_params["units_to_run"]:
+                self.assert_postprocessing_success([self.plot_name])
+            self.assert_training_success()
+            self.set_to_predict_phase()
+            for flavor in test_params["flavors"]:
+                self.run_process(preloader, flavor)
+            self.assert_predicting_success()
+        finally:
+            self.run_process(preloader, "--stop")
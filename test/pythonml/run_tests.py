@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Runs the PythonML tests in parallel worker processes, and reports the time taken by each test and by each flavor.
+
+Each test still runs in its own temporary directory, and the flavor tests load their settings.py without touching
+sys.path or sys.modules (see BaseTest.is_importing_settings), so tests running in the same worker don't affect each
+other. The array fixtures are converted to read-only .npy files once (see build_fixture_contexts in flavor.py), and
+shared by every worker. The tests can also be split into shards, e.g. to run them across several CI machines.
+
+Usage:
+    python run_tests.py                    # Runs every test, with a worker per core
+    python run_tests.py --jobs 4           # Runs every test, with 4 workers
+    python run_tests.py -k Ridge           # Only runs the tests whose names contain "Ridge"
+    python run_tests.py --shard 2/4        # Runs the second of 4 shards of the tests
+    python run_tests.py --report times.json  # Also writes the timings of every test and flavor to a file
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+import unittest
+from shutil import rmtree
+
+from flavor import BaseFlavorTest, build_fixture_contexts
+
+TEST_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# Environment variables that limit the threads used by BLAS and OpenMP, in each worker and the flavors it runs
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def iterate_tests(suite):
+    """
+    Yields each test case in a (possibly nested) test suite
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iterate_tests(test)
+        else:
+            yield test
+
+
+def list_tests(pattern: str = "test_*.py") -> list:
+    """
+    Returns the ids of the tests in this directory, sorted so that every shard is chosen from the same order
+    """
+    suite = unittest.defaultTestLoader.discover(TEST_DIR, pattern=pattern, top_level_dir=TEST_DIR)
+    return sorted(test.id() for test in iterate_tests(suite))
+
+
+def select_shard(test_ids: list, shard: str) -> list:
+    """
+    Returns one shard of the tests, given as "<index>/<count>" with indices starting at 1. Tests are dealt out to the
+    shards in turn, so that the tests of each flavor are spread across them.
+    """
+    index, count = (int(value) for value in shard.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {shard} should be between 1/{count} and {count}/{count}")
+    return test_ids[index - 1::count]
+
+
+def _initialize_worker(fixture_context_dir: str, n_threads: int):
+    BaseFlavorTest.fixture_context_dir = fixture_context_dir
+    for variable in THREAD_VARIABLES:
+        os.environ.setdefault(variable, str(n_threads))
+
+
+def run_test(test_id: str) -> dict:
+    """
+    Runs a single test
+
+    Returns:
+        dict: Of the format {"id": ..., "status": "ok", "fail", "error" or "skip", "duration": seconds,
+              "processes": [[process, seconds], ...], "details": the traceback of a failure or error}
+    """
+    start = time.perf_counter()
+    result = unittest.TestResult()
+    try:
+        suite = unittest.defaultTestLoader.loadTestsFromName(test_id)
+        # The suite lets go of its tests as it runs them, so they're kept here for their timings
+        cases = list(iterate_tests(suite))
+        suite.run(result)
+    except Exception:
+        result.errors.append((None, traceback.format_exc()))
+        cases = []
+    status, details = "ok", ""
+    for outcomes, outcome_status in ((result.skipped, "skip"), (result.failures, "fail"), (result.errors, "error")):
+        if outcomes:
+            status, details = outcome_status, outcomes[0][1]
+    return {
+        "id": test_id,
+        "status": status,
+        "duration": time.perf_counter() - start,
+        "processes": [list(timing) for case in cases for timing in getattr(case, "process_timings", [])],
+        "details": details,
+    }
+
+
+def summarize_processes(results: list) -> list:
+    """
+    Returns the total, count and longest time of each process (i.e. each flavor) run by the tests, slowest first
+    """
+    times = collections.defaultdict(list)
+    for result in results:
+        for process, seconds in result["processes"]:
+            times[process].append(seconds)
+    summary = [{"process": process, "total": sum(seconds), "count": len(seconds), "max": max(seconds)}
+               for process, seconds in times.items()]
+    return sorted(summary, key=lambda entry: entry["total"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("-k", dest="keyword", help="Only run the tests whose ids contain this string")
+    parser.add_argument("--shard", help="Only run one shard of the tests, given as <index>/<count>")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of the slowest tests and flavors to report")
+    parser.add_argument("--report", help="File to write the timings of every test and flavor to, as JSON")
+    args = parser.parse_args()
+
+    test_ids = list_tests()
+    if args.keyword:
+        test_ids = [test_id for test_id in test_ids if args.keyword in test_id]
+    if args.shard:
+        test_ids = select_shard(test_ids, args.shard)
+    n_jobs = max(1, min(args.jobs, len(test_ids)))
+    # The cores are shared between the workers, rather than each flavor using all of them
+    n_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+    print(f"Running {len(test_ids)} tests with {n_jobs} workers")
+
+    start = time.perf_counter()
+    fixture_context_dir = tempfile.mkdtemp(prefix="pyml_fixtures_")
+    results = []
+    try:
+        build_fixture_contexts(fixture_context_dir)
+        with multiprocessing.Pool(n_jobs, _initialize_worker, (fixture_context_dir, n_threads)) as pool:
+            for result in pool.imap_unordered(run_test, test_ids):
+                results.append(result)
+                print(f"{result['status']:<6} {result['duration']:>8.2f}s  {result['id']}", flush=True)
+    finally:
+        # The fixtures were made read-only, which doesn't stop their directory from being removed
+        rmtree(fixture_context_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    unsuccessful = [result for result in results if result["status"] in ("fail", "error")]
+    for result in sorted(unsuccessful, key=lambda result: result["id"]):
+        print(f"\n{'=' * 70}\n{result['status'].upper()}: {result['id']}\n{'-' * 70}\n{result['details']}")
+
+    processes = summarize_processes(results)
+    print("\nSlowest tests:")
+    for result in sorted(results, key=lambda result: result["duration"], reverse=True)[:args.slowest]:
+        print(f"{result['duration']:>10.2f}s  {result['id']}")
+    print("\nSlowest flavors (total time, number of runs and longest run):")
+    for entry in processes[:args.slowest]:
+        print(f"{entry['total']:>10.2f}s {entry['count']:>5} {entry['max']:>9.2f}s  {entry['process']}")
+
+    counts = collections.Counter(result["status"] for result in results)
+    print(f"\nRan {len(results)} tests in {elapsed:.2f}s: " + ", ".join(f"{counts[status]} {status}"
+                                                                   for status in ("ok", "fail", "error", "skip")))
+    if args.report:
+        with open(args.report, "w") as file_handle:
+            json.dump({"tests": sorted(results, key=lambda result: result["id"]), "processes": processes},
+                      file_handle, indent=4)
+    sys.exit(1 if unsuccessful else 0)
+
+
+if __name__ == "__main__":
+    main()
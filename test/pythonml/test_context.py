@@ -1,28 +1,55 @@
 #!/usr/bin/env python
+import importlib.util
+import json
 import os
+import pickle
+import sys
+import types
 from unittest import mock
 
+import numpy as np
+
 from base import BaseTest
 
 
 class TestContext(BaseTest):
     """
-    Unit tests for the methods in the Context class defined in the settings.py module
+    Unit tests for the methods in the Context class defined in pyml_library.py
     """
 
-    @mock.patch('builtins.open', new_callable=mock.mock_open)
-    @mock.patch('pickle.dump')
-    def test_update_context(self, mock_pickle, mock_builtin_open):
+    def test_update_context(self):
         """
-        This function update_content is supposed to pickle .job_context/workflow_context_file_mapping as the key
-        _context_file. We check this by seeing if mock open is called with (self.context._context_file, "wb").
-        Then, we see if pickle dump is actually dumping the correct mock object
+        Saving an object only appends to the journal. When the context is committed, .job_context/
+        workflow_context_file_mapping is written by renaming a temporary file over it, and the journal is cleared.
         """
+        self.context.save(1, 'one')
+        self.assertTrue(os.path.exists(self.context._journal_file))
         self.context._update_context()
-        builtin_open_calls = [mock.call(self.context._context_file, "wb")]
-        mock_builtin_open.assert_has_calls(builtin_open_calls)
-        mock_pickle_calls = [mock.call(self.context.context_paths, mock_builtin_open())]
-        mock_pickle.assert_has_calls(mock_pickle_calls)
+        with open(self.context._context_file, "rb") as file_handle:
+            self.assertEqual(self.context.context_paths, pickle.load(file_handle))
+        self.assertFalse(os.path.exists(self.context._journal_file))
+        self.assertEqual([], [name for name in os.listdir(self.context._context_dir_pathname) if name.endswith(".tmp")])
+
+    def test_journal_is_replayed(self):
+        """
+        Objects saved by a unit that never committed the index (e.g. because it crashed) can still be loaded.
+        """
+        self.context.save(1, 'one')
+        settings = self.reload_settings()
+        self.assertEqual(1, settings.Context().load('one'))
+
+    def test_update_context_merges_changes(self):
+        """
+        Contexts sharing a directory (e.g. parallel branches of a workflow) keep each other's changes when committing.
+        """
+        settings = self.reload_settings()
+        other_context = settings.Context()
+        self.context.save(1, 'one')
+        other_context.save(2, 'two')
+        self.context._update_context()
+        other_context._update_context()
+        merged_context = settings.Context()
+        self.assertEqual((1, 2), (merged_context.load('one'), merged_context.load('two')))
 
     @mock.patch('builtins.open', new_callable=mock.mock_open)
     @mock.patch('pickle.dump')
@@ -65,3 +92,350 @@ class TestContext(BaseTest):
         mock_pickle_calls = [mock.call(mock_builtin_open())]
         mock_pickle.assert_has_calls(mock_pickle_calls)
         assert mock_pickle() == obj
+
+    def test_save_numpy_array_is_memory_mapped(self):
+        """
+        Numeric Numpy arrays are stored as .npy files, and are loaded back as read-only views of a memory-mapped file
+        rather than as an in-memory copy.
+        """
+        array = np.arange(12, dtype=float).reshape(4, 3)
+        self.context.save(array, 'array')
+        self.assertTrue(self.context.context_paths['array'].endswith(".npy"))
+        loaded = self.context.load('array')
+        np.testing.assert_array_equal(array, loaded)
+        self.assertIsInstance(loaded.base, np.memmap)
+        self.assertFalse(loaded.flags.writeable)
+
+    def test_save_falls_back_to_pickle(self):
+        """
+        Objects that no other backend accepts (including arrays of python objects) are pickled.
+        """
+        for name, obj in (('dictionary', {'a': 1}), ('object_array', np.array(['a', None], dtype=object))):
+            self.context.save(obj, name)
+            self.assertTrue(self.context.context_paths[name].endswith(".pkl"))
+        self.assertEqual({'a': 1}, self.context.load('dictionary'))
+        np.testing.assert_array_equal(np.array(['a', None], dtype=object), self.context.load('object_array'))
+
+    def test_save_sparse_matrix(self):
+        """
+        SciPy sparse matrices are stored as .npz files, with or without compression and downcasting, and load back as
+        the same sparse matrix.
+        """
+        import scipy.sparse
+        settings = self.reload_settings()
+        matrix = scipy.sparse.random(100, 20, density=0.05, format="csr", random_state=0)
+        self.context.save(matrix, 'matrix')
+        self.assertTrue(self.context.context_paths['matrix'].endswith(".npz"))
+        loaded = self.context.load('matrix')
+        self.assertTrue(scipy.sparse.isspmatrix_csr(loaded))
+        self.assertEqual(0, (loaded != matrix).nnz)
+
+        context = settings.Context(backends=(settings.SavePolicy(settings.SparseBackend, 'gzip', True),
+                                             settings.PickleBackend))
+        context.save(matrix, 'compressed')
+        self.assertTrue(context.context_paths['compressed'].endswith(".npz.gz"))
+        loaded = context.load('compressed')
+        self.assertEqual(np.float32, loaded.dtype)
+        np.testing.assert_allclose(matrix.toarray(), loaded.toarray(), rtol=1e-7)
+
+    def test_save_over_memory_mapped_array(self):
+        """
+        Saving over a file that is currently memory-mapped must not invalidate the array that was loaded from it.
+        """
+        self.context.save(np.ones(5), 'array')
+        loaded = self.context.load('array')
+        self.context.save(loaded * 2, 'array')
+        np.testing.assert_array_equal(np.ones(5), loaded)
+        np.testing.assert_array_equal(np.full(5, 2.0), self.context.load('array'))
+
+    def test_save_removes_stale_file(self):
+        """
+        Re-saving an object with a different backend removes the file written by the previous backend.
+        """
+        self.context.save(np.ones(5), 'value')
+        previous_path = self.context.context_paths['value']
+        self.context.save(5, 'value')
+        self.assertFalse(os.path.exists(previous_path))
+        self.assertEqual(5, self.context.load('value'))
+
+    def test_save_under_several_names(self):
+        """
+        An object saved under several names is written once, and the other names are links to the same file.
+        """
+        self.context.save(np.arange(3), 'train_target', 'test_target')
+        for name in ('train_target', 'test_target'):
+            np.testing.assert_array_equal(np.arange(3), self.context.load(name))
+        self.assertTrue(os.path.samefile(self.context.context_paths['train_target'],
+                                         self.context.context_paths['test_target']))
+
+    def test_save_policy_compression(self):
+        """
+        Objects saved with a compressing SavePolicy are written to smaller files, and load back unchanged, including
+        by a context that isn't set up to compress them. zstd and lz4 are only tested if their packages are installed.
+        """
+        settings = self.reload_settings()
+        array = np.zeros((1000, 10))
+        for compression, package in (('gzip', 'gzip'), ('lz4', 'lz4'), ('zstd', 'zstandard')):
+            if importlib.util.find_spec(package) is None:
+                continue
+            with self.subTest(compression=compression):
+                context = settings.Context(backends=(settings.SavePolicy(settings.NumpyBackend, compression),
+                                                     settings.SavePolicy(settings.PickleBackend, compression)))
+                context.save(array, 'array')
+                context.save({'a': 1}, 'dictionary')
+                path = context.context_paths['array']
+                self.assertTrue(path.endswith(".npy" + settings.SavePolicy.compression_extensions[compression]))
+                self.assertLess(os.path.getsize(path), array.nbytes)
+                context._update_context()
+
+                uncompressed_context = settings.Context()
+                np.testing.assert_array_equal(array, uncompressed_context.load('array'))
+                self.assertEqual({'a': 1}, uncompressed_context.load('dictionary'))
+
+    def test_save_policy_downcasting(self):
+        """
+        A downcasting SavePolicy saves float64 arrays as float32. Other arrays, and arrays with values too large for
+        float32, are saved unchanged.
+        """
+        settings = self.reload_settings()
+        context = settings.Context(backends=(settings.SavePolicy(settings.NumpyBackend, is_downcasting_floats=True),
+                                             settings.PickleBackend))
+        array = np.linspace(0, 1, 11)
+        context.save(array, 'array')
+        context.save(np.arange(3), 'integers')
+        context.save(np.array([1.0, 1e300]), 'large')
+
+        loaded = context.load('array')
+        self.assertEqual(np.float32, loaded.dtype)
+        np.testing.assert_allclose(array, loaded, rtol=1e-7)
+        self.assertEqual(np.arange(3).dtype, context.load('integers').dtype)
+        self.assertEqual(np.float64, context.load('large').dtype)
+
+    def test_array_writer(self):
+        """
+        Arrays written block-by-block load back as a single array, under every name they were saved with.
+        """
+        blocks = [np.arange(6, dtype=np.float32).reshape(2, 3), np.arange(6, 15, dtype=np.float32).reshape(3, 3)]
+        with self.context.array_writer('train_descriptors', 'test_descriptors') as writer:
+            for block in blocks:
+                writer.append(block)
+        for name in ('train_descriptors', 'test_descriptors'):
+            np.testing.assert_array_equal(np.concatenate(blocks), self.context.load(name))
+
+    def test_array_writer_refuses_lossy_casts(self):
+        """
+        Blocks are cast to the dtype of the first block only if their values survive the cast.
+        """
+        with self.context.array_writer('target') as writer:
+            writer.append(np.array([[150], [151]]))
+            writer.append(np.array([[152]], dtype=np.int32))
+            with self.assertRaises(ValueError):
+                writer.append(np.array([[153.0], [153.5]]))
+        np.testing.assert_array_equal([[150], [151], [152]], self.context.load('target'))
+
+        with self.context.array_writer('descriptors') as writer:
+            writer.append(np.array([[0.5, np.nan]], dtype=np.float32))
+            writer.append(np.array([[0.25, np.nan]], dtype=np.float64))
+            with self.assertRaises(ValueError):
+                writer.append(np.array([[0.1, 0.0]], dtype=np.float64))
+        self.assertEqual(np.float32, self.context.load('descriptors').dtype)
+
+    def test_array_writer_discards_on_error(self):
+        """
+        If an error occurs while an array is being written, nothing is saved.
+        """
+        with self.assertRaises(RuntimeError):
+            with self.context.array_writer('partial') as writer:
+                writer.append(np.ones((2, 3)))
+                raise RuntimeError
+        self.assertNotIn('partial', self.context)
+        self.assertEqual([], [name for name in os.listdir(self.context._context_dir_pathname) if name.endswith(".tmp")])
+
+    def test_deferred_writes(self):
+        """
+        Objects saved while writes are deferred are kept in memory, and only written to disk when the block exits.
+        """
+        with self.context.deferred_writes():
+            self.context.save(np.ones(3), 'deferred')
+            self.assertIn('deferred', self.context)
+            self.assertNotIn('deferred', self.context.context_paths)
+            self.assertFalse(self.context.load('deferred').flags.writeable)
+        self.assertTrue(os.path.exists(self.context.context_paths['deferred']))
+        np.testing.assert_array_equal(np.ones(3), self.context.load('deferred'))
+
+    def test_deferred_writes_copy_arrays(self):
+        """
+        Changing an array after it's saved while writes are deferred doesn't change what was saved.
+        """
+        array = np.ones(3)
+        with self.context.deferred_writes():
+            self.context.save(array, 'deferred')
+            array[0] = 0
+            np.testing.assert_array_equal(np.ones(3), self.context.load('deferred'))
+        np.testing.assert_array_equal(np.ones(3), self.context.load('deferred'))
+
+    def test_deferred_writes_write_once(self):
+        """
+        An object saved under several names while writes are deferred, whether in one save or several, is written
+        once and linked under the other names.
+        """
+        target = np.arange(3)
+        with self.context.deferred_writes():
+            self.context.save(np.ones(3), 'train_descriptors', 'test_descriptors')
+            self.context.save(target, 'train_target')
+            self.context.save(target, 'test_target')
+        self.assertTrue(os.path.samefile(self.context.context_paths['train_descriptors'],
+                                         self.context.context_paths['test_descriptors']))
+        self.assertTrue(os.path.samefile(self.context.context_paths['train_target'],
+                                         self.context.context_paths['test_target']))
+
+    def test_flush(self):
+        """
+        Flushing while writes are deferred writes the objects saved so far, and keeps deferring later saves.
+        """
+        with self.context.deferred_writes():
+            self.context.save(1, 'first')
+            self.context.flush()
+            self.assertIn('first', self.context.context_paths)
+            self.context.save(2, 'second')
+            self.assertNotIn('second', self.context.context_paths)
+        self.assertEqual(2, self.context.load('second'))
+
+    def test_unit_cache(self):
+        """
+        A unit re-run with unchanged inputs is skipped, and its outputs are restored from the cache. Changing one of
+        its inputs makes it run again.
+        """
+        settings = self.reload_settings()
+        self.context.unit_cache = settings.UnitCache(self.tmppath("unit_cache"), max_bytes=1024 ** 2)
+        with open(self.tmppath("unit.py"), "w") as unit:
+            unit.write("# A fake unit")
+        fake_main = types.ModuleType("__main__")
+        fake_main.__file__ = self.tmppath("unit.py")
+
+        def run_unit():
+            with mock.patch.dict(sys.modules, {"__main__": fake_main}):
+                with self.context as context:
+                    context.save(context.load('x') * 2, 'y')
+
+        self.context.save(np.ones(3), 'x')
+        run_unit()
+        self.context.save(np.zeros(3), 'y')
+        with self.assertRaises(SystemExit):
+            run_unit()
+        np.testing.assert_array_equal(np.full(3, 2.0), self.context.load('y'))
+
+        self.context.save(np.full(3, 2.0), 'x')
+        run_unit()
+        np.testing.assert_array_equal(np.full(3, 4.0), self.context.load('y'))
+
+    def test_unit_cache_records_checks(self):
+        """
+        A unit that checks whether an object is in the context is run again once the answer changes, and its outputs
+        are restored from the cache again once the answer changes back.
+        """
+        settings = self.reload_settings()
+        self.context.unit_cache = settings.UnitCache(self.tmppath("unit_cache"), max_bytes=1024 ** 2)
+        with open(self.tmppath("unit.py"), "w") as unit:
+            unit.write("# A fake unit")
+        fake_main = types.ModuleType("__main__")
+        fake_main.__file__ = self.tmppath("unit.py")
+
+        def run_unit():
+            with mock.patch.dict(sys.modules, {"__main__": fake_main}):
+                with self.context as context:
+                    context.save(context.load('x') * (3 if 'flag' in context else 2), 'y')
+
+        self.context.save(np.ones(3), 'x')
+        run_unit()
+        np.testing.assert_array_equal(np.full(3, 2.0), self.context.load('y'))
+
+        self.context.save(True, 'flag')
+        run_unit()
+        np.testing.assert_array_equal(np.full(3, 3.0), self.context.load('y'))
+
+        del self.context.context_paths['flag']
+        with self.assertRaises(SystemExit):
+            run_unit()
+        np.testing.assert_array_equal(np.full(3, 2.0), self.context.load('y'))
+
+    def test_unit_cache_unit_key(self):
+        """
+        A unit's key changes with its source code and with the datafile. The source files are only read once, and the
+        datafile is never read.
+        """
+        settings = self.reload_settings()
+        unit_cache = settings.UnitCache(self.tmppath("unit_cache"), max_bytes=1024 ** 2)
+        unit_path, datafile_path = self.tmppath("unit.py"), self.tmppath(settings.datafile)
+        with open(unit_path, "w") as unit:
+            unit.write("# A fake unit")
+        with open(datafile_path, "w") as datafile:
+            datafile.write("x,target\n1,2\n")
+
+        key = unit_cache._unit_key(unit_path)
+        with mock.patch("builtins.open", wraps=open) as opened:
+            self.assertEqual(key, unit_cache._unit_key(unit_path))
+        self.assertEqual(0, opened.call_count)
+
+        os.utime(datafile_path, ns=(0, 0))
+        datafile_key = unit_cache._unit_key(unit_path)
+        self.assertNotEqual(key, datafile_key)
+        with open(unit_path, "a") as unit:
+            unit.write(", edited")
+        with mock.patch("builtins.open", wraps=open) as opened:
+            self.assertNotEqual(datafile_key, unit_cache._unit_key(unit_path))
+        self.assertEqual([unit_path], [call.args[0] for call in opened.call_args_list])
+
+    def test_unit_cache_eviction(self):
+        """
+        The least recently used entries are evicted once the cache is larger than its maximum size.
+        """
+        settings = self.reload_settings()
+        unit_cache = settings.UnitCache(self.tmppath("unit_cache"), max_bytes=0)
+        os.makedirs(os.path.join(unit_cache.cache_dir, "unit", "inputs"))
+        with open(os.path.join(unit_cache.cache_dir, "unit", "inputs", unit_cache.manifest_basename), "w") as manifest:
+            manifest.write("{}")
+        unit_cache.evict()
+        self.assertEqual([], os.listdir(os.path.join(unit_cache.cache_dir, "unit")))
+
+    def test_profiler(self):
+        """
+        Each save and load, and the unit as a whole, is recorded as a Chrome trace event in the profile.
+        """
+        settings = self.reload_settings()
+        self.context.profiler = settings.Profiler(self.tmppath("profile.jsonl"))
+        fake_main = types.ModuleType("__main__")
+        fake_main.__file__ = self.tmppath("unit.py")
+        with mock.patch.dict(sys.modules, {"__main__": fake_main}):
+            with self.context as context:
+                context.save(np.ones(1000), 'x')
+                context.load('x')
+
+        with open(self.tmppath("profile.jsonl")) as profile:
+            events = [json.loads(line) for line in profile]
+        self.assertEqual([('x', 'save'), ('x', 'load'), ('unit.py', 'unit')],
+                         [(event['name'], event['cat']) for event in events])
+        self.assertEqual(os.path.getsize(self.context.context_paths['x']), events[0]['args']['bytes'])
+        self.assertEqual('unit.py', events[0]['args']['unit'])
+        self.assertIn('cpu_time', events[2]['args'])
+        self.assertGreater(events[2]['args']['peak_rss_bytes'], 0)
+
+    def test_profiler_records_failures(self):
+        """
+        A save that raises an error is still recorded, flagged as failed, as is its unit. A unit run without a script
+        file is named after sys.argv[0].
+        """
+        settings = self.reload_settings()
+        self.context.profiler = settings.Profiler(self.tmppath("profile.jsonl"))
+        with mock.patch.dict(sys.modules, {"__main__": types.ModuleType("__main__")}), \
+                mock.patch.object(sys, "argv", [self.tmppath("unit.py")]), \
+                mock.patch.object(self.context.backends[-1], "dump", side_effect=OSError("No space left on device")):
+            with self.assertRaises(OSError):
+                with self.context as context:
+                    context.save({"a": 1}, 'x')
+
+        with open(self.tmppath("profile.jsonl")) as profile:
+            events = [json.loads(line) for line in profile]
+        self.assertEqual([('x', 'save', True), ('unit.py', 'unit', True)],
+                         [(event['name'], event['cat'], event['args']['is_failed']) for event in events])
+        self.assertEqual('unit.py', events[0]['args']['unit'])
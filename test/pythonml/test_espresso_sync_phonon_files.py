@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+import contextlib
+import hashlib
+import io
+import json
+import os
+import runpy
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, mock
+
+import jinja2
+
+ASSET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../assets/python",
+                          "espresso_sync_phonon_files.pyi")
+
+
+class TestSyncPhononFiles(TestCase):
+    """
+    Tests for espresso_sync_phonon_files.pyi, collecting the dynamical matrices from a job's scratch directory
+    """
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        scratch_dir, work_dir = os.path.join(self.tmpdir, "scratch"), os.path.join(self.tmpdir, "job", "work")
+        self.source_dir = os.path.join(scratch_dir, "outdir", "_ph0", "__prefix__.phsave")
+        self.destination_dir = os.path.join(self.tmpdir, "job", "outdir", "_ph0", "__prefix__.phsave")
+        os.makedirs(self.source_dir)
+        os.makedirs(work_dir)
+        for index in range(3):
+            with open(os.path.join(self.source_dir, f"dynmat{index}.xml"), "w") as f:
+                f.write(f"dynamical matrix {index}\n")
+
+        # The asset is rendered in the same two passes as the platform: the job's directories are only filled in when
+        # the job runs
+        with open(ASSET_PATH) as f:
+            template = jinja2.Template(f.read()).render()
+        self.script = os.path.join(self.tmpdir, "espresso_collect_dynmat.py")
+        with open(self.script, "w") as f:
+            f.write(jinja2.Template(template, keep_trailing_newline=True).render(JOB_SCRATCH_DIR=scratch_dir,
+                                                                                 JOB_WORK_DIR=work_dir))
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def run_script(self) -> dict:
+        """
+        Runs the script, and returns the number of files it handled by each method
+        """
+        output = io.StringIO()
+        with mock.patch.object(sys, "argv", [self.script]), contextlib.redirect_stdout(output):
+            runpy.run_path(self.script, run_name="__main__")
+        return json.loads(output.getvalue())["methods"]
+
+    def read_manifest(self) -> list:
+        with open(os.path.join(self.destination_dir, ".sync_manifest.jsonl")) as f:
+            return [json.loads(line) for line in f]
+
+    def test_transfer(self):
+        methods = self.run_script()
+        self.assertEqual(3, sum(methods.values()))
+        self.assertNotIn("recorded", methods)
+        for index in range(3):
+            with open(os.path.join(self.destination_dir, f"dynmat{index}.xml")) as f:
+                self.assertEqual(f"dynamical matrix {index}\n", f.read())
+        # Files are recorded in the order their transfers finish
+        self.assertEqual([f"dynmat{index}.xml" for index in range(3)], sorted(path for path, _ in self.read_manifest()))
+
+    def test_resume_from_manifest(self):
+        """
+        Files recorded in the manifest by an interrupted run are skipped without computing their checksums. The
+        manifest is compacted, dropping a record left incomplete by the interruption, whose file is then checked.
+        """
+        self.run_script()
+        manifest_path = os.path.join(self.destination_dir, ".sync_manifest.jsonl")
+        with open(manifest_path) as f:
+            lines = f.readlines()
+        with open(manifest_path, "w") as f:
+            f.writelines(lines[:2] + lines[:1] + [lines[2][:10]])
+
+        with mock.patch("hashlib.sha256", wraps=hashlib.sha256) as sha256:
+            methods = self.run_script()
+        self.assertEqual({"recorded": 2, "unchanged": 1}, methods)
+        # Only the source and destination of the file missing from the manifest are checked
+        self.assertEqual(2, sha256.call_count)
+        self.assertEqual([f"dynmat{index}.xml" for index in range(3)], [path for path, _ in self.read_manifest()])
+
+    def test_skip_matching_checksum(self):
+        """
+        Files already in the destination are skipped if their contents match, even without a manifest
+        """
+        os.makedirs(self.destination_dir)
+        with open(os.path.join(self.destination_dir, "dynmat0.xml"), "w") as f:
+            f.write("dynamical matrix 0\n")
+        with open(os.path.join(self.destination_dir, "dynmat1.xml"), "w") as f:
+            f.write("dynamical matrix X\n")
+
+        methods = self.run_script()
+        self.assertEqual(1, methods["unchanged"])
+        self.assertEqual(3, sum(methods.values()))
+        with open(os.path.join(self.destination_dir, "dynmat1.xml")) as f:
+            self.assertEqual("dynamical matrix 1\n", f.read())
+        self.assertIn("sha256", dict(self.read_manifest())["dynmat0.xml"])
+
+    def test_fall_back_to_copy(self):
+        """
+        Files are copied when they can be neither reflinked nor hardlinked
+        """
+        with mock.patch("fcntl.ioctl", side_effect=OSError), mock.patch("os.link", side_effect=OSError):
+            methods = self.run_script()
+        self.assertEqual({"copy": 3}, methods)
+        for index in range(3):
+            source = os.stat(os.path.join(self.source_dir, f"dynmat{index}.xml"))
+            destination = os.stat(os.path.join(self.destination_dir, f"dynmat{index}.xml"))
+            self.assertNotEqual(source.st_ino, destination.st_ino)
+            self.assertEqual(source.st_size, destination.st_size)
+        self.assertEqual([], [name for name in os.listdir(self.destination_dir) if name.endswith(".part")])
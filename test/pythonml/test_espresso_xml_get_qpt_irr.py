@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+import contextlib
+import io
+import json
+import os
+import runpy
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, mock
+from xml.dom import minidom
+
+import jinja2
+
+ASSET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../assets/python",
+                          "espresso_xml_get_qpt_irr.pyi")
+
+# Quantum ESPRESSO writes other tags before the ones the script reads. The namespace is ignored.
+CONTROL_PH_XML = """<?xml version="1.0"?>
+<Root xmlns="http://www.quantum-espresso.org/ns/qes">
+  <HEADER><FORMAT NAME="QEXML">1.4.0</FORMAT></HEADER>
+  <Q_POINTS>
+    <NUMBER_OF_Q_POINTS type="integer" size="1">
+           {}
+    </NUMBER_OF_Q_POINTS>
+  </Q_POINTS>
+</Root>
+"""
+PATTERNS_XML = """<?xml version="1.0"?>
+<Root xmlns="http://www.quantum-espresso.org/ns/qes">
+  <IRREPS_INFO>
+    <QPOINT_NUMBER type="integer" size="1">1</QPOINT_NUMBER>
+    <QPOINT_GROUP_RANK type="integer" size="1">48</QPOINT_GROUP_RANK>
+    <NUMBER_IRR_REP type="integer" size="1">
+           {}
+    </NUMBER_IRR_REP>
+  </IRREPS_INFO>
+</Root>
+"""
+
+
+def minidom_output(phsave_dir: str) -> str:
+    """
+    Returns the output of the script as it was before it was made to stream its output, which read every file in
+    full with minidom and printed the whole list at once
+    """
+    def get_int_by_tag_name(doc, tag_name):
+        return int(doc.getElementsByTagName(tag_name)[0].firstChild.nodeValue)
+
+    values = []
+    xmldoc = minidom.parse(os.path.join(phsave_dir, "control_ph.xml"))
+    for i in range(get_int_by_tag_name(xmldoc, "NUMBER_OF_Q_POINTS")):
+        xmldoc = minidom.parse(os.path.join(phsave_dir, f"patterns.{i + 1}.xml"))
+        for j in range(get_int_by_tag_name(xmldoc, "NUMBER_IRR_REP")):
+            values.append({"qpoint": i + 1, "irr": j + 1})
+    return json.dumps(values, indent=4) + "\n"
+
+
+class TestGetQptIrr(TestCase):
+    """
+    Tests for espresso_xml_get_qpt_irr.pyi, listing the q-points and irreducible representations of a phonon run
+    """
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        work_dir = os.path.join(self.tmpdir, "work")
+        self.phsave_dir = os.path.join(work_dir, "outdir", "_ph0", "__prefix__.phsave")
+        os.makedirs(self.phsave_dir)
+
+        # The asset is rendered in the same two passes as the platform: the job's directory is only filled in when the
+        # job runs
+        with open(ASSET_PATH) as f:
+            template = jinja2.Template(f.read()).render()
+        self.script = os.path.join(self.tmpdir, "espresso_xml_get_qpt_irr.py")
+        with open(self.script, "w") as f:
+            f.write(jinja2.Template(template, keep_trailing_newline=True).render(JOB_WORK_DIR=work_dir))
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def write_fixture(self, numbers_of_irr: list):
+        with open(os.path.join(self.phsave_dir, "control_ph.xml"), "w") as f:
+            f.write(CONTROL_PH_XML.format(len(numbers_of_irr)))
+        for qpoint, number_of_irr in enumerate(numbers_of_irr, 1):
+            with open(os.path.join(self.phsave_dir, f"patterns.{qpoint}.xml"), "w") as f:
+                f.write(PATTERNS_XML.format(number_of_irr))
+
+    def run_script(self, output: io.StringIO) -> str:
+        with mock.patch.object(sys, "argv", [self.script]), contextlib.redirect_stdout(output):
+            runpy.run_path(self.script, run_name="__main__")
+        return output.getvalue()
+
+    def test_same_output_as_minidom(self):
+        for numbers_of_irr in ([3, 1, 0, 12, 2, 5, 1, 1, 4, 2], [0, 0], [1], []):
+            with self.subTest(numbers_of_irr=numbers_of_irr):
+                self.write_fixture(numbers_of_irr)
+                output = self.run_script(io.StringIO())
+                self.assertEqual(minidom_output(self.phsave_dir), output)
+                self.assertEqual(sum(numbers_of_irr), len(json.loads(output)))
+
+    def test_missing_patterns_file(self):
+        """
+        Missing patterns files are reported before anything is printed
+        """
+        self.write_fixture([2, 3, 1])
+        os.remove(os.path.join(self.phsave_dir, "patterns.3.xml"))
+        output = io.StringIO()
+        with self.assertRaises(IOError):
+            self.run_script(output)
+        self.assertEqual("", output.getvalue())
+
+    def test_unparseable_patterns_file(self):
+        """
+        If a patterns file can't be parsed, the list printed so far is left unterminated, so it isn't valid JSON
+        """
+        self.write_fixture([2, 3, 1])
+        with open(os.path.join(self.phsave_dir, "patterns.2.xml"), "w") as f:
+            f.write("<Root><NUMBER_IRR_REP>")
+        output = io.StringIO()
+        with self.assertRaises(Exception):
+            self.run_script(output)
+        self.assertTrue(output.getvalue().startswith("["))
+        with self.assertRaises(ValueError):
+            json.loads(output.getvalue())
@@ -1,4 +1,6 @@
 #!/usr/bin/env python
+import numpy as np
+import pandas as pd
 from parameterized import parameterized
 
 from flavor import BaseFlavorTest
@@ -16,6 +18,20 @@ class TestRegressionFlavors(BaseFlavorTest):
     def test_workflows(self, test_params):
         self.run_workflow(test_params)
 
+    @parameterized.expand(
+        BaseFlavorTest.get_workflow_flavors(category),
+        name_func=BaseFlavorTest.get_func_name
+    )
+    def test_workflows_in_process(self, test_params):
+        self.run_workflow_in_process(test_params)
+
+    @parameterized.expand(
+        BaseFlavorTest.get_workflow_flavors(category),
+        name_func=BaseFlavorTest.get_func_name
+    )
+    def test_workflows_with_preloader(self, test_params):
+        self.run_workflow_with_preloader(test_params)
+
     flavors = [
         ('pyml:pre_processing:min_max_scaler:sklearn.pyi',),
         ('pyml:model:adaboosted_trees_regression:sklearn.pyi',),
@@ -40,3 +56,31 @@ class TestRegressionFlavors(BaseFlavorTest):
     )
     def test_flavors(self, flavor, kws=None):
         self.run_flavor(flavor, kws)
+
+    def test_read_csv_in_chunks(self):
+        """
+        When the datafile is read in chunks, the types of the columns are not taken from the first chunk alone: a target
+        whose first values are whole numbers is still read as floats, and a descriptor that is numeric in the first
+        chunk but not in a later one is read as a categorical.
+        """
+        flavor = "pyml:data_input:read_csv:pandas.pyi"
+        pd.DataFrame({
+            "x1": [0.5, 1.5, 2.5, 3.5, 4.5],
+            "x2": ["1", "2", "1", "a", "2"],
+            "target": ["100", "200", "150.5", "", "250.25"],
+        }).to_csv(self.tmppath(self.training_set_basename), index=False)
+        self.copy_asset(flavor)
+        self.apply_settings({"chunk_size": 2}, flavor)
+        self.run_process(flavor)
+
+        settings = self.reload_settings()
+        self.assertEqual({"x2": ["1", "2", "a"]}, settings.context.load("descriptor_categories"))
+        np.testing.assert_array_equal([[100], [200], [150.5], [np.nan], [250.25]], settings.context.load("train_target"))
+        np.testing.assert_array_equal([[0.5, 0], [1.5, 1], [2.5, 0], [3.5, 2], [4.5, 1]],
+                                      settings.context.load("train_descriptors"))
+
+        # The descriptors are given the categories found in training, even if they look numeric when predicting
+        pd.DataFrame({"x1": [5.5, 6.5], "x2": ["2", "3"]}).to_csv(self.tmppath(self.predict_set_basename), index=False)
+        self.set_to_predict_phase()
+        self.run_process(flavor)
+        np.testing.assert_array_equal([[5.5, 1], [6.5, np.nan]], self.reload_settings().context.load("descriptors"))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+import copy
+import os
+import sys
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+GENERATION_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../assets/python/ml/generation")
+sys.path.insert(0, GENERATION_DIRECTORY)
+import render_templates  # noqa: E402
+
+
+class TestRenderTemplates(TestCase):
+    """
+    Tests for the renderer of the model flavors, which only renders the flavors whose inputs have changed
+    """
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.config = render_templates.load_config()
+        self.config["pyml_render_output_directory"] = self.tmpdir
+        self.render_cache_file = os.path.join(self.tmpdir, ".render_cache.json")
+        # A few of the models are enough, as long as one of them also has a hyperparameter search flavor
+        models = {model["name"]: model for model in render_templates.load_models("model")}
+        self.models = [copy.deepcopy(models[name]) for name in ("LASSO", "ridge", "k_means")]
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+
+    def render(self, **kwargs) -> dict:
+        kwargs.setdefault("render_cache_file", self.render_cache_file)
+        return render_templates.render_models(self.models, self.config, **kwargs)
+
+    def filenames(self, *models) -> set:
+        return {render_templates.flavor_filename(model, is_hyperparameter_search, self.config)
+                for model, is_hyperparameter_search in render_templates.model_variants(models)}
+
+    def read_flavors(self) -> dict:
+        flavors = {}
+        for filename in self.filenames(*self.models):
+            with open(filename, "r") as inp:
+                flavors[filename] = inp.read()
+        return flavors
+
+    def test_skip_unchanged_models(self):
+        flavors = self.render(jobs=1)
+        self.assertEqual(self.filenames(*self.models), set(flavors))
+        self.assertEqual(flavors, self.read_flavors())
+        mtimes = {filename: os.stat(filename).st_mtime_ns for filename in flavors}
+
+        self.assertEqual({}, self.render(jobs=1))
+        self.assertEqual(mtimes, {filename: os.stat(filename).st_mtime_ns for filename in flavors})
+
+        # Flavors are rendered again if their files are missing, or if forced
+        os.remove(render_templates.flavor_filename(self.models[1], False, self.config))
+        self.assertEqual({render_templates.flavor_filename(self.models[1], False, self.config)},
+                         set(self.render(jobs=1)))
+        self.assertEqual(self.filenames(*self.models), set(self.render(jobs=1, force=True)))
+
+    def test_rerender_changed_model(self):
+        """
+        A change to a model's YAML document only renders the flavors of that model again
+        """
+        self.render(jobs=1)
+        self.models[0]["model_default_args"]["alpha"] = 0.5
+        flavors = self.render(jobs=1)
+        self.assertEqual(self.filenames(self.models[0]), set(flavors))
+        self.assertIn("alpha=0.5,", flavors[render_templates.flavor_filename(self.models[0], False, self.config)])
+        self.assertEqual({}, self.render(jobs=1))
+
+    def test_parallel_render(self):
+        """
+        Rendering in several processes gives the same flavors as rendering in this process
+        """
+        flavors = self.render(jobs=1, render_cache_file=None)
+        self.assertEqual(flavors, self.render(jobs=3, render_cache_file=None))
+        self.assertEqual(flavors, self.read_flavors())
+
+    def test_render_without_writing(self):
+        """
+        With write=False, the flavors are only returned: neither they nor the hashes of their inputs are written
+        """
+        flavors = self.render(jobs=1, write=False)
+        self.assertEqual(self.filenames(*self.models), set(flavors))
+        zoos = render_templates.render_model_zoos(self.models, self.config, write=False,
+                                                  render_cache_file=self.render_cache_file)
+        self.assertEqual({render_templates.model_zoo_filename("regression", self.config)}, set(zoos))
+        self.assertEqual([], os.listdir(self.tmpdir))
+
+        # As nothing was recorded, the next render renders every flavor again
+        self.assertEqual(flavors, self.render(jobs=1))
+        self.assertEqual(zoos, render_templates.render_model_zoos(self.models, self.config,
+                                                                  render_cache_file=self.render_cache_file))
+        self.assertEqual({}, render_templates.render_model_zoos(self.models, self.config,
+                                                                render_cache_file=self.render_cache_file))
+        self.assertEqual({}, self.render(jobs=1))
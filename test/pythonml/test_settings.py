@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+import importlib.util
+
+import numpy as np
+
+from base import BaseTest
+
+
+class IdentityModel:
+    """
+    Stand-in for a trained model: "predicts" the first column of the descriptors
+    """
+
+    def predict(self, descriptors):
+        return descriptors[:, 0]
+
+
+class TestPredictInBatches(BaseTest):
+    """
+    Unit tests for the batched prediction helper defined in pyml_library.py
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.descriptors = np.arange(30, dtype=float).reshape(10, 3)
+        np.savetxt(self.tmppath("expected.csv"), self.descriptors[:, 0], header="prediction", comments="", fmt="%s")
+        with open(self.tmppath("expected.csv")) as expected:
+            self.expected = expected.read()
+
+    def assert_predictions_written(self, **kwargs):
+        settings = self.reload_settings()
+        settings.predict_in_batches(IdentityModel(), self.descriptors, self.tmppath("predictions.csv"), **kwargs)
+        with open(self.tmppath("predictions.csv")) as predictions:
+            self.assertEqual(self.expected, predictions.read())
+
+    def test_single_batch(self):
+        self.assert_predictions_written(batch_size=100, n_jobs=1)
+
+    def test_uneven_batches(self):
+        self.assert_predictions_written(batch_size=3, n_jobs=1)
+
+    def test_process_pool(self):
+        self.assert_predictions_written(batch_size=2, n_jobs=2)
+
+
+class TestResources(BaseTest):
+    """
+    Unit tests for the core count and thread limits defined in pyml_library.py
+    """
+
+    def test_n_cores(self):
+        settings = self.reload_settings()
+        self.assertGreaterEqual(settings.get_n_cores(), 1)
+        settings.n_cores = 3
+        self.assertEqual(3, settings.get_n_cores())
+
+    def test_thread_limits(self):
+        """
+        The BLAS libraries are limited within the block, and restored after it
+        """
+        if importlib.util.find_spec("threadpoolctl") is None:
+            self.skipTest("threadpoolctl isn't installed")
+        import threadpoolctl
+        settings = self.reload_settings()
+        original_threads = [library["num_threads"] for library in threadpoolctl.threadpool_info()]
+        with settings.thread_limits(1):
+            self.assertTrue(all(library["num_threads"] == 1 for library in threadpoolctl.threadpool_info()))
+        self.assertEqual(original_threads, [library["num_threads"] for library in threadpoolctl.threadpool_info()])
+
+
+class TestPreProcessingHelpers(BaseTest):
+    """
+    Unit tests for the missing value and duplicate row helpers defined in pyml_library.py
+    """
+
+    def test_missing_values(self):
+        settings = self.reload_settings()
+        np.testing.assert_array_equal([[False, True], [False, False]],
+                                      settings.missing_values(np.array([[1.0, np.nan], [2.0, 3.0]])))
+        np.testing.assert_array_equal([False, True, True],
+                                      settings.missing_values(np.array(["a", None, np.nan], dtype=object)))
+        np.testing.assert_array_equal([False, False], settings.missing_values(np.array([1, 2])))
+
+    def test_duplicate_rows(self):
+        """
+        Rows are duplicates if every column matches an earlier row. -0.0 equals 0.0, and missing values equal each other.
+        """
+        settings = self.reload_settings()
+        target = np.array([0, 1, 0, 0, 1, 0])
+        descriptors = np.array([[1.0, 2.0], [1.0, 2.0], [1.0, 2.0], [-0.0, np.nan], [1.0, 2.0], [0.0, np.nan]])
+        columns = [target] + [descriptors[:, column] for column in range(descriptors.shape[1])]
+        np.testing.assert_array_equal([False, False, True, False, True, True], settings.duplicate_rows(columns))
+
+    def test_duplicate_rows_within_mask(self):
+        """
+        Rows outside of the mask are neither duplicates, nor the originals that later rows duplicate.
+        """
+        settings = self.reload_settings()
+        column = np.array([5, 5, 5])
+        np.testing.assert_array_equal([False, False, True],
+                                      settings.duplicate_rows([column], rows=np.array([False, True, True])))
+
+    def test_duplicate_rows_of_sparse_matrix(self):
+        """
+        The rows of a sparse matrix are compared by value, whichever entries happen to be stored.
+        """
+        import scipy.sparse
+        settings = self.reload_settings()
+        target = np.array([0, 0, 0, 1, 0, 0])
+        # The rows are [0, 2], [0, 2], [1, 0], [0, 2], [0, 2] and [1, 0]. The third row stores its zero explicitly.
+        descriptors = scipy.sparse.csr_matrix((np.array([2.0, 2.0, 1.0, 0.0, 2.0, 2.0, 1.0]),
+                                               np.array([1, 1, 0, 1, 1, 1, 0]),
+                                               np.array([0, 1, 2, 4, 5, 6, 7])), shape=(6, 2))
+        np.testing.assert_array_equal([False, True, False, False, True, True],
+                                      settings.duplicate_rows([target, descriptors]))
+
+    def test_missing_values_of_sparse_matrix(self):
+        import scipy.sparse
+        settings = self.reload_settings()
+        dense = np.array([[0.0, np.nan, 1.0], [0.0, 0.0, 0.0], [np.nan, 2.0, 0.0]])
+        descriptors = scipy.sparse.csr_matrix(dense)
+        np.testing.assert_array_equal([True, False, True], settings.rows_with_missing_values(descriptors))
+        np.testing.assert_array_equal([False, False, True],
+                                      settings.rows_with_missing_values(descriptors, columns=np.array([0, 2])))
+        np.testing.assert_array_equal([True, True, False], settings.columns_with_missing_values(descriptors))
+        selected = settings.select(descriptors, np.array([1, 2]), np.array([0, 2]))
+        self.assertTrue(scipy.sparse.issparse(selected))
+        np.testing.assert_array_equal(dense[np.ix_([1, 2], [0, 2])], selected.toarray())
+
+
+class TestCrossValidation(BaseTest):
+    """
+    Unit tests for the k-fold cross-validation helpers defined in pyml_library.py
+    """
+
+    def setUp(self):
+        super().setUp()
+        random = np.random.default_rng(0)
+        self.descriptors = random.normal(size=(40, 3))
+        self.target = self.descriptors @ np.array([1.0, -2.0, 0.5]) + random.normal(scale=0.1, size=40)
+
+    def test_folds_hold_out_each_row_once(self):
+        settings = self.reload_settings()
+        folds = settings.cross_validation_folds(self.target, n_folds=4)
+        self.assertEqual(4, len(folds))
+        held_out = np.concatenate([test_rows for _, test_rows in folds])
+        np.testing.assert_array_equal(np.arange(40), np.sort(held_out))
+        for train_rows, test_rows in folds:
+            self.assertEqual(0, len(np.intersect1d(train_rows, test_rows)))
+
+    def test_process_pool_matches_serial(self):
+        """
+        The folds are fit the same way whether they're fit in this process, or in a pool that memory-maps the
+        descriptors
+        """
+        import sklearn.linear_model
+        settings = self.reload_settings()
+        settings.is_classification = False
+        model = sklearn.linear_model.Ridge(alpha=0.1)
+        serial = settings.cross_validate(model, self.descriptors, self.target, n_folds=4, n_jobs=1)
+        parallel = settings.cross_validate(model, self.descriptors, self.target, n_folds=4, n_jobs=2)
+        self.assertEqual({"RMSE", "R2"}, set(serial))
+        np.testing.assert_allclose(serial["RMSE"]["folds"], parallel["RMSE"]["folds"])
+        self.assertEqual(4, len(serial["RMSE"]["folds"]))
+        self.assertLess(serial["RMSE"]["mean"], 0.5)
+
+    def test_classification_folds_are_stratified(self):
+        import sklearn.tree
+        settings = self.reload_settings()
+        settings.is_classification = True
+        labels = (self.target > 0).astype(int)
+        for train_rows, test_rows in settings.cross_validation_folds(labels, n_folds=4, is_stratified=True):
+            self.assertAlmostEqual(labels.mean(), labels[test_rows].mean(), delta=0.1)
+        metrics = settings.cross_validate(sklearn.tree.DecisionTreeClassifier(random_state=0), self.descriptors,
+                                          labels, n_folds=4, is_stratified=True, n_jobs=1)
+        self.assertEqual({"accuracy", "F1"}, set(metrics))
+        self.assertGreaterEqual(metrics["accuracy"]["std"], 0.0)
+
+
+class TestFitModels(BaseTest):
+    """
+    Unit tests for the fitting of several models at once (as in the model zoo flavors) defined in pyml_library.py
+    """
+
+    def test_process_pool_matches_serial(self):
+        import sklearn.linear_model
+        import sklearn.tree
+        settings = self.reload_settings()
+        random = np.random.default_rng(0)
+        descriptors = random.normal(size=(100, 3))
+        target = descriptors @ np.array([1.0, -2.0, 0.5])
+        # Shared with the workers through a memory-mapped file, as if it had been loaded from the context
+        np.save(self.tmppath("descriptors.npy"), descriptors)
+        descriptors = np.asarray(np.load(self.tmppath("descriptors.npy"), mmap_mode="r"))
+
+        def get_models():
+            return {"ridge": sklearn.linear_model.Ridge(alpha=1.0),
+                    "tree": sklearn.tree.DecisionTreeRegressor(max_depth=3, random_state=0)}
+
+        serial = settings.fit_models(get_models(), descriptors, target, n_jobs=1)
+        parallel = settings.fit_models(get_models(), descriptors, target, n_jobs=2)
+        self.assertEqual(["ridge", "tree"], list(parallel))
+        for name, (model, fit_time) in parallel.items():
+            self.assertGreaterEqual(fit_time, 0.0)
+            np.testing.assert_array_equal(serial[name][0].predict(descriptors), model.predict(descriptors))
+
+
+class TestCompiledTrees(BaseTest):
+    """
+    Unit tests for the compiled tree ensembles defined in pyml_library.py
+    """
+
+    def setUp(self):
+        super().setUp()
+        random = np.random.default_rng(0)
+        self.descriptors = random.normal(size=(300, 4))
+        self.target = self.descriptors @ np.array([1.0, -2.0, 0.5, 0.0]) + random.normal(scale=0.3, size=300)
+        self.labels = np.digitize(self.target, [-1.0, 1.0])
+        self.new_descriptors = random.normal(size=(500, 4))
+
+    def get_models(self):
+        import sklearn.ensemble
+        import sklearn.tree
+        return [
+            sklearn.ensemble.RandomForestRegressor(n_estimators=20, n_jobs=1, random_state=0),
+            sklearn.ensemble.BaggingRegressor(sklearn.tree.DecisionTreeRegressor(), n_estimators=10, max_features=0.5,
+                                              random_state=0),
+            sklearn.ensemble.AdaBoostRegressor(sklearn.tree.DecisionTreeRegressor(max_depth=4), n_estimators=20,
+                                               random_state=0),
+            sklearn.ensemble.GradientBoostingRegressor(n_estimators=20, random_state=0),
+        ]
+
+    def assert_predictions_match(self, settings, model):
+        compiled = settings.CompiledTrees(model)
+        np.testing.assert_array_equal(model.predict(self.new_descriptors), compiled.predict(self.new_descriptors))
+
+    def test_regressors(self):
+        settings = self.reload_settings()
+        for model in self.get_models():
+            with self.subTest(model=type(model).__name__):
+                self.assert_predictions_match(settings, model.fit(self.descriptors, self.target))
+
+    def test_classifiers(self):
+        import sklearn.ensemble
+        settings = self.reload_settings()
+        for labels in (self.labels > 0, self.labels):
+            for model in (sklearn.ensemble.RandomForestClassifier(n_estimators=20, random_state=0),
+                          sklearn.ensemble.GradientBoostingClassifier(n_estimators=20, random_state=0)):
+                with self.subTest(model=type(model).__name__, n_classes=len(np.unique(labels))):
+                    self.assert_predictions_match(settings, model.fit(self.descriptors, labels.astype(int)))
+
+    def test_numpy_walk(self):
+        """
+        The trees are walked the same way whether or not the Numba kernel is used
+        """
+        settings = self.reload_settings()
+        model = self.get_models()[0].fit(self.descriptors, self.target)
+        compiled = settings.CompiledTrees(model)
+        settings.pyml_library._tree_walker = False
+        numpy_leaves = compiled.leaves(self.new_descriptors.astype(np.float32))
+        self.assertEqual((20, 500), numpy_leaves.shape)
+        self.assert_predictions_match(settings, model)
+        compiled.block_size = 20 * 7
+        np.testing.assert_array_equal(model.predict(self.new_descriptors), compiled.predict(self.new_descriptors))
+
+    def test_unsupported_model(self):
+        import sklearn.linear_model
+        settings = self.reload_settings()
+        with self.assertRaises(ValueError):
+            settings.CompiledTrees(sklearn.linear_model.Ridge().fit(self.descriptors, self.target))
+
+
+class TestDownsample(BaseTest):
+    """
+    Unit tests for the downsampling of plots defined in pyml_library.py
+    """
+
+    def test_small_datasets_are_kept(self):
+        settings = self.reload_settings()
+        np.testing.assert_array_equal(np.arange(10), settings.downsample(10, 10))
+
+    def test_random_sample(self):
+        settings = self.reload_settings()
+        rows = settings.downsample(1000, 100)
+        self.assertEqual(100, len(np.unique(rows)))
+        np.testing.assert_array_equal(np.sort(rows), rows)
+        np.testing.assert_array_equal(rows, settings.downsample(1000, 100))
+
+    def test_strata_are_shared_equally(self):
+        """
+        A small stratum is kept whole, and the larger ones share the remaining rows
+        """
+        settings = self.reload_settings()
+        strata = np.array([0] * 5 + [1] * 500 + [2] * 495)
+        rows = settings.downsample(len(strata), 105, strata=strata)
+        np.testing.assert_array_equal([5, 50, 50], np.bincount(strata[rows]))